@@ -1,18 +1,33 @@
 from django.contrib import admin
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from core.listados import PaginadorEstimado
+from core.roles import es_solo_marketing
+from ventas.models import Venta
 from .models import Cliente
 
 @admin.register(Cliente)
 class ClienteAdmin(admin.ModelAdmin):
     list_display = ('user', 'rut', 'telefono', 'direccion', 'num_ventas')
+    list_select_related = ('user',)
     search_fields = ('user__username', 'rut')
     readonly_fields = ('user', 'rut', 'telefono', 'direccion')
+    paginator = PaginadorEstimado
+    show_full_result_count = False
+
+    def get_queryset(self, request):
+        # Subconsulta correlacionada: solo se evalúa para las filas de la página
+        # (venta_cliente_fecha_idx), no un GROUP BY sobre todas las ventas
+        ventas = (Venta.objects.filter(cliente=OuterRef('pk')).order_by()
+                  .values('cliente').annotate(n=Count('id')).values('n'))
+        return super().get_queryset(request).annotate(_num_ventas=Coalesce(Subquery(ventas), 0))
 
     def num_ventas(self, obj):
-        return obj.ventas.count()
+        return obj._num_ventas
     num_ventas.short_description = 'N° Ventas'
 
     def has_change_permission(self, request, obj=None):
-        if request.user.groups.filter(name='Marketing').exists() and not request.user.is_superuser:
+        if es_solo_marketing(request.user):
             return False
         return True
 
@@ -0,0 +1,61 @@
+from decimal import Decimal, ROUND_HALF_UP
+
+from django.utils import timezone
+
+from core.exportaciones import Exportacion
+from utils.excel import TAMANO_LOTE
+from .models import Cliente
+
+
+COLUMNAS_CLIENTES = [
+    "ID", "Usuario", "Correo", "RUT", "Teléfono",
+    "Dirección", "Fecha de Registro", "Primera Compra", "Última Compra",
+    "Total de Órdenes", "Monto Total Gastado", "Ticket Promedio"
+]
+
+
+def exportar_clientes(parametros):
+    """
+    Todos los clientes registrados y sus métricas, leídos por lotes desde
+    ``ClienteMetricas`` (sin agregar las ventas).
+    """
+    clientes = (
+        Cliente.objects
+        .order_by('id')
+        .values_list(
+            'id', 'user__username', 'user__email', 'rut', 'telefono', 'direccion',
+            'user__date_joined', 'metricas__primera_compra', 'metricas__ultima_compra',
+            'metricas__total_ordenes', 'metricas__monto_total',
+        )
+    )
+
+    def fecha_hora(valor):
+        return timezone.localtime(valor).strftime('%Y-%m-%d %H:%M') if valor else "N/A"
+
+    def filas():
+        for (id_, username, email, rut, telefono, direccion, date_joined,
+             primera_compra, ultima_compra, total_ordenes, monto) in clientes.iterator(chunk_size=TAMANO_LOTE):
+            monto = monto or Decimal('0')
+            ticket = (monto / total_ordenes).quantize(Decimal('0.01'), ROUND_HALF_UP) if total_ordenes else 0
+            yield [
+                id_,
+                username,
+                email,
+                rut or "N/A",
+                telefono or "N/A",
+                direccion or "N/A",
+                timezone.localtime(date_joined).strftime('%Y-%m-%d'),
+                fecha_hora(primera_compra),
+                fecha_hora(ultima_compra),
+                total_ordenes or 0,
+                float(monto),
+                float(ticket),
+            ]
+
+    return Exportacion(
+        encabezados=COLUMNAS_CLIENTES,
+        filas=filas(),
+        total=Cliente.objects.count(),
+        nombre_archivo="reporte_clientes.xlsx",
+        titulo="Clientes",
+    )
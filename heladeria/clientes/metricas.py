@@ -0,0 +1,157 @@
+"""
+Métricas de compra por cliente (``ClienteMetricas``).
+
+- ``registrar_compra()``: el checkout suma la venta a las métricas del
+  cliente dentro de su transacción (dos consultas, solo la fila del cliente).
+- ``recalcular_metricas()``: recalcula clientes puntuales tras cambios hechos
+  fuera del checkout (admin, borrados).
+- ``reconstruir_metricas()``: recalcula todo (comando ``reconstruir_metricas``).
+- ``pagina_reporte()``: página del reporte de clientes con búsqueda y
+  paginación por cursor (keyset), sin OFFSET ni agregados sobre las ventas.
+"""
+from django.core import signing
+from django.db import transaction
+from django.db.models import Count, DecimalField, F, Max, Min, Q, Sum, Value
+from django.db.models.functions import Coalesce, Greatest, Least
+
+from .models import Cliente, ClienteMetricas
+
+
+TAMANO_LOTE = 1000
+
+# Órdenes del reporte: nombre en la URL → columna de ClienteMetricas
+ORDENES_REPORTE = {
+    'monto': 'monto_total',
+    'reciente': 'ultima_compra',
+}
+POR_PAGINA = 50
+
+
+def registrar_compra(venta):
+    """Suma ``venta`` a las métricas de su cliente."""
+    if not venta.cliente_id:
+        return
+    ClienteMetricas.objects.bulk_create(
+        [ClienteMetricas(cliente_id=venta.cliente_id)], ignore_conflicts=True
+    )
+    fecha = Value(venta.fecha_venta)
+    ClienteMetricas.objects.filter(cliente_id=venta.cliente_id).update(
+        total_ordenes=F('total_ordenes') + 1,
+        monto_total=F('monto_total') + venta.total,
+        primera_compra=Least(Coalesce('primera_compra', fecha), fecha),
+        ultima_compra=Greatest(Coalesce('ultima_compra', fecha), fecha),
+    )
+
+
+def _metricas_desde_ventas(clientes):
+    """Anota sobre ``clientes`` las métricas calculadas desde sus ventas."""
+    return clientes.annotate(
+        m_ordenes=Count('ventas'),
+        m_monto=Coalesce(Sum('ventas__total'), Value(0), output_field=DecimalField()),
+        m_primera=Min('ventas__fecha_venta'),
+        m_ultima=Max('ventas__fecha_venta'),
+    ).values_list('id', 'm_ordenes', 'm_monto', 'm_primera', 'm_ultima')
+
+
+def _crear_metricas(cliente_id, ordenes, monto, primera, ultima):
+    return ClienteMetricas(
+        cliente_id=cliente_id,
+        total_ordenes=ordenes,
+        monto_total=monto,
+        primera_compra=primera,
+        ultima_compra=ultima,
+    )
+
+
+def recalcular_metricas(cliente_ids):
+    """Recalcula desde las ventas las métricas de los clientes indicados."""
+    cliente_ids = [cid for cid in set(cliente_ids) if cid]
+    if not cliente_ids:
+        return
+    metricas = [
+        _crear_metricas(*fila)
+        for fila in _metricas_desde_ventas(Cliente.objects.filter(id__in=cliente_ids))
+    ]
+    with transaction.atomic():
+        ClienteMetricas.objects.filter(cliente_id__in=cliente_ids).delete()
+        ClienteMetricas.objects.bulk_create(metricas)
+
+
+def reconstruir_metricas():
+    """Borra y recalcula las métricas de todos los clientes."""
+    with transaction.atomic():
+        ClienteMetricas.objects.all().delete()
+        lote = []
+        for fila in _metricas_desde_ventas(Cliente.objects.order_by()).iterator(chunk_size=TAMANO_LOTE):
+            lote.append(_crear_metricas(*fila))
+            if len(lote) >= TAMANO_LOTE:
+                ClienteMetricas.objects.bulk_create(lote)
+                lote = []
+        ClienteMetricas.objects.bulk_create(lote)
+
+
+# --------------------------------------------------------------------------
+# Reporte de clientes: búsqueda + paginación por cursor
+# --------------------------------------------------------------------------
+
+def _firmar_cursor(columna, metricas):
+    valor = getattr(metricas, columna)
+    return signing.dumps(
+        [str(valor) if valor is not None else None, metricas.cliente_id],
+        salt='clientes.reporte', compress=True,
+    )
+
+
+def _leer_cursor(columna, cursor):
+    """Devuelve ``(valor, cliente_id)`` o None si el cursor no es válido."""
+    try:
+        valor, cliente_id = signing.loads(cursor, salt='clientes.reporte')
+        if valor is not None:
+            valor = ClienteMetricas._meta.get_field(columna).to_python(valor)
+        return valor, int(cliente_id)
+    except (signing.BadSignature, TypeError, ValueError):
+        return None
+
+
+def _despues_de(columna, valor, cliente_id):
+    """
+    Filas que van después de ``(valor, cliente_id)`` en orden descendente.
+    En MySQL los NULL ordenan al final con DESC, por eso van siempre después.
+    """
+    if valor is None:
+        return Q(**{f'{columna}__isnull': True, 'cliente_id__lt': cliente_id})
+    return (
+        Q(**{f'{columna}__lt': valor})
+        | Q(**{columna: valor, 'cliente_id__lt': cliente_id})
+        | Q(**{f'{columna}__isnull': True})
+    )
+
+
+def pagina_reporte(busqueda='', orden='monto', cursor=None, por_pagina=POR_PAGINA):
+    """
+    Una página del reporte ordenada por ``orden`` (descendente).
+
+    Devuelve ``(filas, siguiente_cursor)``; ``siguiente_cursor`` es None en
+    la última página. Cada fila es un ``ClienteMetricas`` con su cliente y
+    usuario cargados.
+    """
+    columna = ORDENES_REPORTE.get(orden, ORDENES_REPORTE['monto'])
+    consulta = ClienteMetricas.objects.select_related('cliente__user')
+
+    if busqueda:
+        consulta = consulta.filter(
+            Q(cliente__user__username__icontains=busqueda)
+            | Q(cliente__user__email__icontains=busqueda)
+            | Q(cliente__rut__icontains=busqueda)
+        )
+
+    posicion = _leer_cursor(columna, cursor) if cursor else None
+    if posicion:
+        consulta = consulta.filter(_despues_de(columna, *posicion))
+
+    filas = list(consulta.order_by(f'-{columna}', '-cliente_id')[:por_pagina + 1])
+    siguiente = None
+    if len(filas) > por_pagina:
+        filas = filas[:por_pagina]
+        siguiente = _firmar_cursor(columna, filas[-1])
+    return filas, siguiente
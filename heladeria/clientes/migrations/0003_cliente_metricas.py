@@ -0,0 +1,51 @@
+# Generated by Django 5.2.7 on 2026-10-18 15:06
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, Max, Min, Sum
+
+
+def poblar_metricas(apps, schema_editor):
+    Cliente = apps.get_model('clientes', 'Cliente')
+    ClienteMetricas = apps.get_model('clientes', 'ClienteMetricas')
+    clientes = Cliente.objects.order_by().annotate(
+        m_ordenes=Count('ventas'),
+        m_monto=Sum('ventas__total'),
+        m_primera=Min('ventas__fecha_venta'),
+        m_ultima=Max('ventas__fecha_venta'),
+    ).values_list('id', 'm_ordenes', 'm_monto', 'm_primera', 'm_ultima')
+    ClienteMetricas.objects.bulk_create(
+        [
+            ClienteMetricas(cliente_id=cid, total_ordenes=ordenes, monto_total=monto or 0,
+                            primera_compra=primera, ultima_compra=ultima)
+            for cid, ordenes, monto, primera, ultima in clientes.iterator(chunk_size=1000)
+        ],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('clientes', '0002_initial'),
+        ('ventas', '0002_resumenes_ventas'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ClienteMetricas',
+            fields=[
+                ('cliente', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='metricas', serialize=False, to='clientes.cliente')),
+                ('total_ordenes', models.PositiveIntegerField(default=0)),
+                ('monto_total', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('primera_compra', models.DateTimeField(blank=True, null=True)),
+                ('ultima_compra', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'verbose_name': 'Métricas de cliente',
+                'verbose_name_plural': 'Métricas de clientes',
+                'indexes': [models.Index(fields=['-monto_total', '-cliente'], name='metricas_monto_idx'), models.Index(fields=['-ultima_compra', '-cliente'], name='metricas_ultima_idx')],
+            },
+        ),
+        migrations.RunPython(poblar_metricas, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 5.2.7 on 2026-10-18 15:55
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('clientes', '0003_cliente_metricas'),
+        ('marketing', '0007_indices_compuestos'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='cliente',
+            index=models.Index(fields=['rut'], name='cliente_rut_idx'),
+        ),
+    ]
@@ -1,3 +1,5 @@
+from decimal import Decimal, ROUND_HALF_UP
+
 from django.db import models
 from django.contrib.auth.models import User
 
@@ -9,6 +11,12 @@ class Cliente(models.Model):
     imagen = models.ImageField(upload_to='avatars/', blank=True, null=True)
     promociones = models.ManyToManyField('marketing.Promocion', blank=True, related_name='clientes_asociados')
 
+    class Meta:
+        indexes = [
+            # Búsqueda por RUT (autocompletar y segmentos de marketing)
+            models.Index(fields=['rut'], name='cliente_rut_idx'),
+        ]
+
     @property
     def correo(self):
         return self.user.email
@@ -23,18 +31,39 @@ class Cliente(models.Model):
         return self.nombre
 
     def promociones_vigentes(self):
-        from django.utils import timezone
-        from marketing.models import Promocion
-        hoy = timezone.now().date()
-        personalizadas = self.promociones.filter(
-            activa=True,
-            fecha_inicio__lte=hoy,
-            fecha_fin__gte=hoy
-        )
-        generales = Promocion.objects.filter(
-            es_general=True,
-            activa=True,
-            fecha_inicio__lte=hoy,
-            fecha_fin__gte=hoy
-        )
+        from marketing.models import VIGENTE, Promocion
+        personalizadas = self.promociones.filter(estado=VIGENTE)
+        generales = Promocion.objects.filter(es_general=True, estado=VIGENTE)
         return (personalizadas | generales).distinct()
+
+
+class ClienteMetricas(models.Model):
+    """
+    Métricas de compra de cada cliente, mantenidas al registrar ventas
+    (ver clientes/metricas.py). Los reportes leen esta tabla en vez de
+    agregar todas las ventas en cada visita.
+    """
+    cliente = models.OneToOneField(Cliente, on_delete=models.CASCADE, primary_key=True, related_name='metricas')
+    total_ordenes = models.PositiveIntegerField(default=0)
+    monto_total = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    primera_compra = models.DateTimeField(null=True, blank=True)
+    ultima_compra = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        verbose_name = "Métricas de cliente"
+        verbose_name_plural = "Métricas de clientes"
+        indexes = [
+            # Paginación por cursor: (columna de orden, cliente) sin OFFSET
+            models.Index(fields=['-monto_total', '-cliente'], name='metricas_monto_idx'),
+            models.Index(fields=['-ultima_compra', '-cliente'], name='metricas_ultima_idx'),
+        ]
+
+    def __str__(self):
+        return f"Métricas de {self.cliente}"
+
+    @property
+    def ticket_promedio(self):
+        """Monto promedio por orden."""
+        if not self.total_ordenes:
+            return Decimal('0.00')
+        return (self.monto_total / self.total_ordenes).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
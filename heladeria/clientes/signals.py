@@ -0,0 +1,11 @@
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+
+from .models import Cliente, ClienteMetricas
+
+
+@receiver(post_save, sender=Cliente)
+def crear_metricas_cliente(sender, instance, created, **kwargs):
+    """Todo cliente tiene su fila de métricas, aunque aún no compre."""
+    if created:
+        ClienteMetricas.objects.get_or_create(cliente=instance)
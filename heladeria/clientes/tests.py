@@ -1,3 +1,108 @@
-from django.test import TestCase
+import io
+import shutil
+import tempfile
 
-# Create your tests here.
+from decimal import Decimal
+
+import openpyxl
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from core.models import TrabajoExportacion
+from productos.models import Categoria, Producto
+from ventas.checkout import registrar_venta
+from .metricas import pagina_reporte, reconstruir_metricas
+from .models import Cliente, ClienteMetricas
+
+
+MEDIA_PRUEBAS = tempfile.mkdtemp()
+
+
+@override_settings(MEDIA_ROOT=MEDIA_PRUEBAS)
+class ExportarClientesExcelTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = User.objects.create_user('staff', password='x', is_staff=True)
+        for i in range(3):
+            Cliente.objects.create(user=User.objects.create_user(f'cliente{i}', password='x'), rut=f'1111111{i}-1')
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(MEDIA_PRUEBAS, ignore_errors=True)
+        super().tearDownClass()
+
+    def test_encola_deduplica_y_el_worker_genera_el_archivo(self):
+        self.client.force_login(self.staff)
+        url = reverse('clientes:exportar_clientes_excel')
+
+        respuesta = self.client.get(url)
+        self.client.get(url)
+        self.assertEqual(TrabajoExportacion.objects.count(), 1)
+        trabajo = TrabajoExportacion.objects.get()
+        self.assertRedirects(respuesta, reverse('core:exportacion_detalle', args=[trabajo.pk]))
+
+        call_command('procesar_exportaciones', una_vez=True, stdout=io.StringIO())
+
+        estado = self.client.get(reverse('core:exportacion_estado', args=[trabajo.pk])).json()
+        self.assertEqual(estado['estado'], TrabajoExportacion.COMPLETADO)
+        self.assertEqual(estado['progreso'], 100)
+
+        descarga = self.client.get(reverse('core:exportacion_descargar', args=[trabajo.pk]))
+        libro = openpyxl.load_workbook(io.BytesIO(b''.join(descarga.streaming_content)))
+        filas = list(libro.active.iter_rows(values_only=True))
+        self.assertEqual(filas[0][:2], ("ID", "Usuario"))
+        self.assertEqual([f[1] for f in filas[1:]], ['cliente0', 'cliente1', 'cliente2'])
+
+
+class ReporteClientesTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = User.objects.create_user('staff', password='x', is_staff=True)
+        categoria = Categoria.objects.create(nombre="Helado")
+        cls.producto = Producto.objects.create(nombre="Helado", precio=Decimal('1000'), stock=500, categoria=categoria)
+        cls.clientes = [
+            Cliente.objects.create(user=User.objects.create_user(f'cliente{i:02d}', password='x'))
+            for i in range(7)
+        ]
+        # cliente{i} compra i veces (el 0 nunca)
+        for i, cliente in enumerate(cls.clientes):
+            for _ in range(i):
+                registrar_venta(cliente, {cls.producto.id: 1})
+
+    def _metricas(self):
+        return sorted(ClienteMetricas.objects.values_list(
+            'cliente_id', 'total_ordenes', 'monto_total', 'primera_compra', 'ultima_compra'))
+
+    def test_checkout_actualiza_las_metricas(self):
+        metricas = ClienteMetricas.objects.get(cliente=self.clientes[3])
+        self.assertEqual(metricas.total_ordenes, 3)
+        self.assertEqual(metricas.monto_total, Decimal('3000.00'))
+        self.assertEqual(metricas.ticket_promedio, Decimal('1000.00'))
+        self.assertLessEqual(metricas.primera_compra, metricas.ultima_compra)
+
+        incremental = self._metricas()
+        reconstruir_metricas()
+        self.assertEqual(self._metricas(), incremental)
+
+    def test_paginacion_por_cursor_recorre_todo_sin_repetir(self):
+        for orden in ('monto', 'reciente'):
+            vistos, cursor = [], None
+            while True:
+                filas, cursor = pagina_reporte(orden=orden, cursor=cursor, por_pagina=3)
+                vistos += [f.cliente_id for f in filas]
+                if cursor is None:
+                    break
+            self.assertEqual(sorted(vistos), sorted(c.id for c in self.clientes))
+            self.assertEqual(len(vistos), len(set(vistos)))
+        filas, _ = pagina_reporte(orden='monto', por_pagina=1)
+        self.assertEqual(filas[0].cliente, self.clientes[6])
+
+    def test_vistas_buscan_en_el_servidor(self):
+        self.client.force_login(self.staff)
+        for url in (reverse('clientes:reporte_clientes'), reverse('marketing:reporte_clientes')):
+            respuesta = self.client.get(url, {'q': 'cliente05'})
+            self.assertEqual([m.cliente for m in respuesta.context['datos_clientes']], [self.clientes[5]])
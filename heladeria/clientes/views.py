@@ -1,4 +1,3 @@
-from django.http import HttpResponse
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth import authenticate, login, logout, update_session_auth_hash
 from django.contrib.auth.forms import AuthenticationForm
@@ -6,14 +5,13 @@ from django.contrib import messages
 from django.contrib.auth.decorators import login_required
 from django.contrib.admin.views.decorators import staff_member_required
 from django.utils import timezone
-from django.db.models import Q, Count, Sum, Max
 
-from ventas.models import Venta
-from clientes.models import Cliente
+from ventas.historial import contexto_historial
+from clientes.models import Cliente, ClienteMetricas
+from .metricas import ORDENES_REPORTE, pagina_reporte
 from .forms import ClienteUserCreationForm, EditarPerfilForm, CambiarPasswordForm
 
-import openpyxl
-from openpyxl.styles import Font
+from core.views import solicitar_exportacion
 
 
 def register_view(request):
@@ -58,9 +56,7 @@ def inicio_clientes(request):
 
 @login_required
 def historial_pedidos(request):
-    cliente = request.user.cliente
-    ventas = Venta.objects.filter(cliente=cliente).order_by('-fecha_venta')
-    return render(request, 'ventas/historial.html', {'pedidos': ventas})
+    return render(request, 'ventas/historial.html', contexto_historial(request))
 
 
 @login_required
@@ -107,82 +103,32 @@ def cambiar_password(request):
 #     REPORTE Y EXPORTACIÓN
 # ------------------------------
 
-@staff_member_required
-@staff_member_required
-def reporte_clientes(request):
-    query = request.GET.get('q', '')
-
-    clientes = Cliente.objects.select_related('user').annotate(
-        total_ordenes=Count('venta'),
-        monto_total_gastado=Sum('venta__total'),
-        ultima_compra=Max('venta__fecha')
-    )
-
-    if query:
-        clientes = clientes.filter(Q(user__username__icontains=query))
-
-    clientes = clientes.order_by('-monto_total_gastado')
-
-    context = {
-        'datos_clientes': clientes,
+def contexto_reporte_clientes(request, orden_por_defecto='monto'):
+    """Contexto del reporte de clientes (también lo usa marketing)."""
+    query = request.GET.get('q', '').strip()
+    orden = request.GET.get('orden', orden_por_defecto)
+    if orden not in ORDENES_REPORTE:
+        orden = orden_por_defecto
+
+    filas, siguiente = pagina_reporte(query, orden, request.GET.get('cursor'))
+    return {
+        'datos_clientes': filas,
+        'total_clientes': ClienteMetricas.objects.count(),
+        'query': query,
+        'orden': orden,
+        'siguiente_cursor': siguiente,
+        'es_primera_pagina': not request.GET.get('cursor'),
         'now': timezone.now(),
     }
-    return render(request, 'clientes/reporte_clientes.html', context)
 
 
+@staff_member_required
+def reporte_clientes(request):
+    context = contexto_reporte_clientes(request, 'monto')
+    return render(request, 'clientes/reporte_clientes.html', context)
 
 
 @staff_member_required
 def exportar_clientes_excel(request):
-    """Genera un archivo Excel con todos los clientes registrados y sus métricas."""
-
-    # Crear el workbook
-    wb = openpyxl.Workbook()
-    ws = wb.active
-    ws.title = "Clientes"
-
-    # Encabezados
-    columnas = [
-        "ID", "Usuario", "Correo", "RUT", "Teléfono",
-        "Dirección", "Fecha de Registro", "Última Compra",
-        "Total de Órdenes", "Monto Total Gastado"
-    ]
-    for col_num, columna in enumerate(columnas, 1):
-        c = ws.cell(row=1, column=col_num)
-        c.value = columna
-        c.font = Font(bold=True)
-
-    # Traer datos con agregaciones
-    clientes = Cliente.objects.select_related('user').annotate(
-        total_ordenes=Count('ventas'),
-        monto_total_gastado=Sum('ventas__total'),
-        ultima_compra=Max('ventas__fecha_venta')
-    )
-
-    # Llenar datos en la hoja
-    for row_num, cliente in enumerate(clientes, 2):
-        ws.cell(row=row_num, column=1, value=cliente.id)
-        ws.cell(row=row_num, column=2, value=cliente.user.username)
-        ws.cell(row=row_num, column=3, value=cliente.user.email)
-        ws.cell(row=row_num, column=4, value=cliente.rut or "N/A")
-        ws.cell(row=row_num, column=5, value=cliente.telefono or "N/A")
-        ws.cell(row=row_num, column=6, value=cliente.direccion or "N/A")
-        ws.cell(row=row_num, column=7, value=cliente.user.date_joined.strftime('%Y-%m-%d'))
-
-        if cliente.ultima_compra:
-            ws.cell(row=row_num, column=8, value=cliente.ultima_compra.strftime('%Y-%m-%d %H:%M'))
-        else:
-            ws.cell(row=row_num, column=8, value="N/A")
-
-        ws.cell(row=row_num, column=9, value=cliente.total_ordenes or 0)
-        ws.cell(row=row_num, column=10, value=float(cliente.monto_total_gastado or 0))
-
-    # Configurar respuesta HTTP
-    response = HttpResponse(
-        content_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
-    )
-    response['Content-Disposition'] = 'attachment; filename=\"reporte_clientes.xlsx\"'
-    wb.save(response)
-    return response
-
-
+    """Encola la exportación de clientes; el archivo lo genera el worker de exportaciones."""
+    return solicitar_exportacion(request, 'clientes', 'clientes:reporte_clientes')
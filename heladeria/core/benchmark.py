@@ -0,0 +1,325 @@
+"""
+Benchmark de las vistas públicas: consultas SQL, tiempo y memoria.
+
+- ``generar_datos(tamano)`` crea un catálogo, clientes y ventas sintéticas
+  con ``bulk_create`` por lotes (ids explícitos, así funciona también en
+  bases que no devuelven ids en inserciones masivas).
+- ``medir(tamano)`` recorre los escenarios y devuelve un dict serializable
+  a JSON por vista: consultas, tiempo en ms y pico de memoria en KiB.
+- ``crecimientos(resultados)`` compara tamaños: el número de consultas de
+  una vista no debe crecer con el volumen de datos.
+- ``consultas_por_vista(staff, comprador)`` recorre los mismos escenarios y
+  devuelve el SQL de cada uno, para el asesor de índices (``core/indices.py``).
+
+Lo usan los comandos ``python manage.py benchmark`` e ``index_advisor`` y
+``core/tests.py``.
+"""
+import random
+import shutil
+import tempfile
+import time
+import tracemalloc
+from dataclasses import asdict, dataclass
+from datetime import timedelta
+from decimal import Decimal
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import connection, reset_queries
+from django.db.models import Max
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from clientes.metricas import reconstruir_metricas
+from clientes.models import Cliente
+from marketing.models import Promocion
+from productos.models import Categoria, Producto
+from ventas.models import DetalleVenta, Venta
+from ventas.resumenes import reconstruir_resumenes
+from .exportaciones import procesar
+from .models import TrabajoExportacion
+
+
+LOTE = 5000
+CONTRASENA = 'benchmark-123'
+
+
+@dataclass(frozen=True)
+class Tamano:
+    nombre: str
+    productos: int
+    clientes: int
+    lineas: int
+    categorias: int = 20
+    lineas_por_venta: int = 4
+
+
+TAMANOS = {
+    'mini': Tamano('mini', productos=60, clientes=100, lineas=600, categorias=4),
+    'chico': Tamano('chico', productos=1_000, clientes=4_000, lineas=40_000),
+    'grande': Tamano('grande', productos=50_000, clientes=200_000, lineas=2_000_000),
+}
+
+
+# --------------------------------------------------------------------------
+# Datos sintéticos
+# --------------------------------------------------------------------------
+
+def _siguiente_id(modelo):
+    return (modelo.objects.aggregate(m=Max('pk'))['m'] or 0) + 1
+
+
+def _insertar(modelo, objetos):
+    lote = []
+    for objeto in objetos:
+        lote.append(objeto)
+        if len(lote) >= LOTE:
+            modelo.objects.bulk_create(lote)
+            lote = []
+    if lote:
+        modelo.objects.bulk_create(lote)
+
+
+def _usuarios_benchmark():
+    """Staff y comprador del benchmark (creados por el ORM, con sus señales)."""
+    staff = User.objects.filter(username='bench_staff').first()
+    if staff:
+        return staff, Cliente.objects.get(user__username='bench_cliente')
+    staff = User.objects.create_superuser('bench_staff', 'staff@bench.cl', CONTRASENA)
+    comprador = Cliente.objects.create(
+        user=User.objects.create_user('bench_cliente', 'cliente@bench.cl', CONTRASENA)
+    )
+    return staff, comprador
+
+
+def generar_datos(tamano, semilla=1):
+    """
+    Agrega a la base los datos de ``tamano`` (puede llamarse varias veces
+    para hacerla crecer). Devuelve ``(staff, usuario_comprador)``.
+    """
+    azar = random.Random(semilla)
+    staff, comprador = _usuarios_benchmark()
+
+    categoria_id = _siguiente_id(Categoria)
+    _insertar(Categoria, (
+        Categoria(id=categoria_id + i, nombre=f"Categoría {categoria_id + i:04d}") for i in range(tamano.categorias)
+    ))
+    producto_id = _siguiente_id(Producto)
+    _insertar(Producto, (
+        Producto(
+            id=producto_id + i,
+            nombre=f"Producto {producto_id + i:07d}",
+            precio=Decimal(azar.randrange(500, 5000)),
+            stock=azar.randrange(0, 500),
+            categoria_id=categoria_id + i % tamano.categorias,
+        )
+        for i in range(tamano.productos)
+    ))
+
+    hash_contrasena = make_password(CONTRASENA)
+    user_id = _siguiente_id(User)
+    _insertar(User, (
+        User(id=user_id + i, username=f"cliente{user_id + i:08d}", email=f"cliente{user_id + i}@bench.cl",
+             password=hash_contrasena)
+        for i in range(tamano.clientes)
+    ))
+    cliente_id = _siguiente_id(Cliente)
+    _insertar(Cliente, (
+        Cliente(id=cliente_id + i, user_id=user_id + i) for i in range(tamano.clientes)
+    ))
+
+    num_ventas = max(1, tamano.lineas // tamano.lineas_por_venta)
+    venta_id = _siguiente_id(Venta)
+    precio = Decimal('1000.00')
+    _insertar(Venta, (
+        Venta(id=venta_id + i, cliente_id=cliente_id + azar.randrange(tamano.clientes),
+              total=precio * tamano.lineas_por_venta)
+        for i in range(num_ventas)
+    ))
+    _insertar(DetalleVenta, (
+        DetalleVenta(
+            venta_id=venta_id + i // tamano.lineas_por_venta,
+            producto_id=producto_id + azar.randrange(tamano.productos),
+            cantidad=1, precio_unitario=precio, subtotal=precio,
+        )
+        for i in range(num_ventas * tamano.lineas_por_venta)
+    ))
+
+    # Algunas promociones globales y por producto
+    hoy = timezone.localdate()
+    for i in range(5):
+        promocion = Promocion.objects.create(
+            nombre=f"Promo {i}", tipo='PORCENTAJE', valor_descuento=5 + i,
+            fecha_inicio=hoy, fecha_fin=hoy + timedelta(days=365), activa=True,
+            es_general=(i == 0),
+        )
+        promocion.productos.add(*azar.sample(range(producto_id, producto_id + tamano.productos),
+                                             min(10, tamano.productos)))
+
+    # Pedidos del comprador: crecen con el tamaño; su historial paginado
+    # debe costar lo mismo (ver ventas/historial.py)
+    pedidos = max(3, tamano.clientes // 10)
+    venta_id = _siguiente_id(Venta)
+    _insertar(Venta, (
+        Venta(id=venta_id + i, cliente=comprador, total=precio * 2,
+              num_lineas=2, unidades=2, resumen=f"Producto {producto_id:07d} x1, Producto {producto_id + 1:07d} x1")
+        for i in range(pedidos)
+    ))
+    _insertar(DetalleVenta, (
+        DetalleVenta(venta_id=venta_id + i // 2, producto_id=producto_id + i % 2,
+                     cantidad=1, precio_unitario=precio, subtotal=precio)
+        for i in range(pedidos * 2)
+    ))
+
+    reconstruir_resumenes()
+    reconstruir_metricas()
+    return staff, comprador.user
+
+
+# --------------------------------------------------------------------------
+# Medición
+# --------------------------------------------------------------------------
+
+@dataclass
+class Medicion:
+    vista: str
+    estado: int
+    consultas: int
+    tiempo_ms: float
+    memoria_kib: float
+
+
+def _preparar_carrito(navegador, productos):
+    for producto_id in productos:
+        navegador.post(reverse('productos:agregar_a_carrito', args=[producto_id]), {'cantidad': 1})
+
+
+def _exportar_clientes(staff):
+    """Procesa la exportación de clientes como lo haría el worker."""
+    # Sin encolar(): una solicitud repetida reutilizaría el archivo anterior
+    trabajo = procesar(TrabajoExportacion.objects.create(
+        tipo='clientes', solicitado_por=staff, estado=TrabajoExportacion.EN_PROCESO,
+    ))
+    return 200 if trabajo.estado == TrabajoExportacion.COMPLETADO else 500
+
+
+def _escenarios(staff, comprador):
+    cliente = Client()
+    cliente.force_login(comprador)
+    admin = Client()
+    admin.force_login(staff)
+    productos = list(Producto.objects.filter(stock__gte=10).order_by('id').values_list('id', flat=True)[:3])
+
+    # nombre → (preparación, ejecución que devuelve el código HTTP)
+    return {
+        'producto_listado': (None, lambda: cliente.get(reverse('productos:producto_listado')).status_code),
+        'ver_carrito': (lambda: _preparar_carrito(cliente, productos),
+                        lambda: cliente.get(reverse('productos:ver_carrito')).status_code),
+        'finalizar_orden': (lambda: _preparar_carrito(cliente, productos),
+                            lambda: cliente.get(reverse('productos:finalizar_orden')).status_code),
+        'historial_pedidos': (None, lambda: cliente.get(reverse('ventas:historial_pedidos')).status_code),
+        'marketing_dashboard': (None, lambda: admin.get(reverse('marketing:marketing_dashboard')).status_code),
+        'reporte_clientes': (None, lambda: admin.get(reverse('clientes:reporte_clientes')).status_code),
+        'marketing_reporte_clientes': (None, lambda: admin.get(reverse('marketing:reporte_clientes')).status_code),
+        'exportar_clientes_excel': (None, lambda: _exportar_clientes(staff)),
+    }
+
+
+def _consultas_relevantes(consultas):
+    # El avance de la exportación se reporta cada N filas: es esperado que crezca
+    return [q for q in consultas if not q['sql'].startswith('UPDATE "core_trabajoexportacion"')
+            and not q['sql'].startswith('UPDATE `core_trabajoexportacion`')]
+
+
+def medir_vista(nombre, preparar, ejecutar):
+    if preparar:
+        preparar()
+    cache.clear()
+    # El registro de consultas tiene tope: si está lleno, la captura no ve nada
+    reset_queries()
+    with CaptureQueriesContext(connection) as consultas:
+        inicio = time.perf_counter()
+        estado = ejecutar()
+        tiempo = (time.perf_counter() - inicio) * 1000
+
+    # Segunda pasada solo para memoria: tracemalloc distorsiona los tiempos
+    if preparar:
+        preparar()
+    cache.clear()
+    tracemalloc.start()
+    ejecutar()
+    _, pico = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return Medicion(
+        vista=nombre,
+        estado=estado,
+        consultas=len(_consultas_relevantes(consultas)),
+        tiempo_ms=round(tiempo, 2),
+        memoria_kib=round(pico / 1024, 1),
+    )
+
+
+def consultas_por_vista(staff, comprador, vistas=None):
+    """Pares ``(vista, sql)`` de cada escenario, con la caché vacía."""
+    pares = []
+    for nombre, (preparar, ejecutar) in _escenarios(staff, comprador).items():
+        if vistas and nombre not in vistas:
+            continue
+        if preparar:
+            preparar()
+        cache.clear()
+        reset_queries()
+        with CaptureQueriesContext(connection) as consultas:
+            ejecutar()
+        pares.extend((nombre, q['sql']) for q in consultas)
+    return pares
+
+
+def medir(tamano, vistas=None):
+    """Genera ``tamano`` en la base vacía y mide las vistas. Devuelve un dict JSON."""
+    media = tempfile.mkdtemp(prefix='benchmark_media_')
+    try:
+        with override_settings(MEDIA_ROOT=media, ALLOWED_HOSTS=['*']):
+            inicio = time.perf_counter()
+            staff, comprador = generar_datos(tamano)
+            segundos_generacion = round(time.perf_counter() - inicio, 2)
+
+            mediciones = []
+            for nombre, (preparar, ejecutar) in _escenarios(staff, comprador).items():
+                if vistas and nombre not in vistas:
+                    continue
+                mediciones.append(medir_vista(nombre, preparar, ejecutar))
+    finally:
+        shutil.rmtree(media, ignore_errors=True)
+
+    return {
+        'tamano': asdict(tamano),
+        'motor_bd': connection.vendor,
+        'segundos_generacion': segundos_generacion,
+        'vistas': {m.vista: asdict(m) for m in mediciones},
+    }
+
+
+def crecimientos(resultados):
+    """
+    Vistas cuyo número de consultas crece con el tamaño de los datos.
+    ``resultados`` es la lista de ``medir()`` en orden de tamaño creciente.
+    """
+    problemas = []
+    base = resultados[0]
+    for resultado in resultados[1:]:
+        for vista, medicion in resultado['vistas'].items():
+            anterior = base['vistas'].get(vista)
+            if anterior and medicion['consultas'] > anterior['consultas']:
+                problemas.append({
+                    'vista': vista,
+                    'tamano_base': base['tamano']['nombre'],
+                    'consultas_base': anterior['consultas'],
+                    'tamano': resultado['tamano']['nombre'],
+                    'consultas': medicion['consultas'],
+                })
+    return problemas
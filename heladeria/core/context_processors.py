@@ -1,25 +1,20 @@
+from productos.carrito import numero_lineas
+from .roles import es_admin, es_mktg_o_admin
 
 
 def roles(request):
-    """Añade booleanos de chequeo de rol al contexto de la plantilla."""
-    
-    
+    """
+    Añade chequeos de rol al contexto de la plantilla. Se evalúan solo si la
+    plantilla los usa y comparten los grupos ya resueltos del request.
+    """
     user = request.user
-    
-    
-    def es_admin():
-        
-        if not user.is_authenticated:
-            return False
-        return user.is_superuser or user.groups.filter(name='Administradores').exists()
+    return {
+        'es_admin_role': lambda: es_admin(user),
+        'es_mktg_o_admin_role': lambda: es_mktg_o_admin(user),
+    }
 
-    def es_mktg_o_admin():
-        if not user.is_authenticated:
-            return False
-        return user.is_superuser or user.groups.filter(name__in=['Administradores', 'Marketing']).exists()
 
-    return {
-        
-        'es_admin_role': es_admin,
-        'es_mktg_o_admin_role': es_mktg_o_admin,
-    }
\ No newline at end of file
+def carrito(request):
+    """Número de líneas del carrito para el menú (se calcula solo si se usa)."""
+    user = request.user
+    return {'carrito_lineas': lambda: numero_lineas(user)}
@@ -0,0 +1,181 @@
+"""
+Cola de exportaciones en segundo plano (sin broker externo).
+
+Las vistas llaman a ``encolar()`` y responden de inmediato; el comando
+``python manage.py procesar_exportaciones`` toma los trabajos pendientes de
+la tabla ``TrabajoExportacion`` y genera los archivos en ``MEDIA_ROOT``.
+
+Cada tipo de exportación es una función registrada en ``EXPORTACIONES`` que
+recibe los parámetros del trabajo y devuelve una ``Exportacion``. Del
+querystring solo se guardan los parámetros que la exportación declara en
+``PARAMETROS``; con ellos se arma la clave que deduplica solicitudes, así
+que un parámetro ajeno (paginación, un ``?_=`` anti caché) no crea otro
+trabajo. Dos trabajos activos con la misma clave los impide el índice único
+de ``clave_activa``, también cuando dos solicitudes llegan a la vez.
+"""
+import hashlib
+import json
+from dataclasses import dataclass
+from datetime import timedelta
+from pathlib import Path
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from utils.excel import generar_xlsx
+from .models import TrabajoExportacion
+
+
+EXPORTACIONES = {
+    'clientes': 'clientes.exportaciones.exportar_clientes',
+    'ventas': 'ventas.exportaciones.exportar_ventas',
+}
+
+# Parámetros de la solicitud que usa cada exportación; el resto se descarta
+PARAMETROS = {
+    'clientes': (),
+    'ventas': (),
+}
+
+# Trabajos pendientes o en curso que puede tener un mismo usuario
+MAX_POR_USUARIO = getattr(settings, 'EXPORTACIONES_MAX_POR_USUARIO', 2)
+# Un archivo recién generado se reutiliza para solicitudes idénticas
+REUTILIZAR_DURANTE = timedelta(minutes=getattr(settings, 'EXPORTACIONES_REUTILIZAR_MINUTOS', 5))
+# Trabajos "en proceso" sin avance por más de este tiempo se consideran caídos
+TIEMPO_SIN_AVANCE = timedelta(minutes=10)
+CADA_N_FILAS = 1000
+
+ACTIVOS = (TrabajoExportacion.PENDIENTE, TrabajoExportacion.EN_PROCESO)
+
+
+class LimiteExportaciones(Exception):
+    """El usuario ya tiene demasiadas exportaciones en curso."""
+
+
+@dataclass
+class Exportacion:
+    encabezados: list
+    filas: object            # iterable de filas ya formateadas
+    total: int
+    nombre_archivo: str
+    titulo: str = "Datos"
+
+
+def calcular_clave(tipo, parametros):
+    contenido = json.dumps([tipo, parametros or {}], sort_keys=True, default=str)
+    return hashlib.sha256(contenido.encode()).hexdigest()
+
+
+def _reutilizable(clave):
+    """Trabajo activo con ``clave``, o uno completado hace poco."""
+    return (
+        TrabajoExportacion.objects.filter(clave_activa=clave).first()
+        or TrabajoExportacion.objects.filter(
+            clave=clave,
+            estado=TrabajoExportacion.COMPLETADO,
+            terminado__gte=timezone.now() - REUTILIZAR_DURANTE,
+        ).order_by('-terminado').first()
+    )
+
+
+def encolar(tipo, usuario, parametros=None):
+    """
+    Devuelve el trabajo que atenderá la solicitud: uno idéntico ya activo o
+    recién terminado si existe (deduplicación), o uno nuevo en la cola.
+    """
+    if tipo not in EXPORTACIONES:
+        raise ValueError(f"Tipo de exportación desconocido: {tipo}")
+    parametros = {k: v for k, v in (parametros or {}).items() if k in PARAMETROS[tipo]}
+    clave = calcular_clave(tipo, parametros)
+
+    existente = _reutilizable(clave)
+    if existente:
+        return existente
+
+    en_curso = TrabajoExportacion.objects.filter(solicitado_por=usuario, estado__in=ACTIVOS).count()
+    if en_curso >= MAX_POR_USUARIO:
+        raise LimiteExportaciones(
+            f"Ya tienes {en_curso} exportaciones en curso. Espera a que terminen."
+        )
+
+    try:
+        with transaction.atomic():
+            return TrabajoExportacion.objects.create(
+                tipo=tipo, parametros=parametros, clave=clave, clave_activa=clave, solicitado_por=usuario
+            )
+    except IntegrityError:
+        # Una solicitud idéntica lo encoló entre la búsqueda y el insert
+        return TrabajoExportacion.objects.filter(clave=clave).latest('creado')
+
+
+def reencolar_caidos():
+    """Vuelve a la cola los trabajos cuyo worker dejó de reportar avance."""
+    return TrabajoExportacion.objects.filter(
+        estado=TrabajoExportacion.EN_PROCESO,
+        actualizado__lt=timezone.now() - TIEMPO_SIN_AVANCE,
+    ).update(estado=TrabajoExportacion.PENDIENTE, procesadas=0)
+
+
+def tomar_siguiente():
+    """Reserva el trabajo pendiente más antiguo (seguro con varios workers)."""
+    with transaction.atomic():
+        trabajo = (
+            TrabajoExportacion.objects
+            .select_for_update(skip_locked=True)
+            .filter(estado=TrabajoExportacion.PENDIENTE)
+            .order_by('creado')
+            .first()
+        )
+        if trabajo is None:
+            return None
+        trabajo.estado = TrabajoExportacion.EN_PROCESO
+        trabajo.save(update_fields=['estado', 'actualizado'])
+    return trabajo
+
+
+def _con_avance(trabajo, filas):
+    procesadas = 0
+    for fila in filas:
+        yield fila
+        procesadas += 1
+        if procesadas % CADA_N_FILAS == 0:
+            TrabajoExportacion.objects.filter(pk=trabajo.pk).update(
+                procesadas=procesadas, actualizado=timezone.now()
+            )
+
+
+def procesar(trabajo):
+    """Genera el archivo de un trabajo ya reservado con ``tomar_siguiente()``."""
+    ruta = None
+    try:
+        exportacion = import_string(EXPORTACIONES[trabajo.tipo])(trabajo.parametros)
+        TrabajoExportacion.objects.filter(pk=trabajo.pk).update(total=exportacion.total)
+
+        nombre = f"exportaciones/{trabajo.pk}_{exportacion.nombre_archivo}"
+        ruta = Path(settings.MEDIA_ROOT) / nombre
+        ruta.parent.mkdir(parents=True, exist_ok=True)
+        with open(ruta, 'wb') as destino:
+            for bloque in generar_xlsx(
+                exportacion.encabezados,
+                _con_avance(trabajo, exportacion.filas),
+                titulo=exportacion.titulo,
+            ):
+                destino.write(bloque)
+
+        trabajo.refresh_from_db()
+        trabajo.archivo.name = nombre
+        trabajo.procesadas = trabajo.total
+        trabajo.estado = TrabajoExportacion.COMPLETADO
+    except Exception as e:
+        # No dejar en MEDIA_ROOT un XLSX a medio escribir
+        if ruta is not None:
+            ruta.unlink(missing_ok=True)
+        trabajo.refresh_from_db()
+        trabajo.estado = TrabajoExportacion.ERROR
+        trabajo.error = str(e)
+    trabajo.clave_activa = None
+    trabajo.terminado = timezone.now()
+    trabajo.save()
+    return trabajo
@@ -0,0 +1,245 @@
+"""
+Asesor de índices: ``EXPLAIN`` de las consultas que hacen las vistas.
+
+``analizar(consultas)`` recibe pares ``(vista, sql)`` (los que captura el
+benchmark), agrupa las sentencias por huella (``instrumentacion.huella_sql``)
+y explica una de cada grupo con el plan del motor en uso:
+
+- MySQL: ``EXPLAIN``; ``type = ALL``/``index`` es un recorrido completo y
+  ``Using filesort``/``Using temporary`` un orden o agrupación en memoria.
+- SQLite: ``EXPLAIN QUERY PLAN``; ``SCAN tabla`` sin índice y
+  ``USE TEMP B-TREE``.
+- PostgreSQL: ``EXPLAIN``; ``Seq Scan`` y nodos ``Sort``.
+
+Las tablas con menos de ``min_filas`` filas no se reportan: ahí un recorrido
+completo es lo más barato. Para cada hallazgo se sugiere un índice con la
+regla igualdad → orden → rango, usando las columnas de la tabla que aparecen
+en el ``WHERE`` y el ``ORDER BY``; si un índice existente ya empieza por esas
+columnas no se sugiere nada.
+
+Lo usa el comando ``python manage.py index_advisor``.
+"""
+import re
+from dataclasses import dataclass, field
+
+from django.apps import apps
+from django.db import connection
+
+from .instrumentacion import huella_sql
+
+
+RECORRIDO_COMPLETO = 'RECORRIDO_COMPLETO'
+ORDEN_EN_MEMORIA = 'ORDEN_EN_MEMORIA'
+TEMPORAL = 'TEMPORAL'
+
+MIN_FILAS = 1000
+
+_REFERENCIA = re.compile(r'[`"]?(\w+)[`"]?\.[`"](\w+)[`"]')
+_ALIAS = re.compile(r'(?:FROM|JOIN)\s+[`"](\w+)[`"](?:\s+(?:AS\s+)?([A-Za-z]\w*))?', re.IGNORECASE)
+_CLAUSULAS = re.compile(r'\b(SELECT|FROM|WHERE|ORDER BY|GROUP BY|HAVING|LIMIT|ON)\b', re.IGNORECASE)
+_IGUALDAD = re.compile(r'\s*(=|IN\s*\(|IS\s+NULL)', re.IGNORECASE)
+_PALABRAS_SQL = {'WHERE', 'INNER', 'LEFT', 'RIGHT', 'JOIN', 'ON', 'ORDER', 'GROUP', 'LIMIT', 'WINDOW', 'HAVING'}
+
+
+@dataclass
+class Hallazgo:
+    tabla: str
+    problema: str
+    detalle: str
+
+
+@dataclass
+class Analisis:
+    sql: str
+    vistas: set = field(default_factory=set)
+    hallazgos: list = field(default_factory=list)
+    sugerencias: dict = field(default_factory=dict)  # etiqueta del modelo → (modelo, [campos])
+
+
+# --------------------------------------------------------------------------
+# Planes de ejecución
+# --------------------------------------------------------------------------
+
+def _alias(sql):
+    """alias (o nombre) → tabla, para traducir lo que muestra el plan."""
+    alias = {}
+    for tabla, nombre in _ALIAS.findall(sql):
+        alias[tabla] = tabla
+        if nombre and nombre.upper() not in _PALABRAS_SQL:
+            alias[nombre] = tabla
+    return alias
+
+
+def _plan_sqlite(cursor, sql, alias):
+    cursor.execute('EXPLAIN QUERY PLAN ' + sql)
+    hallazgos = []
+    for *_, detalle in cursor.fetchall():
+        escaneo = re.match(r'SCAN (\w+)', detalle)
+        if escaneo and 'INDEX' not in detalle and escaneo.group(1) in alias:
+            hallazgos.append(Hallazgo(alias[escaneo.group(1)], RECORRIDO_COMPLETO, detalle))
+        elif 'USE TEMP B-TREE FOR ORDER BY' in detalle or 'USE TEMP B-TREE FOR RIGHT PART OF ORDER BY' in detalle:
+            hallazgos.append(Hallazgo('', ORDEN_EN_MEMORIA, detalle))
+        elif 'USE TEMP B-TREE' in detalle:
+            hallazgos.append(Hallazgo('', TEMPORAL, detalle))
+    return hallazgos
+
+
+def _plan_mysql(cursor, sql, alias):
+    cursor.execute('EXPLAIN ' + sql)
+    columnas = [c[0] for c in cursor.description]
+    hallazgos = []
+    for fila in cursor.fetchall():
+        fila = dict(zip(columnas, fila))
+        tabla = alias.get(fila.get('table') or '', '')
+        extra = fila.get('Extra') or ''
+        detalle = f"type={fila.get('type')} key={fila.get('key')} rows={fila.get('rows')} {extra}".strip()
+        if tabla and fila.get('type') in ('ALL', 'index'):
+            hallazgos.append(Hallazgo(tabla, RECORRIDO_COMPLETO, detalle))
+        if 'Using filesort' in extra:
+            hallazgos.append(Hallazgo(tabla, ORDEN_EN_MEMORIA, detalle))
+        if 'Using temporary' in extra:
+            hallazgos.append(Hallazgo(tabla, TEMPORAL, detalle))
+    return hallazgos
+
+
+def _plan_postgresql(cursor, sql, alias):
+    cursor.execute('EXPLAIN ' + sql)
+    hallazgos = []
+    for (linea,) in cursor.fetchall():
+        escaneo = re.search(r'Seq Scan on (\w+)', linea)
+        if escaneo:
+            hallazgos.append(Hallazgo(alias.get(escaneo.group(1), escaneo.group(1)), RECORRIDO_COMPLETO, linea.strip()))
+        elif re.search(r'(->\s+|^)Sort\b', linea.strip()):
+            hallazgos.append(Hallazgo('', ORDEN_EN_MEMORIA, linea.strip()))
+    return hallazgos
+
+
+PLANES = {'sqlite': _plan_sqlite, 'mysql': _plan_mysql, 'postgresql': _plan_postgresql}
+
+
+def explicar(sql):
+    """Hallazgos del plan de ``sql`` en la base actual (vacío si el motor no se soporta)."""
+    plan = PLANES.get(connection.vendor)
+    if plan is None:
+        return []
+    alias = _alias(sql)
+    with connection.cursor() as cursor:
+        hallazgos = plan(cursor, sql, alias)
+    # Un orden sin tabla identificada se atribuye a la tabla principal
+    principal = next(iter(alias.values()), '')
+    for hallazgo in hallazgos:
+        hallazgo.tabla = hallazgo.tabla or principal
+    return hallazgos
+
+
+def actualizar_estadisticas():
+    """Estadísticas al día para que el planificador elija como lo haría en producción."""
+    with connection.cursor() as cursor:
+        if connection.vendor == 'mysql':
+            tablas = ', '.join(connection.ops.quote_name(t) for t in connection.introspection.table_names())
+            cursor.execute(f'ANALYZE TABLE {tablas}')
+            cursor.fetchall()
+        elif connection.vendor in ('sqlite', 'postgresql'):
+            cursor.execute('ANALYZE')
+
+
+# --------------------------------------------------------------------------
+# Sugerencias
+# --------------------------------------------------------------------------
+
+def _modelo_de(tabla):
+    return next((m for m in apps.get_models(include_auto_created=True) if m._meta.db_table == tabla), None)
+
+
+def _columnas(sql, tabla, alias):
+    """Columnas de ``tabla`` en el WHERE (igualdad / rango) y en el ORDER BY, en orden."""
+    nombres = {n for n, t in alias.items() if t == tabla}
+    clausulas = [(m.start(), m.group(1).upper()) for m in _CLAUSULAS.finditer(sql)]
+    igualdad, rango, orden = [], [], []
+    for ref in _REFERENCIA.finditer(sql):
+        if ref.group(1) not in nombres:
+            continue
+        clausula = next((c for inicio, c in reversed(clausulas) if inicio < ref.start()), None)
+        columna = ref.group(2)
+        if clausula == 'WHERE':
+            destino = igualdad if _IGUALDAD.match(sql, ref.end()) else rango
+            destino.append(columna)
+        elif clausula == 'ORDER BY':
+            descendente = re.match(r'\s+DESC\b', sql[ref.end():], re.IGNORECASE)
+            orden.append(('-' if descendente else '') + columna)
+    return igualdad, orden, rango
+
+
+def _indices_existentes(modelo):
+    meta = modelo._meta
+    existentes = [[f.lstrip('-') for f in indice.fields] for indice in meta.indexes]
+    existentes += [list(c.fields) for c in meta.constraints if getattr(c, 'fields', None)]
+    existentes += [list(campos) for campos in meta.unique_together]
+    existentes += [[f.name] for f in meta.concrete_fields if f.primary_key or f.unique or f.db_index]
+    return existentes
+
+
+def sugerir(sql, tabla):
+    """``(modelo, [campos])`` de un índice que evitaría el hallazgo, o None."""
+    modelo = _modelo_de(tabla)
+    if modelo is None:
+        return None
+    igualdad, orden, rango = _columnas(sql, tabla, _alias(sql))
+    por_columna = {f.column: f.name for f in modelo._meta.concrete_fields}
+
+    campos = []
+    for columna in igualdad + orden + rango[:1]:
+        nombre = por_columna.get(columna.lstrip('-'))
+        if nombre and nombre != modelo._meta.pk.name and nombre not in {c.lstrip('-') for c in campos}:
+            campos.append(('-' if columna.startswith('-') else '') + nombre)
+    if not campos:
+        return None
+    simples = [c.lstrip('-') for c in campos]
+    if any(existente[:len(simples)] == simples for existente in _indices_existentes(modelo)):
+        return None
+    return modelo, campos
+
+
+def nombre_indice(modelo, campos):
+    nombre = '_'.join([modelo._meta.model_name] + [c.lstrip('-') for c in campos])
+    return nombre[:26].rstrip('_') + '_idx'
+
+
+# --------------------------------------------------------------------------
+# Análisis completo
+# --------------------------------------------------------------------------
+
+def _filas(tabla, conteos):
+    if tabla not in conteos:
+        with connection.cursor() as cursor:
+            cursor.execute(f'SELECT COUNT(*) FROM {connection.ops.quote_name(tabla)}')
+            conteos[tabla] = cursor.fetchone()[0]
+    return conteos[tabla]
+
+
+def analizar(consultas, min_filas=MIN_FILAS):
+    """
+    ``consultas``: pares ``(vista, sql)``. Devuelve los ``Analisis`` con algún
+    hallazgo sobre tablas de al menos ``min_filas`` filas.
+    """
+    por_huella = {}
+    for vista, sql in consultas:
+        if not sql.lstrip().upper().startswith('SELECT'):
+            continue
+        analisis = por_huella.setdefault(huella_sql(sql), Analisis(sql))
+        analisis.vistas.add(vista)
+
+    conteos = {}
+    resultado = []
+    for analisis in por_huella.values():
+        for hallazgo in explicar(analisis.sql):
+            if not hallazgo.tabla or _filas(hallazgo.tabla, conteos) < min_filas:
+                continue
+            analisis.hallazgos.append(hallazgo)
+            sugerencia = sugerir(analisis.sql, hallazgo.tabla)
+            if sugerencia:
+                modelo, campos = sugerencia
+                analisis.sugerencias[modelo._meta.label] = (modelo, campos)
+        if analisis.hallazgos:
+            resultado.append(analisis)
+    return resultado
@@ -0,0 +1,246 @@
+"""
+Instrumentación por request: consultas SQL, tiempos y log de requests lentos.
+
+``MiddlewareInstrumentacion`` mide cada request con
+``connection.execute_wrapper`` (cantidad y tiempo de las consultas) y
+cronometra el render de las plantillas envolviendo ``Template.render`` del
+backend de Django; el envoltorio lo instala el middleware al activarse. Con
+eso separa el tiempo total en SQL, plantillas y Python.
+
+- Los requests que superan ``INSTRUMENTACION_LENTO_MS`` o
+  ``INSTRUMENTACION_LENTO_CONSULTAS`` se escriben como JSON en el logger
+  ``heladeria.lentas``, con las consultas más repetidas (huellas SQL).
+- Los totales por vista se publican en formato de texto de Prometheus en
+  ``/metricas/`` (``core.views.metricas``): solo para el staff o con el
+  token ``INSTRUMENTACION_TOKEN_METRICAS``.
+  Los contadores son del proceso: con varios workers, Prometheus debe
+  consultar cada uno o sumar por instancia.
+
+El costo por consulta es un par de lecturas de reloj y un incremento en un
+diccionario; las huellas solo se normalizan cuando un request es lento.
+"""
+import contextvars
+import json
+import logging
+import re
+import threading
+import time
+from collections import Counter, defaultdict
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.template.backends.django import Template as PlantillaDjango
+
+
+TOP_HUELLAS = 5
+# Buckets del histograma de duración (segundos)
+BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+log_lentas = logging.getLogger('heladeria.lentas')
+
+_medicion_actual = contextvars.ContextVar('medicion_actual', default=None)
+
+
+class Medicion:
+    """Contadores de un request."""
+
+    __slots__ = ('consultas', 'segundos_sql', 'segundos_plantillas', 'sql_en_plantillas',
+                 'en_plantilla', 'sentencias')
+
+    def __init__(self):
+        self.consultas = 0
+        self.segundos_sql = 0.0
+        self.segundos_plantillas = 0.0
+        self.sql_en_plantillas = 0.0
+        self.en_plantilla = False
+        self.sentencias = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        # Firma de connection.execute_wrapper
+        inicio = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duracion = time.perf_counter() - inicio
+            self.consultas += 1
+            self.segundos_sql += duracion
+            if self.en_plantilla:
+                self.sql_en_plantillas += duracion
+            self.sentencias[sql] += 1
+
+
+def _render_medido(render_original):
+    def render(self, context=None, request=None):
+        medicion = _medicion_actual.get()
+        if medicion is None or medicion.en_plantilla:
+            return render_original(self, context, request)
+        medicion.en_plantilla = True
+        inicio = time.perf_counter()
+        try:
+            return render_original(self, context, request)
+        finally:
+            medicion.segundos_plantillas += time.perf_counter() - inicio
+            medicion.en_plantilla = False
+    render.original = render_original
+    return render
+
+
+def instalar_medicion_plantillas():
+    """
+    Envuelve ``Template.render`` del backend de Django. Lo instala el
+    middleware al activarse (no el import del módulo), así que con la
+    instrumentación apagada las plantillas quedan intactas. Idempotente.
+    """
+    if not hasattr(PlantillaDjango.render, 'original'):
+        PlantillaDjango.render = _render_medido(PlantillaDjango.render)
+
+
+# --------------------------------------------------------------------------
+# Huellas SQL
+# --------------------------------------------------------------------------
+
+_LISTAS = re.compile(r'\((?:\s*%s\s*,)+\s*%s\s*\)')
+_LITERALES = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+_ESPACIOS = re.compile(r'\s+')
+
+
+def huella_sql(sql):
+    """SQL normalizado: sin literales y con las listas ``IN (...)`` colapsadas."""
+    sql = _LISTAS.sub('(%s, ...)', sql)
+    sql = _LITERALES.sub('?', sql)
+    return _ESPACIOS.sub(' ', sql).strip()
+
+
+def huellas_repetidas(sentencias, top=TOP_HUELLAS):
+    huellas = Counter()
+    for sql, veces in sentencias.items():
+        huellas[huella_sql(sql)] += veces
+    return [{'sql': sql, 'veces': veces} for sql, veces in huellas.most_common(top)]
+
+
+# --------------------------------------------------------------------------
+# Métricas acumuladas del proceso
+# --------------------------------------------------------------------------
+
+class Metricas:
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reiniciar()
+
+    def reiniciar(self):
+        with self._lock:
+            self.por_vista = defaultdict(lambda: {
+                'requests': 0, 'lentos': 0, 'consultas': 0,
+                'segundos': 0.0, 'segundos_sql': 0.0, 'segundos_plantillas': 0.0,
+                'buckets': [0] * len(BUCKETS),
+            })
+
+    def registrar(self, vista, segundos, medicion, lento):
+        with self._lock:
+            datos = self.por_vista[vista]
+            datos['requests'] += 1
+            datos['lentos'] += int(lento)
+            datos['consultas'] += medicion.consultas
+            datos['segundos'] += segundos
+            datos['segundos_sql'] += medicion.segundos_sql
+            datos['segundos_plantillas'] += medicion.segundos_plantillas
+            for i, limite in enumerate(BUCKETS):
+                if segundos <= limite:
+                    datos['buckets'][i] += 1
+
+    def prometheus(self):
+        """Texto de exposición de Prometheus (versión 0.0.4)."""
+        with self._lock:
+            vistas = {vista: dict(datos, buckets=list(datos['buckets'])) for vista, datos in self.por_vista.items()}
+
+        lineas = []
+
+        def serie(nombre, tipo, ayuda, valores):
+            lineas.append(f'# HELP {nombre} {ayuda}')
+            lineas.append(f'# TYPE {nombre} {tipo}')
+            lineas.extend(valores)
+
+        def etiqueta(vista):
+            return vista.replace('\\', '\\\\').replace('"', '\\"')
+
+        serie('heladeria_requests_total', 'counter', 'Requests atendidos por vista.',
+              [f'heladeria_requests_total{{vista="{etiqueta(v)}"}} {d["requests"]}' for v, d in vistas.items()])
+        serie('heladeria_requests_lentos_total', 'counter', 'Requests sobre los umbrales de lentitud.',
+              [f'heladeria_requests_lentos_total{{vista="{etiqueta(v)}"}} {d["lentos"]}' for v, d in vistas.items()])
+        serie('heladeria_sql_consultas_total', 'counter', 'Consultas SQL ejecutadas.',
+              [f'heladeria_sql_consultas_total{{vista="{etiqueta(v)}"}} {d["consultas"]}' for v, d in vistas.items()])
+        serie('heladeria_sql_segundos_total', 'counter', 'Tiempo total en consultas SQL.',
+              [f'heladeria_sql_segundos_total{{vista="{etiqueta(v)}"}} {d["segundos_sql"]:.6f}' for v, d in vistas.items()])
+        serie('heladeria_plantillas_segundos_total', 'counter', 'Tiempo total renderizando plantillas.',
+              [f'heladeria_plantillas_segundos_total{{vista="{etiqueta(v)}"}} {d["segundos_plantillas"]:.6f}'
+               for v, d in vistas.items()])
+
+        histograma = []
+        for vista, datos in vistas.items():
+            for limite, cantidad in zip(BUCKETS, datos['buckets']):
+                histograma.append(
+                    f'heladeria_request_segundos_bucket{{vista="{etiqueta(vista)}",le="{limite}"}} {cantidad}'
+                )
+            histograma.append(f'heladeria_request_segundos_bucket{{vista="{etiqueta(vista)}",le="+Inf"}} {datos["requests"]}')
+            histograma.append(f'heladeria_request_segundos_sum{{vista="{etiqueta(vista)}"}} {datos["segundos"]:.6f}')
+            histograma.append(f'heladeria_request_segundos_count{{vista="{etiqueta(vista)}"}} {datos["requests"]}')
+        serie('heladeria_request_segundos', 'histogram', 'Duración de los requests.', histograma)
+        return '\n'.join(lineas) + '\n'
+
+
+metricas = Metricas()
+
+
+# --------------------------------------------------------------------------
+# Middleware y endpoint
+# --------------------------------------------------------------------------
+
+class MiddlewareInstrumentacion:
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'INSTRUMENTACION_ACTIVA', True):
+            raise MiddlewareNotUsed
+        instalar_medicion_plantillas()
+        self.get_response = get_response
+        self.lento_ms = getattr(settings, 'INSTRUMENTACION_LENTO_MS', 500)
+        self.lento_consultas = getattr(settings, 'INSTRUMENTACION_LENTO_CONSULTAS', 50)
+
+    def __call__(self, request):
+        medicion = Medicion()
+        token = _medicion_actual.set(medicion)
+        inicio = time.perf_counter()
+        try:
+            with ExitStack() as pila:
+                for conexion in connections.all():
+                    pila.enter_context(conexion.execute_wrapper(medicion))
+                response = self.get_response(request)
+        finally:
+            _medicion_actual.reset(token)
+        segundos = time.perf_counter() - inicio
+
+        match = getattr(request, 'resolver_match', None)
+        vista = match.view_name if match else 'sin_ruta'
+        lento = segundos * 1000 >= self.lento_ms or medicion.consultas >= self.lento_consultas
+        metricas.registrar(vista, segundos, medicion, lento)
+        if lento:
+            self._registrar_lento(request, response, vista, segundos, medicion)
+        return response
+
+    def _registrar_lento(self, request, response, vista, segundos, medicion):
+        plantillas = medicion.segundos_plantillas - medicion.sql_en_plantillas
+        log_lentas.warning(json.dumps({
+            'metodo': request.method,
+            'ruta': request.path,
+            'vista': vista,
+            'estado': response.status_code,
+            'ms_total': round(segundos * 1000, 1),
+            'ms_sql': round(medicion.segundos_sql * 1000, 1),
+            'ms_plantillas': round(plantillas * 1000, 1),
+            'ms_python': round((segundos - medicion.segundos_sql - plantillas) * 1000, 1),
+            'consultas': medicion.consultas,
+            'huellas': huellas_repetidas(medicion.sentencias),
+        }, ensure_ascii=False))
+
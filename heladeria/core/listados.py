@@ -0,0 +1,141 @@
+"""
+Piezas para listados del admin sobre tablas grandes.
+
+- ``PaginadorEstimado``: el admin pide ``COUNT(*)`` de la consulta filtrada
+  (y otro de la tabla completa si ``show_full_result_count``). Con millones
+  de filas cada uno recorre la tabla entera. Este paginador:
+
+  * sin filtros, usa la estimación de filas que el motor ya guarda en sus
+    estadísticas (MySQL ``information_schema.TABLES``, PostgreSQL
+    ``pg_class.reltuples``); SQLite no tiene estimación;
+  * con filtros (o sin estimación, o en tablas chicas), cuenta a lo más
+    ``ADMIN_CONTEO_TOPE`` + 1 filas: ``COUNT`` sobre una subconsulta con
+    ``LIMIT``, que se detiene al llegar al tope.
+
+  Cada página cuesta lo mismo, pero más allá del tope (o de una estimación
+  baja) el conteo es solo una cota inferior. Para que esas filas se puedan
+  alcanzar, con un conteo no exacto se acepta cualquier número de página:
+  ``page()`` lee la página sin recortarla al conteo y, si sale llena, suma
+  la siguiente al rango de páginas. ``admin/pagination.html``
+  (core/templates) muestra "más de N" o "~N" con ``conteo_mostrado``. Los
+  ``ModelAdmin`` lo usan junto con ``show_full_result_count = False``.
+
+- ``FiltroPorRangos``: filtro lateral con rangos fijos de un campo numérico.
+  ``list_filter = ('stock',)`` arma sus opciones con un ``DISTINCT`` sobre
+  todos los valores del campo; los rangos no consultan la base para
+  dibujarse y filtran con ``>=``/``<`` sobre el índice del campo.
+"""
+from django.conf import settings
+from django.contrib import admin
+from django.core.paginator import EmptyPage, PageNotAnInteger, Paginator
+from django.db import connection
+from django.utils.functional import cached_property
+
+
+def conteo_tope():
+    return getattr(settings, 'ADMIN_CONTEO_TOPE', 10000)
+
+
+def filas_estimadas(modelo):
+    """Filas de la tabla de ``modelo`` según las estadísticas del motor, o None."""
+    tabla = modelo._meta.db_table
+    if connection.vendor == 'mysql':
+        sql = ("SELECT TABLE_ROWS FROM information_schema.TABLES "
+               "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s")
+    elif connection.vendor == 'postgresql':
+        sql = "SELECT reltuples::bigint FROM pg_class WHERE relname = %s"
+    else:
+        return None
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [tabla])
+        fila = cursor.fetchone()
+    # reltuples es -1 en tablas nunca analizadas
+    return fila[0] if fila and fila[0] is not None and fila[0] >= 0 else None
+
+
+class PaginadorEstimado(Paginator):
+    # Última página leída que vino llena: puede haber otra después
+    _pagina_llena = 0
+
+    @cached_property
+    def _conteo(self):
+        """``(conteo, etiqueta)``; la etiqueta es None si el conteo es exacto."""
+        tope = conteo_tope()
+        consulta = self.object_list
+        if not consulta.query.where:
+            estimadas = filas_estimadas(consulta.model)
+            if estimadas is not None and estimadas > tope:
+                return estimadas, f"~{estimadas}"
+        # Solo la llave: las anotaciones de la página no entran en el conteo
+        conteo = consulta.order_by().values('pk')[:tope + 1].count()
+        return conteo, (f"más de {tope}" if conteo > tope else None)
+
+    @property
+    def count(self):
+        return self._conteo[0]
+
+    @property
+    def exacto(self):
+        return self._conteo[1] is None
+
+    @property
+    def conteo_mostrado(self):
+        return self._conteo[1] or self.count
+
+    @property
+    def num_pages(self):
+        paginas = Paginator.num_pages.func(self)
+        if self.exacto:
+            return paginas
+        return max(paginas, self._pagina_llena + 1)
+
+    def validate_number(self, number):
+        if self.exacto:
+            return super().validate_number(number)
+        try:
+            numero = int(number)
+        except (TypeError, ValueError):
+            raise PageNotAnInteger("La página no es un número entero.")
+        if numero < 1:
+            raise EmptyPage("La página es menor que 1.")
+        return numero
+
+    def page(self, number):
+        if self.exacto:
+            return super().page(number)
+        numero = self.validate_number(number)
+        desde = (numero - 1) * self.per_page
+        filas = self.object_list[desde:desde + self.per_page]
+        # len() evalúa la página una vez; el admin reutiliza ese resultado
+        cantidad = len(filas)
+        if not cantidad and numero > 1:
+            raise EmptyPage("Esa página no contiene resultados.")
+        if cantidad == self.per_page:
+            self._pagina_llena = max(self._pagina_llena, numero)
+        return self._get_page(filas, numero, self)
+
+
+class FiltroPorRangos(admin.SimpleListFilter):
+    """
+    ``rangos``: tuplas ``(clave, etiqueta, desde, hasta)``; ``desde`` es
+    inclusivo, ``hasta`` exclusivo y cualquiera de los dos puede ser None.
+    Las subclases con rangos que dependen del día redefinen ``get_rangos``.
+    """
+    campo = None
+    rangos = ()
+
+    def get_rangos(self):
+        return self.rangos
+
+    def lookups(self, request, model_admin):
+        return [(clave, etiqueta) for clave, etiqueta, _, _ in self.get_rangos()]
+
+    def queryset(self, request, queryset):
+        for clave, _, desde, hasta in self.get_rangos():
+            if self.value() == clave:
+                if desde is not None:
+                    queryset = queryset.filter(**{f'{self.campo}__gte': desde})
+                if hasta is not None:
+                    queryset = queryset.filter(**{f'{self.campo}__lt': hasta})
+                return queryset
+        return queryset
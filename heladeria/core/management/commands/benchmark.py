@@ -0,0 +1,82 @@
+import json
+from dataclasses import replace
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import setup_test_environment, teardown_test_environment
+
+from core.benchmark import TAMANOS, Tamano, crecimientos, medir
+
+
+class Command(BaseCommand):
+    help = ('Mide consultas, tiempo y memoria de las vistas principales con datos '
+            'sintéticos en una base de pruebas desechable. Falla si las consultas '
+            'de alguna vista crecen con el tamaño de los datos.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--tamanos', default='mini,chico',
+                            help=f'Tamanos a medir, de menor a mayor ({", ".join(TAMANOS)}).')
+        parser.add_argument('--productos', type=int, help='Tamano personalizado: productos.')
+        parser.add_argument('--clientes', type=int, help='Tamano personalizado: clientes.')
+        parser.add_argument('--lineas', type=int, help='Tamano personalizado: líneas de venta.')
+        parser.add_argument('--vistas', help='Solo estas vistas (separadas por coma).')
+        parser.add_argument('--salida', default='benchmark.json', help='Archivo JSON de resultados.')
+
+    def _tamanos(self, options):
+        tamanos = []
+        for nombre in filter(None, options['tamanos'].split(',')):
+            if nombre not in TAMANOS:
+                raise CommandError(f'Tamano desconocido: {nombre}')
+            tamanos.append(TAMANOS[nombre])
+        if any(options[campo] for campo in ('productos', 'clientes', 'lineas')):
+            base = tamanos[-1] if tamanos else TAMANOS['mini']
+            tamanos.append(replace(
+                base, nombre='personalizado',
+                productos=options['productos'] or base.productos,
+                clientes=options['clientes'] or base.clientes,
+                lineas=options['lineas'] or base.lineas,
+            ))
+        if not tamanos:
+            raise CommandError('Indica al menos un tamano.')
+        return tamanos
+
+    def handle(self, *args, **options):
+        tamanos = self._tamanos(options)
+        vistas = set(options['vistas'].split(',')) if options['vistas'] else None
+
+        resultados = []
+        setup_test_environment()
+        try:
+            for tamano in tamanos:
+                self.stdout.write(f'Tamano {tamano.nombre}: {tamano.productos} productos, '
+                                  f'{tamano.clientes} clientes, {tamano.lineas} líneas...')
+                # Base de pruebas nueva para cada tamano; nunca se toca la base real
+                nombre_original = connection.settings_dict['NAME']
+                connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+                try:
+                    resultado = medir(tamano, vistas)
+                finally:
+                    connection.creation.destroy_test_db(nombre_original, verbosity=0)
+                resultados.append(resultado)
+                for medicion in resultado['vistas'].values():
+                    self.stdout.write(
+                        f"  {medicion['vista']:28} {medicion['estado']}  "
+                        f"{medicion['consultas']:4} consultas  {medicion['tiempo_ms']:9.1f} ms  "
+                        f"{medicion['memoria_kib']:9.1f} KiB"
+                    )
+        finally:
+            teardown_test_environment()
+
+        problemas = crecimientos(resultados)
+        with open(options['salida'], 'w', encoding='utf-8') as archivo:
+            json.dump({'resultados': resultados, 'crecimientos': problemas}, archivo, indent=2)
+        self.stdout.write(f'Resultados en {options["salida"]}')
+
+        if problemas:
+            for p in problemas:
+                self.stderr.write(self.style.ERROR(
+                    f"{p['vista']}: {p['consultas_base']} consultas con '{p['tamano_base']}' "
+                    f"→ {p['consultas']} con '{p['tamano']}'"
+                ))
+            raise CommandError('El número de consultas crece con el tamaño de los datos.')
+        self.stdout.write(self.style.SUCCESS('Ninguna vista aumenta sus consultas con el tamaño.'))
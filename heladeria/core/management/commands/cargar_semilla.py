@@ -0,0 +1,47 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core.benchmark import TAMANOS, generar_datos
+from core.semilla import FIXTURES, LOTE, cargar_fixtures, recalcular_derivados
+
+
+class Command(BaseCommand):
+    help = 'Carga las fixtures (o genera datos sintéticos) con inserciones masivas y sin señales'
+
+    def add_arguments(self, parser):
+        parser.add_argument('fixtures', nargs='*',
+                            help='Archivos .json/.jsonl/.xml; por defecto las fixtures del proyecto en orden.')
+        parser.add_argument('--lote', type=int, default=LOTE,
+                            help='Objetos por INSERT.')
+        parser.add_argument('--descontar-stock', action='store_true',
+                            help='Resta del stock las unidades de los DetalleVenta cargados.')
+        parser.add_argument('--generar', choices=sorted(TAMANOS),
+                            help='Genera datos sintéticos de este tamaño en vez de cargar fixtures.')
+
+    def handle(self, *args, **options):
+        inicio = time.perf_counter()
+        if options['generar']:
+            if options['fixtures']:
+                raise CommandError('Use --generar o una lista de fixtures, no ambos.')
+            generar_datos(TAMANOS[options['generar']])
+            self.stdout.write(self.style.SUCCESS(
+                f"Datos '{options['generar']}' generados en {time.perf_counter() - inicio:.1f} s."
+            ))
+            return
+
+        rutas = options['fixtures'] or FIXTURES
+        for ruta in rutas:
+            self.stdout.write(f'Cargando fixture: {ruta}...')
+        try:
+            carga = cargar_fixtures(rutas, lote=options['lote'])
+        except (OSError, ValueError) as e:
+            raise CommandError(str(e))
+        for modelo, cantidad in sorted(carga.cargados.items()):
+            self.stdout.write(f'  {modelo}: {cantidad}')
+
+        self.stdout.write('Recalculando totales, reservas, vigencias, resúmenes, métricas e índice de promociones...')
+        recalcular_derivados(carga.unidades_vendidas if options['descontar_stock'] else None)
+        self.stdout.write(self.style.SUCCESS(
+            f'{sum(carga.cargados.values())} objeto(s) cargados en {time.perf_counter() - inicio:.1f} s.'
+        ))
@@ -0,0 +1,27 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from ventas.resumenes import conciliar_resumenes, dias_conciliacion
+
+
+class Command(BaseCommand):
+    help = 'Recalcula los resúmenes de ventas de los últimos días para corregir hooks perdidos'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--una-vez', action='store_true',
+                            help='Hace una pasada y termina (para cron).')
+        parser.add_argument('--dias', type=int, default=None,
+                            help='Días hacia atrás, hoy incluido (por defecto RESUMENES_DIAS_CONCILIACION).')
+        parser.add_argument('--intervalo', type=float, default=900.0,
+                            help='Segundos entre pasadas.')
+
+    def handle(self, *args, **options):
+        dias = options['dias'] or dias_conciliacion()
+        self.stdout.write(f'Conciliación de resúmenes iniciada ({dias} día(s)).')
+        while True:
+            fechas = conciliar_resumenes(dias)
+            self.stdout.write(f'Resúmenes recalculados: {fechas[-1]:%d/%m/%Y} a {fechas[0]:%d/%m/%Y}.')
+            if options['una_vez']:
+                break
+            time.sleep(options['intervalo'])
@@ -0,0 +1,44 @@
+import csv
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from productos.importacion import TAMANO_LOTE, ArchivoInvalido, importar, leer_filas
+
+
+class Command(BaseCommand):
+    help = 'Importa o actualiza productos (precio, stock) desde un archivo CSV o XLSX'
+
+    def add_arguments(self, parser):
+        parser.add_argument('archivo', help='Ruta del archivo .csv o .xlsx.')
+        parser.add_argument('--lote', type=int, default=TAMANO_LOTE,
+                            help='Filas por lote.')
+        parser.add_argument('--no-crear-categorias', action='store_true',
+                            help='Rechaza las filas con categorías que no existen.')
+        parser.add_argument('--errores', metavar='CSV',
+                            help='Escribe todas las filas con error en este archivo.')
+
+    def handle(self, *args, **options):
+        inicio = time.perf_counter()
+        try:
+            with open(options['archivo'], 'rb') as archivo:
+                resultado = importar(
+                    leer_filas(archivo, options['archivo']),
+                    tamano_lote=options['lote'],
+                    crear_categorias=not options['no_crear_categorias'],
+                )
+        except (OSError, ArchivoInvalido) as e:
+            raise CommandError(str(e))
+
+        for numero, mensaje in resultado.errores[:20]:
+            self.stderr.write(f'Fila {numero}: {mensaje}')
+        if len(resultado.errores) > 20:
+            self.stderr.write(f'... y {len(resultado.errores) - 20} error(es) más.')
+        if options['errores'] and resultado.errores:
+            with open(options['errores'], 'w', newline='', encoding='utf-8') as salida:
+                escritor = csv.writer(salida)
+                escritor.writerow(['fila', 'error'])
+                escritor.writerows(resultado.errores)
+
+        segundos = time.perf_counter() - inicio
+        self.stdout.write(self.style.SUCCESS(f'{resultado.resumen()} ({segundos:.1f} s)'))
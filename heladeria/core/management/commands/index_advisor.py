@@ -0,0 +1,69 @@
+import shutil
+import tempfile
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import setup_test_environment, teardown_test_environment
+
+from core.benchmark import TAMANOS, consultas_por_vista, generar_datos
+from core.indices import MIN_FILAS, analizar, actualizar_estadisticas, nombre_indice
+
+
+class Command(BaseCommand):
+    help = ('Repite los escenarios del benchmark con datos sintéticos en una base de '
+            'pruebas desechable, explica cada consulta con EXPLAIN y sugiere índices '
+            'para los recorridos completos y los ordenamientos en memoria.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--tamano', default='chico', choices=list(TAMANOS),
+                            help='Volumen de datos sintéticos.')
+        parser.add_argument('--vistas', help='Solo estas vistas (separadas por coma).')
+        parser.add_argument('--min-filas', type=int, default=MIN_FILAS,
+                            help='Ignora las tablas con menos filas que esto.')
+
+    def handle(self, *args, **options):
+        tamano = TAMANOS[options['tamano']]
+        vistas = set(options['vistas'].split(',')) if options['vistas'] else None
+
+        setup_test_environment()
+        nombre_original = connection.settings_dict['NAME']
+        connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        media = tempfile.mkdtemp(prefix='index_advisor_media_')
+        try:
+            with override_settings(MEDIA_ROOT=media, ALLOWED_HOSTS=['*']):
+                self.stdout.write(f'Generando datos ({tamano.nombre})...')
+                staff, comprador = generar_datos(tamano)
+                actualizar_estadisticas()
+                analisis = analizar(consultas_por_vista(staff, comprador, vistas), options['min_filas'])
+        finally:
+            shutil.rmtree(media, ignore_errors=True)
+            connection.creation.destroy_test_db(nombre_original, verbosity=0)
+            teardown_test_environment()
+
+        if not analisis:
+            self.stdout.write(self.style.SUCCESS(
+                f'Motor {connection.vendor}: sin recorridos completos ni ordenamientos en memoria.'
+            ))
+            return
+
+        sugeridos = {}
+        for resultado in analisis:
+            self.stdout.write('')
+            self.stdout.write(self.style.WARNING(f"[{', '.join(sorted(resultado.vistas))}]"))
+            self.stdout.write(f'  {resultado.sql[:300]}')
+            for hallazgo in resultado.hallazgos:
+                self.stdout.write(f'  - {hallazgo.problema} en {hallazgo.tabla}: {hallazgo.detalle}')
+            for etiqueta, (modelo, campos) in resultado.sugerencias.items():
+                sugeridos[(etiqueta, tuple(campos))] = modelo
+
+        if sugeridos:
+            self.stdout.write('')
+            self.stdout.write('Índices sugeridos (Meta.indexes):')
+            for (etiqueta, campos), modelo in sorted(sugeridos.items()):
+                self.stdout.write(
+                    f"  {etiqueta}: models.Index(fields={list(campos)!r}, "
+                    f"name={nombre_indice(modelo, campos)!r})"
+                )
+        if vistas and not any(vistas & r.vistas for r in analisis):
+            raise CommandError('Ninguna de las vistas indicadas existe en los escenarios.')
@@ -0,0 +1,28 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from productos.reservas import TAMANO_LOTE, liberar_vencidas
+
+
+class Command(BaseCommand):
+    help = 'Barrido de reservas de stock vencidas: devuelve las unidades al stock libre'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--una-vez', action='store_true',
+                            help='Libera las reservas vencidas y termina.')
+        parser.add_argument('--lote', type=int, default=TAMANO_LOTE,
+                            help='Reservas por lote.')
+        parser.add_argument('--intervalo', type=float, default=60.0,
+                            help='Segundos entre barridos.')
+
+    def handle(self, *args, **options):
+        self.stdout.write('Barrido de reservas iniciado.')
+        while True:
+            liberadas = liberar_vencidas(options['lote'])
+            if liberadas:
+                self.stdout.write(f'{liberadas} reserva(s) liberadas.')
+                continue
+            if options['una_vez']:
+                break
+            time.sleep(options['intervalo'])
@@ -0,0 +1,36 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from core.exportaciones import procesar, reencolar_caidos, tomar_siguiente
+
+
+class Command(BaseCommand):
+    help = 'Worker de exportaciones: genera en MEDIA_ROOT los archivos encolados'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--una-vez', action='store_true',
+                            help='Procesa los trabajos pendientes y termina.')
+        parser.add_argument('--intervalo', type=float, default=2.0,
+                            help='Segundos de espera cuando la cola está vacía.')
+
+    def handle(self, *args, **options):
+        self.stdout.write('Worker de exportaciones iniciado.')
+        while True:
+            reencolados = reencolar_caidos()
+            if reencolados:
+                self.stdout.write(self.style.WARNING(f'{reencolados} trabajo(s) caído(s) vuelven a la cola.'))
+
+            trabajo = tomar_siguiente()
+            if trabajo is None:
+                if options['una_vez']:
+                    break
+                time.sleep(options['intervalo'])
+                continue
+
+            self.stdout.write(f'Procesando {trabajo}...')
+            trabajo = procesar(trabajo)
+            if trabajo.estado == trabajo.COMPLETADO:
+                self.stdout.write(self.style.SUCCESS(f'{trabajo} -> {trabajo.archivo.name}'))
+            else:
+                self.stdout.write(self.style.ERROR(f'{trabajo}: {trabajo.error}'))
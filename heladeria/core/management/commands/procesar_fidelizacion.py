@@ -0,0 +1,28 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from marketing.fidelizacion import TAMANO_LOTE, procesar_lote
+
+
+class Command(BaseCommand):
+    help = 'Worker de fidelización: evalúa las ventas pendientes y asigna promociones'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--una-vez', action='store_true',
+                            help='Procesa los eventos pendientes y termina.')
+        parser.add_argument('--lote', type=int, default=TAMANO_LOTE,
+                            help='Eventos de venta por lote.')
+        parser.add_argument('--intervalo', type=float, default=5.0,
+                            help='Segundos de espera cuando la bandeja está vacía.')
+
+    def handle(self, *args, **options):
+        self.stdout.write('Worker de fidelización iniciado.')
+        while True:
+            eventos, asignaciones = procesar_lote(options['lote'])
+            if eventos:
+                self.stdout.write(f'{eventos} venta(s) evaluadas, {asignaciones} asignación(es).')
+                continue
+            if options['una_vez']:
+                break
+            time.sleep(options['intervalo'])
@@ -0,0 +1,34 @@
+import time
+from datetime import datetime, timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from marketing.vigencia import actualizar_estados
+
+
+def segundos_hasta_manana():
+    ahora = timezone.localtime()
+    manana = timezone.make_aware(datetime.combine(ahora.date() + timedelta(days=1), datetime.min.time()))
+    return (manana - ahora).total_seconds()
+
+
+class Command(BaseCommand):
+    help = 'Programador de vigencias: activa y finaliza promociones y campañas según sus fechas'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--una-vez', action='store_true',
+                            help='Hace una pasada y termina (para cron).')
+        parser.add_argument('--intervalo', type=float, default=3600.0,
+                            help='Segundos máximos entre pasadas; siempre despierta al cambiar el día.')
+
+    def handle(self, *args, **options):
+        self.stdout.write('Programador de vigencias iniciado.')
+        while True:
+            for modelo, cambiadas in actualizar_estados().items():
+                if cambiadas:
+                    self.stdout.write(f'{modelo.__name__}: {cambiadas} cambio(s) de estado.')
+            if options['una_vez']:
+                break
+            # Las fechas son días: la frontera es la medianoche local
+            time.sleep(max(min(options['intervalo'], segundos_hasta_manana() + 1), 1))
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from clientes.metricas import reconstruir_metricas
+from clientes.models import ClienteMetricas
+
+
+class Command(BaseCommand):
+    help = 'Recalcula desde las ventas las métricas de compra de todos los clientes'
+
+    def handle(self, *args, **options):
+        reconstruir_metricas()
+        self.stdout.write(self.style.SUCCESS(
+            f'Métricas reconstruidas para {ClienteMetricas.objects.count()} clientes.'
+        ))
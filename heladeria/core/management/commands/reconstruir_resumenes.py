@@ -0,0 +1,28 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from ventas.models import ResumenVentaDiaria
+from ventas.resumenes import recalcular_dia, reconstruir_resumenes
+
+
+class Command(BaseCommand):
+    help = 'Recalcula desde las ventas los resúmenes que usa el dashboard de marketing'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dia', help='Recalcula solo este día (AAAA-MM-DD).')
+
+    def handle(self, *args, **options):
+        if options['dia']:
+            try:
+                dia = date.fromisoformat(options['dia'])
+            except ValueError:
+                raise CommandError('Formato de fecha inválido, usa AAAA-MM-DD.')
+            recalcular_dia(dia)
+            self.stdout.write(self.style.SUCCESS(f'Resúmenes del {dia:%d/%m/%Y} recalculados.'))
+            return
+
+        reconstruir_resumenes()
+        self.stdout.write(self.style.SUCCESS(
+            f'Resúmenes reconstruidos ({ResumenVentaDiaria.objects.count()} días con ventas).'
+        ))
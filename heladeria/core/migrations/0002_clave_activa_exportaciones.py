@@ -0,0 +1,31 @@
+# Generated by Django 5.2.7 on 2026-10-18 16:15
+
+from django.db import migrations, models
+
+
+def marcar_activos(apps, schema_editor):
+    """Los trabajos en cola toman su clave; de los repetidos, solo el más antiguo."""
+    TrabajoExportacion = apps.get_model('core', 'TrabajoExportacion')
+    vistas = set()
+    activos = (TrabajoExportacion.objects.filter(estado__in=('PENDIENTE', 'EN_PROCESO'))
+               .order_by('creado').values_list('pk', 'clave'))
+    for pk, clave in activos:
+        if clave not in vistas:
+            vistas.add(clave)
+            TrabajoExportacion.objects.filter(pk=pk).update(clave_activa=clave)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='trabajoexportacion',
+            name='clave_activa',
+            field=models.CharField(blank=True, editable=False, max_length=64, null=True, unique=True),
+        ),
+        migrations.RunPython(marcar_activos, migrations.RunPython.noop),
+    ]
@@ -1,3 +1,66 @@
+from django.conf import settings
 from django.db import models
 
-# Create your models here.
+
+class TrabajoExportacion(models.Model):
+    """
+    Exportación pesada encolada en la base de datos.
+
+    La vista solo crea el registro; el comando ``procesar_exportaciones``
+    genera el archivo en ``MEDIA_ROOT/exportaciones/`` y va actualizando
+    ``procesadas`` para que el usuario vea el avance.
+    """
+    PENDIENTE = 'PENDIENTE'
+    EN_PROCESO = 'EN_PROCESO'
+    COMPLETADO = 'COMPLETADO'
+    ERROR = 'ERROR'
+    ESTADOS = [
+        (PENDIENTE, 'Pendiente'),
+        (EN_PROCESO, 'En proceso'),
+        (COMPLETADO, 'Completado'),
+        (ERROR, 'Error'),
+    ]
+
+    tipo = models.CharField(max_length=50)
+    parametros = models.JSONField(default=dict, blank=True)
+    # Hash de tipo + parámetros: dos solicitudes iguales comparten trabajo
+    clave = models.CharField(max_length=64, db_index=True)
+    # La misma clave mientras el trabajo está pendiente o en proceso, y nula
+    # al terminar: el índice único impide dos trabajos activos iguales
+    clave_activa = models.CharField(max_length=64, unique=True, null=True, blank=True, editable=False)
+    estado = models.CharField(max_length=20, choices=ESTADOS, default=PENDIENTE)
+    solicitado_por = models.ForeignKey(
+        settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, related_name='exportaciones'
+    )
+    total = models.PositiveIntegerField(default=0)
+    procesadas = models.PositiveIntegerField(default=0)
+    archivo = models.FileField(upload_to='exportaciones/', blank=True, null=True)
+    error = models.TextField(blank=True)
+
+    creado = models.DateTimeField(auto_now_add=True)
+    actualizado = models.DateTimeField(auto_now=True)
+    terminado = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        ordering = ['-creado']
+        verbose_name = "Trabajo de exportación"
+        verbose_name_plural = "Trabajos de exportación"
+        indexes = [
+            models.Index(fields=['estado', 'creado']),
+        ]
+
+    def __str__(self):
+        return f"Exportación {self.tipo} #{self.id} ({self.get_estado_display()})"
+
+    @property
+    def progreso(self):
+        """Porcentaje de avance (0-100)."""
+        if self.estado == self.COMPLETADO:
+            return 100
+        if not self.total:
+            return 0
+        return min(int(self.procesadas * 100 / self.total), 99)
+
+    @property
+    def terminado_ok(self):
+        return self.estado == self.COMPLETADO and bool(self.archivo)
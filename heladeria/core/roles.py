@@ -0,0 +1,73 @@
+"""
+Resolución de roles (grupos) del usuario.
+
+Los nombres de grupo de un usuario se cargan una sola vez por request (se
+guardan en el propio objeto ``request.user``) y, si la caché es compartida
+entre procesos, también en ella con clave ``usuario + versión de grupos``.
+Cualquier cambio en grupos o pertenencias incrementa la versión (ver
+``core/signals.py``), así que nunca se sirven roles viejos. Con una caché
+local por proceso no se cachean entre requests: un grupo quitado en un
+worker seguiría vigente en los demás (ver ``core/versiones.py``).
+"""
+from django.core.cache import cache
+
+from .versiones import es_compartida, incrementar, version
+
+
+ADMINISTRADORES = 'Administradores'
+MARKETING = 'Marketing'
+
+CLAVE_VERSION = 'roles:version'
+DURACION = 60 * 60
+
+
+def version_grupos():
+    return version(CLAVE_VERSION)
+
+
+def invalidar_roles(**kwargs):
+    """Incrementa la versión de grupos. Sirve también como receptor de señales."""
+    incrementar(CLAVE_VERSION)
+
+
+def _grupos_en_bd(user):
+    return frozenset(user.groups.values_list('name', flat=True))
+
+
+def grupos_de(user):
+    """Nombres de los grupos de ``user`` (``frozenset``); a lo más una consulta por request."""
+    if not user.is_authenticated:
+        return frozenset()
+    grupos = getattr(user, '_grupos_resueltos', None)
+    if grupos is None and not es_compartida():
+        grupos = _grupos_en_bd(user)
+    elif grupos is None:
+        clave = f'roles:{version_grupos()}:{user.pk}'
+        grupos = cache.get(clave)
+        if grupos is None:
+            grupos = _grupos_en_bd(user)
+            cache.set(clave, grupos, DURACION)
+    user._grupos_resueltos = grupos
+    return grupos
+
+
+def en_grupo(user, *nombres):
+    return not grupos_de(user).isdisjoint(nombres)
+
+
+def es_admin(user):
+    return user.is_authenticated and (user.is_superuser or en_grupo(user, ADMINISTRADORES))
+
+
+def es_mktg_o_admin(user):
+    return user.is_authenticated and (user.is_superuser or en_grupo(user, ADMINISTRADORES, MARKETING))
+
+
+def es_solo_marketing(user):
+    """Usuario de Marketing sin ser superusuario (acceso de solo lectura en el admin)."""
+    return not user.is_superuser and en_grupo(user, MARKETING)
+
+
+def gestiona_marketing(user):
+    """Superusuario o Marketing: puede administrar promociones y reglas."""
+    return user.is_superuser or en_grupo(user, MARKETING)
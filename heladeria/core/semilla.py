@@ -0,0 +1,211 @@
+"""
+Carga rápida de datos semilla (fixtures) para staging y pruebas de rendimiento.
+
+A diferencia de ``loaddata``, que guarda objeto por objeto con sus señales,
+``cargar_fixtures()``:
+
+- deserializa los archivos en streaming (con ``.jsonl`` ni siquiera se lee
+  el archivo completo) y junta los objetos por modelo;
+- los inserta con ``bulk_create`` por lotes, dentro de una sola transacción
+  y con los chequeos de claves foráneas desactivados, como ``loaddata``.
+  ``bulk_create`` no llama a ``save()`` ni dispara señales, así que no se
+  re-tarifica ninguna línea ni se recalcula ninguna venta durante la carga;
+- si un objeto ya existe (misma pk) se sobrescribe, igual que ``loaddata``.
+
+Al terminar, ``recalcular_derivados()`` pone al día en pasadas masivas lo que
+las señales y los ``save()`` habrían mantenido: el total y el resumen de
+cada venta, el stock reservado, el estado de vigencia de promociones y
+campañas, los resúmenes de ventas, las métricas de clientes, el índice de
+elegibilidad de promociones y las cachés de catálogo y roles.
+
+Lo usa el comando ``python manage.py cargar_semilla``.
+"""
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+from pathlib import Path
+
+from django.conf import settings
+from django.core import serializers
+from django.core.management.color import no_style
+from django.db import connection, transaction
+from django.db.models import Case, F, IntegerField, OuterRef, Subquery, Sum, Value, When
+from django.db.models.functions import Coalesce, Greatest
+
+from clientes.metricas import reconstruir_metricas
+from marketing.elegibilidad import reconstruir_indice
+from marketing.vigencia import MODELOS as MODELOS_CON_VIGENCIA, sincronizar
+from productos.catalogo import invalidar_catalogo
+from productos.models import Producto, Reserva
+from ventas.historial import reconstruir_resumenes_pedidos
+from ventas.models import DetalleVenta, Venta
+from ventas.resumenes import reconstruir_resumenes
+from .roles import invalidar_roles
+
+
+LOTE = 5000
+
+# Fixtures del proyecto, en orden de dependencias
+FIXTURES = [
+    'clientes/fixtures/clientes.json',
+    'productos/fixtures/productos.json',
+    'marketing/fixtures/promociones.json',
+    'ventas/fixtures/ventas.json',
+]
+
+
+@contextmanager
+def _fechas_del_archivo(modelo):
+    """Respeta las fechas de la fixture en campos ``auto_now``/``auto_now_add``."""
+    campos = [f for f in modelo._meta.concrete_fields if getattr(f, 'auto_now', False) or getattr(f, 'auto_now_add', False)]
+    originales = [(f, f.auto_now, f.auto_now_add) for f in campos]
+    for campo in campos:
+        campo.auto_now = campo.auto_now_add = False
+    try:
+        yield
+    finally:
+        for campo, auto_now, auto_now_add in originales:
+            campo.auto_now, campo.auto_now_add = auto_now, auto_now_add
+
+
+class Carga:
+    """Estado de una carga: objetos pendientes por modelo y totales."""
+
+    def __init__(self, lote=LOTE):
+        self.lote = lote
+        self.pendientes = defaultdict(list)  # modelo → [DeserializedObject]
+        self.cargados = Counter()            # etiqueta del modelo → objetos
+        self.modelos = set()                 # modelos y tablas intermedias tocados
+        self.unidades_vendidas = Counter()   # producto_id → unidades en DetalleVenta
+
+    def agregar(self, objeto):
+        modelo = type(objeto.object)
+        self.pendientes[modelo].append(objeto)
+        if modelo is DetalleVenta:
+            self.unidades_vendidas[objeto.object.producto_id] += objeto.object.cantidad
+        if len(self.pendientes[modelo]) >= self.lote:
+            self._insertar(modelo)
+
+    def terminar(self):
+        for modelo in list(self.pendientes):
+            self._insertar(modelo)
+
+    def _insertar(self, modelo):
+        objetos = self.pendientes.pop(modelo, [])
+        if not objetos:
+            return
+        meta = modelo._meta
+        campos = [f.name for f in meta.concrete_fields if not f.primary_key]
+        # MySQL (ON DUPLICATE KEY UPDATE) no acepta el destino: resuelve por la PK
+        destino = campos and connection.features.supports_update_conflicts_with_target
+        with _fechas_del_archivo(modelo):
+            modelo._base_manager.bulk_create(
+                [o.object for o in objetos],
+                batch_size=self.lote,
+                update_conflicts=bool(campos),
+                ignore_conflicts=not campos,
+                unique_fields=[meta.pk.name] if destino else None,
+                update_fields=campos or None,
+            )
+        self._insertar_m2m(objetos)
+        self.modelos.add(modelo)
+        self.cargados[meta.label] += len(objetos)
+
+    def _insertar_m2m(self, objetos):
+        relaciones = defaultdict(list)
+        for objeto in objetos:
+            for nombre, ids in (objeto.m2m_data or {}).items():
+                campo = objeto.object._meta.get_field(nombre)
+                intermedia = campo.remote_field.through
+                origen, destino = campo.m2m_field_name(), campo.m2m_reverse_field_name()
+                relaciones[intermedia].extend(
+                    intermedia(**{f'{origen}_id': objeto.object.pk, f'{destino}_id': pk}) for pk in ids
+                )
+        for intermedia, filas in relaciones.items():
+            intermedia.objects.bulk_create(filas, batch_size=self.lote, ignore_conflicts=True)
+            self.modelos.add(intermedia)
+
+
+def _formato(ruta):
+    formato = ruta.suffix.lstrip('.')
+    if formato not in serializers.get_public_serializer_formats():
+        raise ValueError(f"Formato de fixture no soportado: {ruta.name}")
+    return formato
+
+
+def cargar_fixtures(rutas, lote=LOTE):
+    """
+    Carga los archivos ``rutas`` (relativas a ``BASE_DIR`` o absolutas).
+    Devuelve la ``Carga`` con los totales por modelo.
+    """
+    carga = Carga(lote)
+    with transaction.atomic(), connection.constraint_checks_disabled():
+        for ruta in rutas:
+            ruta = Path(settings.BASE_DIR, ruta)
+            with open(ruta, encoding='utf-8') as archivo:
+                for objeto in serializers.deserialize(_formato(ruta), archivo, ignorenonexistent=True):
+                    carga.agregar(objeto)
+        carga.terminar()
+
+    tablas = [modelo._meta.db_table for modelo in carga.modelos]
+    connection.check_constraints(table_names=tablas)
+    sentencias = connection.ops.sequence_reset_sql(no_style(), carga.modelos)
+    if sentencias:
+        with connection.cursor() as cursor:
+            for sql in sentencias:
+                cursor.execute(sql)
+    return carga
+
+
+# --------------------------------------------------------------------------
+# Campos derivados
+# --------------------------------------------------------------------------
+
+def recalcular_totales_ventas():
+    """``Venta.total`` = suma de sus subtotales, en un solo UPDATE."""
+    subtotales = (
+        DetalleVenta.objects.filter(venta=OuterRef('pk'))
+        .order_by().values('venta').annotate(s=Sum('subtotal')).values('s')
+    )
+    total = Venta._meta.get_field('total')
+    Venta.objects.update(total=Coalesce(Subquery(subtotales, output_field=total), Value(0), output_field=total))
+
+
+def recalcular_reservado():
+    """``Producto.reservado`` = suma de sus reservas vigentes o no barridas."""
+    reservas = (
+        Reserva.objects.filter(producto=OuterRef('pk'))
+        .order_by().values('producto').annotate(s=Sum('cantidad')).values('s')
+    )
+    Producto.objects.update(reservado=Coalesce(Subquery(reservas, output_field=IntegerField()), Value(0)))
+
+
+def descontar_stock(unidades, lote=1000):
+    """Resta ``{producto_id: unidades}`` del stock (sin bajar de cero), por lotes."""
+    pendientes = list(unidades.items())
+    for inicio in range(0, len(pendientes), lote):
+        tramo = pendientes[inicio:inicio + lote]
+        # GREATEST antes de restar: en MySQL la columna es UNSIGNED
+        Producto.objects.filter(id__in=[pid for pid, _ in tramo]).update(
+            stock=Case(
+                *[When(id=pid, then=Greatest(F('stock'), Value(cantidad)) - cantidad) for pid, cantidad in tramo],
+                default=F('stock'),
+                output_field=IntegerField(),
+            )
+        )
+
+
+def recalcular_derivados(unidades_vendidas=None):
+    """Pasadas masivas posteriores a la carga. Con ``unidades_vendidas`` descuenta stock."""
+    with transaction.atomic():
+        recalcular_totales_ventas()
+        reconstruir_resumenes_pedidos()
+        recalcular_reservado()
+        if unidades_vendidas:
+            descontar_stock(unidades_vendidas)
+    for modelo in MODELOS_CON_VIGENCIA:
+        sincronizar(modelo)
+    reconstruir_resumenes()
+    reconstruir_metricas()
+    reconstruir_indice()
+    invalidar_catalogo()
+    invalidar_roles()
@@ -0,0 +1,110 @@
+"""
+Motor de sesiones con caché y escrituras agrupadas (``SESSION_ENGINE``).
+
+Igual que ``cached_db`` la sesión se lee de la caché ``SESSION_CACHE_ALIAS``
+y, si no está, de ``django_session``. La diferencia está al guardar:
+
+- si los datos no cambiaron y la fila aún no necesita renovar su
+  vencimiento, no se escribe nada;
+- si cambiaron datos comunes (un contador, una preferencia), se escribe
+  solo en la caché; la base se pone al día a lo más cada
+  ``SESION_INTERVALO_ESCRITURA`` segundos;
+- el login/logout y ``set_expiry`` (``CLAVES_CRITICAS``) se escriben en la
+  base en el acto, igual que crear la sesión o cambiar su clave;
+- el vencimiento en la base se renueva cuando la última escritura tiene
+  más de ``SESION_RENOVAR_CADA`` segundos, así la expiración sigue siendo
+  deslizante con ``SESSION_SAVE_EVERY_REQUEST = True``.
+
+La caché debe ser compartida por todos los workers (archivos en el mismo
+servidor, Redis, Memcached): es la copia vigente de la sesión entre dos
+escrituras a la base. Si una entrada se pierde, se recarga la fila y se
+pierden a lo más los cambios no críticos de ese intervalo.
+"""
+import logging
+import time
+
+from django.conf import settings
+from django.contrib.auth import BACKEND_SESSION_KEY, HASH_SESSION_KEY, SESSION_KEY
+from django.contrib.sessions.backends.cached_db import SessionStore as CachedDBStore
+from django.contrib.sessions.backends.db import SessionStore as DBStore
+
+
+logger = logging.getLogger('django.contrib.sessions')
+
+CLAVES_CRITICAS = (SESSION_KEY, BACKEND_SESSION_KEY, HASH_SESSION_KEY, '_session_expiry')
+
+# Resultado de _destino()
+SIN_CAMBIOS, SOLO_CACHE, BASE_DE_DATOS = range(3)
+
+
+class SessionStore(CachedDBStore):
+
+    cache_key_prefix = 'heladeria.sesiones'
+
+    def __init__(self, session_key=None):
+        super().__init__(session_key)
+        self._original = None  # datos serializados tal como se cargaron
+        self._criticos = None
+        self._vence_bd = None  # expire_date de la fila en la base (timestamp)
+
+    def _serializar(self, datos):
+        return self.serializer().dumps(datos)
+
+    def _recordar(self, datos, vence_bd):
+        self._original = self._serializar(datos)
+        self._criticos = [datos.get(clave) for clave in CLAVES_CRITICAS]
+        self._vence_bd = vence_bd
+
+    def _a_cache(self, datos):
+        # La entrada nunca vive más que la fila: si la base la diera por
+        # vencida, la caché no debe resucitarla
+        duracion = min(self.get_expiry_age(expiry=datos.get('_session_expiry')),
+                       int(self._vence_bd - time.time()))
+        try:
+            self._cache.set(self.cache_key, {'datos': datos, 'vence_bd': self._vence_bd}, max(duracion, 1))
+        except Exception:
+            logger.exception("Error guardando la sesión en la caché (%s)", self._cache)
+
+    def load(self):
+        try:
+            entrada = self._cache.get(self.cache_key)
+        except Exception:
+            # Algunos backends lanzan excepción con claves inválidas (#17810)
+            entrada = None
+
+        if entrada is None:
+            fila = self._get_session_from_db()
+            if fila is None:
+                return {}
+            entrada = {'datos': self.decode(fila.session_data), 'vence_bd': fila.expire_date.timestamp()}
+            self._recordar(entrada['datos'], entrada['vence_bd'])
+            self._a_cache(entrada['datos'])
+        else:
+            self._recordar(entrada['datos'], entrada['vence_bd'])
+        return entrada['datos']
+
+    def _destino(self):
+        datos = self._session
+        escrita_hace = time.time() - (self._vence_bd - self.get_session_cookie_age())
+        if escrita_hace >= getattr(settings, 'SESION_RENOVAR_CADA', 600):
+            return BASE_DE_DATOS
+        if self._serializar(datos) == self._original:
+            return SIN_CAMBIOS
+        if [datos.get(clave) for clave in CLAVES_CRITICAS] != self._criticos:
+            return BASE_DE_DATOS
+        if escrita_hace >= getattr(settings, 'SESION_INTERVALO_ESCRITURA', 300):
+            return BASE_DE_DATOS
+        return SOLO_CACHE
+
+    def save(self, must_create=False):
+        if self.session_key is None:
+            return self.create()
+
+        destino = BASE_DE_DATOS if must_create or self._vence_bd is None else self._destino()
+        if destino == SIN_CAMBIOS:
+            return
+        datos = self._get_session(no_load=must_create)
+        if destino == BASE_DE_DATOS:
+            DBStore.save(self, must_create)
+            self._recordar(datos, self.get_expiry_date().timestamp())
+        self._a_cache(datos)
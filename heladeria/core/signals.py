@@ -0,0 +1,17 @@
+# core/signals.py
+from django.contrib.auth.models import Group, User
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+
+from .roles import invalidar_roles
+
+
+# Cualquier cambio de grupos o pertenencias deja obsoletos los roles cacheados
+post_save.connect(invalidar_roles, sender=Group, dispatch_uid='roles_save_Group')
+post_delete.connect(invalidar_roles, sender=Group, dispatch_uid='roles_delete_Group')
+
+
+@receiver(m2m_changed, sender=User.groups.through)
+def invalidar_por_pertenencias(sender, action, **kwargs):
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        invalidar_roles()
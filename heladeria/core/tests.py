@@ -1,3 +1,409 @@
-from django.test import TestCase
+import io
+import json
+import shutil
+import tempfile
+from datetime import timedelta
+from pathlib import Path
+from unittest import mock
 
-# Create your tests here.
+import openpyxl
+from django.contrib.auth.models import Group, User
+from django.core.cache import cache, caches
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connection
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from utils.excel import CONTENT_TYPE_XLSX, respuesta_xlsx
+from .benchmark import TAMANOS, crecimientos, medir
+from .context_processors import roles
+from .exportaciones import EXPORTACIONES, PARAMETROS, Exportacion, encolar, procesar, tomar_siguiente
+from .indices import RECORRIDO_COMPLETO, explicar, sugerir
+from .instrumentacion import MiddlewareInstrumentacion, PlantillaDjango, huella_sql, metricas
+from .listados import PaginadorEstimado
+from .models import TrabajoExportacion
+from .roles import es_admin, es_mktg_o_admin, es_solo_marketing
+from .semilla import FIXTURES, cargar_fixtures, recalcular_derivados
+
+
+class RolesTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.marketing = Group.objects.create(name='Marketing')
+        cls.admins = Group.objects.create(name='Administradores')
+        cls.usuario = User.objects.create_user('mktg', password='x', is_staff=True)
+        cls.usuario.groups.add(cls.marketing)
+
+    def setUp(self):
+        cache.clear()
+
+    def _usuario(self):
+        # Un objeto nuevo por "request", como hace AuthenticationMiddleware
+        return User.objects.get(pk=self.usuario.pk)
+
+    @override_settings(CACHE_COMPARTIDA=True)
+    def test_una_consulta_por_request_y_luego_cache(self):
+        user = self._usuario()
+        request = RequestFactory().get('/')
+        request.user = user
+        contexto = roles(request)
+        with self.assertNumQueries(1):
+            self.assertTrue(contexto['es_mktg_o_admin_role']())
+            self.assertFalse(contexto['es_admin_role']())
+            self.assertTrue(es_solo_marketing(user))
+        # Siguiente request: los grupos salen de la caché
+        with self.assertNumQueries(0):
+            self.assertTrue(es_solo_marketing(User(pk=user.pk)))
+
+    def test_cache_local_no_guarda_roles_entre_requests(self):
+        self.assertTrue(es_solo_marketing(self._usuario()))
+        # Otro worker quita el grupo: su invalidación no llegaría a esta caché
+        self.usuario.groups.through.objects.filter(user=self.usuario).delete()
+        with self.assertNumQueries(1):
+            self.assertFalse(es_solo_marketing(User(pk=self.usuario.pk)))
+
+    def test_chequeo_de_despliegue_avisa_cache_local(self):
+        from .versiones import revisar_cache_compartida
+        self.assertEqual([e.id for e in revisar_cache_compartida(None)], ['core.W001'])
+        with override_settings(CACHE_COMPARTIDA=True):
+            self.assertEqual(revisar_cache_compartida(None), [])
+
+    @override_settings(CACHE_COMPARTIDA=True)
+    def test_cambio_de_grupos_invalida(self):
+        self.assertFalse(es_admin(self._usuario()))
+        self.usuario.groups.add(self.admins)
+        self.assertTrue(es_admin(self._usuario()))
+        self.usuario.groups.clear()
+        self.assertFalse(es_mktg_o_admin(self._usuario()))
+
+    def test_pagina_del_admin_resuelve_grupos_una_vez(self):
+        self.client.force_login(self.usuario)
+        # Sin caché compartida: una consulta de grupos por request, no por chequeo
+        for url in ('/admin/ventas/venta/1/change/', '/admin/ventas/venta/'):
+            with CaptureQueriesContext(connection) as consultas:
+                self.client.get(url)
+            grupos = [q for q in consultas if '"auth_group"."name"' in q['sql']]
+            self.assertEqual(len(grupos), 1)
+
+
+def exportacion_que_falla(parametros):
+    def filas():
+        for i in range(1200):
+            yield [i]
+        raise RuntimeError("se cayó la conexión")
+
+    return Exportacion(encabezados=["N"], filas=filas(), total=1200, nombre_archivo="falla.xlsx")
+
+
+class ExportacionesTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = User.objects.create_user('staff', password='x', is_staff=True)
+
+    def test_parametros_que_no_usa_la_exportacion_no_cambian_la_clave(self):
+        trabajo = encolar('ventas', self.staff, {'page': '2', '_': '123'})
+        self.assertEqual(encolar('ventas', self.staff), trabajo)
+        self.assertEqual(trabajo.parametros, {})
+
+    def test_solicitudes_simultaneas_comparten_trabajo(self):
+        primero = encolar('ventas', self.staff)
+        # La otra solicitud buscó antes de que el primer insert existiera
+        with mock.patch('core.exportaciones._reutilizable', return_value=None):
+            segundo = encolar('ventas', self.staff)
+        self.assertEqual(segundo, primero)
+        self.assertEqual(TrabajoExportacion.objects.count(), 1)
+
+    def test_trabajo_terminado_libera_la_clave(self):
+        media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media, ignore_errors=True)
+        encolar('ventas', self.staff)
+        with override_settings(MEDIA_ROOT=media):
+            anterior = procesar(tomar_siguiente())
+        self.assertEqual(anterior.estado, TrabajoExportacion.COMPLETADO)
+        self.assertIsNone(anterior.clave_activa)
+
+        # Pasado el tiempo de reutilización se encola uno nuevo con la misma clave
+        with mock.patch('core.exportaciones.REUTILIZAR_DURANTE', timedelta(0)):
+            nuevo = encolar('ventas', self.staff)
+        self.assertNotEqual(nuevo, anterior)
+        self.assertEqual(nuevo.clave_activa, anterior.clave)
+
+    def test_error_borra_el_archivo_parcial(self):
+        media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media, ignore_errors=True)
+        with mock.patch.dict(EXPORTACIONES, {'falla': 'core.tests.exportacion_que_falla'}), \
+                mock.patch.dict(PARAMETROS, {'falla': ()}), override_settings(MEDIA_ROOT=media):
+            encolar('falla', self.staff)
+            trabajo = procesar(tomar_siguiente())
+
+        self.assertEqual(trabajo.estado, TrabajoExportacion.ERROR)
+        self.assertIn("se cayó la conexión", trabajo.error)
+        self.assertIsNone(trabajo.clave_activa)
+        self.assertEqual(list(Path(media, 'exportaciones').iterdir()), [])
+
+
+class ExcelTests(SimpleTestCase):
+
+    def test_respuesta_en_streaming_sin_armar_el_libro(self):
+        leidas = []
+
+        def filas():
+            for i in range(2000):
+                leidas.append(i)
+                yield [i, f"fila {i}"]
+
+        respuesta = respuesta_xlsx(["N", "Texto"], filas(), nombre_archivo="prueba.xlsx")
+        self.assertTrue(respuesta.streaming)
+        self.assertEqual(respuesta['Content-Type'], CONTENT_TYPE_XLSX)
+        self.assertEqual(respuesta['Content-Disposition'], 'attachment; filename="prueba.xlsx"')
+
+        bloques = iter(respuesta.streaming_content)
+        primero = next(bloques)
+        # El primer bloque sale tras 500 filas, sin leer el resto
+        self.assertEqual(len(leidas), 500)
+        libro = openpyxl.load_workbook(io.BytesIO(primero + b''.join(bloques)))
+        filas_libro = list(libro.active.iter_rows(values_only=True))
+        self.assertEqual(filas_libro[0], ("N", "Texto"))
+        self.assertEqual(len(filas_libro), 2001)
+
+class BenchmarkTests(TestCase):
+
+    def test_consultas_no_crecen_con_los_datos(self):
+        # medir() agrega datos en cada llamada: la segunda mide una base más grande
+        resultados = [medir(TAMANOS['mini']), medir(TAMANOS['mini'])]
+        for vista, medicion in resultados[1]['vistas'].items():
+            self.assertLess(medicion['estado'], 400, vista)
+        self.assertEqual(crecimientos(resultados), [])
+
+
+class InstrumentacionTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        metricas.reiniciar()
+
+    def test_huella_colapsa_literales_y_listas(self):
+        self.assertEqual(
+            huella_sql("SELECT * FROM t WHERE id IN (%s, %s, %s) AND nombre = 'x'  LIMIT 21"),
+            "SELECT * FROM t WHERE id IN (%s, ...) AND nombre = ? LIMIT ?",
+        )
+
+    @override_settings(INSTRUMENTACION_LENTO_CONSULTAS=1)
+    def test_request_lento_va_al_log_con_sus_huellas(self):
+        with self.assertLogs('heladeria.lentas', 'WARNING') as registro:
+            self.client.get('/productos/tienda/')
+        entrada = json.loads(registro.output[0].split(':', 2)[2])
+        self.assertEqual(entrada['vista'], 'productos:producto_listado')
+        self.assertGreater(entrada['consultas'], 0)
+        self.assertTrue(entrada['huellas'])
+        self.assertIn('ms_plantillas', entrada)
+
+    @override_settings(INSTRUMENTACION_TOKEN_METRICAS='secreto')
+    def test_metricas_prometheus_con_token_o_staff(self):
+        self.client.get('/productos/tienda/')
+        respuesta = self.client.get('/metricas/', HTTP_AUTHORIZATION='Bearer secreto')
+        self.assertEqual(respuesta.status_code, 200)
+        texto = respuesta.content.decode()
+        self.assertIn('heladeria_requests_total{vista="productos:producto_listado"} 1', texto)
+        self.assertIn('# TYPE heladeria_request_segundos histogram', texto)
+
+        # Detrás del proxy todo llega desde 127.0.0.1: la IP no da acceso
+        self.assertEqual(self.client.get('/metricas/', REMOTE_ADDR='127.0.0.1').status_code, 404)
+        self.assertEqual(self.client.get('/metricas/', HTTP_AUTHORIZATION='Bearer otro').status_code, 404)
+        self.client.force_login(User.objects.create_user('staff', password='x', is_staff=True))
+        self.assertEqual(self.client.get('/metricas/').status_code, 200)
+
+    def test_metricas_sin_token_configurado_solo_staff(self):
+        self.assertEqual(self.client.get('/metricas/', HTTP_AUTHORIZATION='Bearer ').status_code, 404)
+
+    def test_plantillas_se_envuelven_solo_con_el_middleware_activo(self):
+        sin_medir = getattr(PlantillaDjango.render, 'original', PlantillaDjango.render)
+        with mock.patch.object(PlantillaDjango, 'render', sin_medir):
+            with override_settings(INSTRUMENTACION_ACTIVA=False), self.assertRaises(MiddlewareNotUsed):
+                MiddlewareInstrumentacion(lambda request: None)
+            self.assertIs(PlantillaDjango.render, sin_medir)
+
+            MiddlewareInstrumentacion(lambda request: None)
+            MiddlewareInstrumentacion(lambda request: None)
+            self.assertIs(PlantillaDjango.render.original, sin_medir)
+
+
+class SesionesTests(TestCase):
+
+    def setUp(self):
+        caches['sesiones'].clear()
+
+    def _escrituras_de_sesion(self, *urls):
+        with CaptureQueriesContext(connection) as consultas:
+            for url in urls:
+                respuesta = self.client.get(url)
+        escrituras = [
+            q for q in consultas
+            if 'django_session' in q['sql'] and q['sql'].lstrip().startswith(('INSERT', 'UPDATE'))
+        ]
+        return len(escrituras), respuesta
+
+    def test_contador_de_visitas_se_agrupa_en_la_cache(self):
+        inicio = reverse('core:inicio')
+        self.assertEqual(self._escrituras_de_sesion(inicio)[0], 1)
+        escrituras, respuesta = self._escrituras_de_sesion(inicio, inicio, inicio)
+        self.assertEqual(escrituras, 0)
+        self.assertEqual(respuesta.context['visitas'], 4)
+
+        with override_settings(SESION_INTERVALO_ESCRITURA=0):
+            self.assertEqual(self._escrituras_de_sesion(inicio)[0], 1)
+
+    def test_login_se_escribe_en_el_acto(self):
+        User.objects.create_user('ana', password='clave-123')
+        self.client.get(reverse('core:inicio'))
+        self.client.login(username='ana', password='clave-123')
+        caches['sesiones'].clear()
+        # Sin la caché, la sesión se recarga desde la base con el usuario
+        respuesta = self.client.get(reverse('core:inicio'))
+        self.assertTrue(respuesta.context['user'].is_authenticated)
+
+
+class SemillaTests(TestCase):
+
+    def test_carga_masiva_sin_senales_y_derivados_al_final(self):
+        from clientes.models import ClienteMetricas
+        from productos.models import Producto
+        from ventas.models import Venta
+
+        carga = cargar_fixtures(FIXTURES)
+        self.assertEqual(carga.cargados['ventas.DetalleVenta'], 2)
+        # Sin señales: las métricas de los clientes aún no existen
+        self.assertFalse(ClienteMetricas.objects.exists())
+        stock_antes = Producto.objects.get(pk=1).stock
+
+        recalcular_derivados(carga.unidades_vendidas)
+        venta = Venta.objects.get(pk=1)
+        self.assertEqual(venta.total, sum(d.subtotal for d in venta.detalles.all()))
+        self.assertEqual(venta.fecha_venta.year, 2025)
+        self.assertEqual(ClienteMetricas.objects.get(cliente_id=venta.cliente_id).total_ordenes, 1)
+        self.assertEqual(Producto.objects.get(pk=1).stock, stock_antes - carga.unidades_vendidas[1])
+
+    def test_motor_sin_destino_de_conflicto(self):
+        # Como MySQL: la carga no debe pasar unique_fields a bulk_create
+        with mock.patch.object(connection.features, 'supports_update_conflicts_with_target', False):
+            carga = cargar_fixtures(FIXTURES)
+        self.assertEqual(carga.cargados['ventas.DetalleVenta'], 2)
+
+
+class IndicesTests(TestCase):
+
+    def sql_de(self, consulta):
+        with CaptureQueriesContext(connection) as consultas:
+            list(consulta)
+        return consultas[0]['sql']
+
+    def test_sugiere_igualdad_luego_orden(self):
+        from productos.models import Producto
+
+        sql = self.sql_de(Producto.objects.filter(precio=1000).order_by('-reservado'))
+        self.assertEqual(sugerir(sql, 'productos_producto'), (Producto, ['precio', '-reservado']))
+        if connection.vendor == 'sqlite':
+            self.assertIn(RECORRIDO_COMPLETO, [h.problema for h in explicar(sql)])
+
+    def test_no_sugiere_lo_que_ya_esta_indexado(self):
+        from django.utils import timezone
+        from ventas.models import Venta
+
+        sql = self.sql_de(Venta.objects.filter(cliente_id=1, fecha_venta__gte=timezone.now()))
+        self.assertIsNone(sugerir(sql, 'ventas_venta'))
+        self.assertNotIn(RECORRIDO_COMPLETO, [h.problema for h in explicar(sql)])
+
+
+class ListadosAdminTests(TestCase):
+    LISTADOS = ('/admin/clientes/cliente/', '/admin/ventas/venta/',
+                '/admin/productos/producto/', '/admin/marketing/promocion/')
+
+    @classmethod
+    def setUpTestData(cls):
+        from productos.models import Categoria
+        cls.categoria = Categoria.objects.create(nombre="Helado")
+        cls.admin = User.objects.create_superuser('admin', password='x')
+
+    def setUp(self):
+        self.client.force_login(self.admin)
+        self.creados = 0
+
+    def _agregar(self, n):
+        from datetime import timedelta
+        from decimal import Decimal
+        from django.utils import timezone
+        from clientes.models import Cliente
+        from marketing.models import Promocion
+        from productos.models import Producto
+        from ventas.models import Venta
+
+        hoy = timezone.localdate()
+        for _ in range(n):
+            i = self.creados = self.creados + 1
+            cliente = Cliente.objects.create(user=User.objects.create_user(f'c{i}', password='x'))
+            producto = Producto.objects.create(nombre=f"Helado {i}", precio=Decimal('1000'), stock=i,
+                                               categoria=self.categoria, fecha_vencimiento=hoy + timedelta(days=i))
+            for _ in range(i % 3):
+                Venta.objects.create(cliente=cliente, total=Decimal('1000'))
+            promo = Promocion.objects.create(nombre=f"Promo {i}", tipo='2X1', fecha_inicio=hoy,
+                                             fecha_fin=hoy + timedelta(days=5), activa=True)
+            promo.productos.add(producto)
+
+    def _consultas(self):
+        conteos = {}
+        for url in self.LISTADOS:
+            with CaptureQueriesContext(connection) as consultas:
+                self.assertEqual(self.client.get(url).status_code, 200)
+            conteos[url] = len(consultas)
+        return conteos
+
+    def test_consultas_fijas_al_crecer_la_tabla(self):
+        self._agregar(3)
+        self._consultas()
+        antes = self._consultas()
+        self._agregar(9)
+        self.assertEqual(self._consultas(), antes)
+
+    def test_anotaciones_y_filtros_por_rango(self):
+        self._agregar(8)
+        respuesta = self.client.get('/admin/clientes/cliente/')
+        ventas = {c.user.username: c._num_ventas for c in respuesta.context['cl'].result_list}
+        self.assertEqual(ventas['c2'], 2)
+        self.assertEqual(ventas['c3'], 0)
+
+        respuesta = self.client.get('/admin/productos/producto/', {'stock': 'bajo'})
+        self.assertEqual(sorted(p.stock for p in respuesta.context['cl'].result_list), [1, 2, 3, 4, 5])
+        respuesta = self.client.get('/admin/productos/producto/', {'vence': 'mes'})
+        self.assertEqual(respuesta.context['cl'].result_count, 1)
+
+    @override_settings(ADMIN_CONTEO_TOPE=5)
+    def test_conteo_con_tope(self):
+        from productos.models import Producto
+        self._agregar(8)
+        self.assertEqual(PaginadorEstimado(Producto.objects.filter(stock__gte=2).order_by('pk'), 2).count, 6)
+        self.assertEqual(PaginadorEstimado(Producto.objects.filter(stock__gte=5).order_by('pk'), 2).count, 4)
+
+    @override_settings(ADMIN_CONTEO_TOPE=5)
+    def test_paginas_mas_alla_del_tope(self):
+        from django.core.paginator import EmptyPage
+        from productos.models import Producto
+        self._agregar(8)
+        paginador = PaginadorEstimado(Producto.objects.filter(stock__gte=1).order_by('pk'), 2)
+        self.assertEqual((paginador.count, paginador.exacto, paginador.conteo_mostrado), (6, False, "más de 5"))
+        self.assertEqual(paginador.num_pages, 3)
+        # Las filas 7 y 8 quedan fuera del conteo pero se pueden pedir
+        self.assertEqual([p.stock for p in paginador.page(4)], [7, 8])
+        self.assertEqual(paginador.num_pages, 5)
+        with self.assertRaises(EmptyPage):
+            paginador.page(5)
+
+        from django.contrib import admin
+        with mock.patch.object(admin.site._registry[Producto], 'list_per_page', 2):
+            respuesta = self.client.get('/admin/productos/producto/', {'q': 'Helado', 'o': '1', 'p': 4})
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual(len(respuesta.context['cl'].result_list), 2)
+        self.assertContains(respuesta, "más de 5")
+        self.assertContains(respuesta, '?o=1&amp;p=5&amp;q=Helado')
@@ -6,4 +6,8 @@ app_name = 'core'
 urlpatterns = [
     path('', views.inicio, name='inicio'),
     path('test-404/', views.test_404, name='test_404'),  # Ruta temporal de prueba
+    path('exportaciones/<int:pk>/', views.exportacion_detalle, name='exportacion_detalle'),
+    path('exportaciones/<int:pk>/estado/', views.exportacion_estado, name='exportacion_estado'),
+    path('exportaciones/<int:pk>/descargar/', views.exportacion_descargar, name='exportacion_descargar'),
+    path('metricas/', views.metricas, name='metricas'),
 ]
@@ -0,0 +1,64 @@
+"""
+Versiones de datos cacheados en la caché ``default``.
+
+Los roles y el catálogo cachean por ``clave + versión``; invalidar es
+incrementar la versión, y las entradas viejas dejan de leerse y expiran
+solas. Eso solo sirve entre procesos si la caché es compartida (Redis,
+Memcached, archivos en el mismo host): con ``LocMemCache`` cada worker
+tiene sus propias versiones y no ve las invalidaciones de los demás.
+
+``es_compartida()`` lo detecta por el backend (o lo fija el setting
+``CACHE_COMPARTIDA``). Los datos que no pueden quedar viejos, como los
+permisos, no se cachean entre requests si la caché no es compartida. Para
+el resto, con caché local la versión misma expira a los
+``CACHE_LOCAL_SEGUNDOS``: cada worker ve los cambios de los demás con ese
+atraso como máximo. El chequeo ``core.W001`` (``manage.py check --deploy``)
+avisa de esta configuración.
+"""
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.checks import Warning, register
+
+
+BACKENDS_LOCALES = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+
+def es_compartida():
+    """¿La caché ``default`` la ven todos los procesos?"""
+    compartida = getattr(settings, 'CACHE_COMPARTIDA', None)
+    if compartida is not None:
+        return compartida
+    return settings.CACHES['default']['BACKEND'] not in BACKENDS_LOCALES
+
+
+def _duracion():
+    return None if es_compartida() else getattr(settings, 'CACHE_LOCAL_SEGUNDOS', 30)
+
+
+def version(clave):
+    # El valor inicial usa el reloj para no reciclar versiones si la clave se pierde
+    return cache.get_or_set(clave, time.time_ns(), _duracion())
+
+
+def incrementar(clave):
+    try:
+        cache.incr(clave)
+    except ValueError:
+        cache.set(clave, time.time_ns(), _duracion())
+
+
+@register(deploy=True)
+def revisar_cache_compartida(app_configs, **kwargs):
+    if es_compartida():
+        return []
+    return [Warning(
+        "La caché 'default' es local de cada proceso: las invalidaciones del "
+        "catálogo y de los roles no llegan a los demás workers.",
+        hint="Configure CACHE_URL con una caché compartida (redis://, memcache://).",
+        id='core.W001',
+    )]
@@ -1,6 +1,15 @@
 # core/views.py
-from django.shortcuts import render
-from django.http import HttpResponseNotFound
+import hmac
+
+from django.shortcuts import render, redirect, get_object_or_404
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseNotFound, JsonResponse, FileResponse, Http404
+from django.contrib import messages
+from django.contrib.admin.views.decorators import staff_member_required
+
+from .exportaciones import LimiteExportaciones, encolar
+from .instrumentacion import metricas as metricas_proceso
+from .models import TrabajoExportacion
 
 def inicio(request):
     visitas = request.session.get('visitas', 0) + 1     
@@ -13,3 +22,64 @@ def inicio(request):
 def test_404(request):
     # Forzamos un 404 y mostramos tu template 404.html
     return HttpResponseNotFound(render(request, "404.html").content)
+
+
+# ================================
+# Exportaciones en segundo plano
+# ================================
+def solicitar_exportacion(request, tipo, volver_a):
+    """Encola la exportación y lleva al usuario a la página de avance."""
+    try:
+        trabajo = encolar(tipo, request.user, parametros=request.GET.dict())
+    except LimiteExportaciones as e:
+        messages.error(request, str(e))
+        return redirect(volver_a)
+    return redirect('core:exportacion_detalle', pk=trabajo.pk)
+
+
+@staff_member_required
+def exportacion_detalle(request, pk):
+    trabajo = get_object_or_404(TrabajoExportacion, pk=pk)
+    return render(request, 'exportacion.html', {'trabajo': trabajo})
+
+
+@staff_member_required
+def exportacion_estado(request, pk):
+    """Avance del trabajo en JSON (lo consulta la página cada pocos segundos)."""
+    trabajo = get_object_or_404(TrabajoExportacion, pk=pk)
+    return JsonResponse({
+        'estado': trabajo.estado,
+        'progreso': trabajo.progreso,
+        'procesadas': trabajo.procesadas,
+        'total': trabajo.total,
+        'error': trabajo.error,
+        'descarga': trabajo.terminado_ok,
+    })
+
+
+@staff_member_required
+def exportacion_descargar(request, pk):
+    trabajo = get_object_or_404(TrabajoExportacion, pk=pk)
+    if not trabajo.terminado_ok:
+        raise Http404("La exportación aún no está lista.")
+    return FileResponse(trabajo.archivo.open('rb'), as_attachment=True,
+                        filename=trabajo.archivo.name.split('/')[-1].split('_', 1)[-1])
+
+
+# ================================
+# Métricas (Prometheus)
+# ================================
+def _lector_de_metricas(request):
+    """Staff logueado, o ``Authorization: Bearer <INSTRUMENTACION_TOKEN_METRICAS>``."""
+    if request.user.is_staff:
+        return True
+    token = getattr(settings, 'INSTRUMENTACION_TOKEN_METRICAS', '')
+    tipo, _, recibido = request.headers.get('Authorization', '').partition(' ')
+    return bool(token) and tipo.lower() == 'bearer' and hmac.compare_digest(recibido.encode(), token.encode())
+
+
+def metricas(request):
+    """Totales de la instrumentación en formato Prometheus (staff o token)."""
+    if not _lector_de_metricas(request):
+        raise Http404
+    return HttpResponse(metricas_proceso.prometheus(), content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -37,6 +37,7 @@ INSTALLED_APPS = [
 
 # === MIDDLEWARE ===
 MIDDLEWARE = [
+    'core.instrumentacion.MiddlewareInstrumentacion',  # primero: mide todo el request
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -46,6 +47,40 @@ MIDDLEWARE = [
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
+# === INSTRUMENTACIÓN (core/instrumentacion.py) ===
+INSTRUMENTACION_ACTIVA = env.bool('INSTRUMENTACION_ACTIVA', default=True)
+INSTRUMENTACION_LENTO_MS = env.int('INSTRUMENTACION_LENTO_MS', default=500)
+INSTRUMENTACION_LENTO_CONSULTAS = env.int('INSTRUMENTACION_LENTO_CONSULTAS', default=50)
+# Token para leer /metricas/ (Prometheus: ``authorization: credentials``).
+# Sin token solo el staff logueado puede verlas. No se filtra por IP: detrás
+# de nginx todos los requests llegan desde 127.0.0.1
+INSTRUMENTACION_TOKEN_METRICAS = env('INSTRUMENTACION_TOKEN_METRICAS', default='')
+
+# === RESERVAS DE STOCK DEL CARRITO (productos/reservas.py) ===
+# Minutos que un carrito retiene las unidades sin actividad
+RESERVA_MINUTOS = env.int('RESERVA_MINUTOS', default=15)
+
+# === HISTORIAL DE PEDIDOS Y LIBRO DE VENTAS (ventas/historial.py, ventas/libro.py) ===
+HISTORIAL_POR_PAGINA = env.int('HISTORIAL_POR_PAGINA', default=10)
+# Libro de ventas del staff
+LIBRO_VENTAS_POR_PAGINA = env.int('LIBRO_VENTAS_POR_PAGINA', default=50)
+
+# === RESÚMENES DE VENTAS (ventas/resumenes.py) ===
+# Días hacia atrás que recalcula ``manage.py conciliar_resumenes``
+RESUMENES_DIAS_CONCILIACION = env.int('RESUMENES_DIAS_CONCILIACION', default=3)
+
+# === VITRINA DE CAMPAÑAS (marketing/campanas.py) ===
+# Productos por página en cada categoría con campañas
+CAMPANAS_PRODUCTOS_POR_PAGINA = env.int('CAMPANAS_PRODUCTOS_POR_PAGINA', default=8)
+
+# === AUTOCOMPLETAR DE MARKETING (marketing/autocompletar.py) ===
+# Coincidencias por página en los selectores de productos y clientes
+AUTOCOMPLETAR_LIMITE = env.int('AUTOCOMPLETAR_LIMITE', default=20)
+
+# === LISTADOS DEL ADMIN (core/listados.py) ===
+# Filas que se cuentan como máximo en un listado filtrado
+ADMIN_CONTEO_TOPE = env.int('ADMIN_CONTEO_TOPE', default=10000)
+
 # === URLS Y WSGI ===
 ROOT_URLCONF = 'heladeria.urls'
 WSGI_APPLICATION = 'heladeria.wsgi.application'
@@ -63,6 +98,7 @@ TEMPLATES = [
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
                 'core.context_processors.roles',
+                'core.context_processors.carrito',
             ],
         },
     },
@@ -90,6 +126,44 @@ DATABASES = {
 # Para pruebas rápidas, no hace falta configurar STATIC_ROOT
 
 
+# === CACHÉ ===
+# En producción apuntar CACHE_URL a una caché compartida (p. ej. redis:// o memcache://)
+# para que todos los procesos vean la misma versión del catálogo y de los roles.
+# Con la caché local por proceso los roles no se cachean entre requests y
+# ``manage.py check --deploy`` avisa (core/versiones.py).
+# Con caché local, segundos que un worker puede tardar en ver los cambios del catálogo
+CACHE_LOCAL_SEGUNDOS = env.int('CACHE_LOCAL_SEGUNDOS', default=30)
+CACHES = {
+    'default': env.cache('CACHE_URL', default='locmemcache://'),
+    # Copia vigente de las sesiones (core/sesiones.py): compartida por todos los workers
+    'sesiones': env.cache('SESSION_CACHE_URL', default='filecache:///tmp/heladeria-sesiones?MAX_ENTRIES=50000'),
+}
+
+
+# === LOGS ===
+# Requests lentos: una línea JSON por request en ``heladeria.lentas``
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {
+        'json': {'format': '%(message)s'},
+    },
+    'handlers': {
+        'lentas': {
+            'class': 'logging.StreamHandler',
+            'formatter': 'json',
+        },
+    },
+    'loggers': {
+        'heladeria.lentas': {
+            'handlers': ['lentas'],
+            'level': 'WARNING',
+            'propagate': False,
+        },
+    },
+}
+
+
 # === VALIDADORES DE CONTRASEÑA ===
 AUTH_PASSWORD_VALIDATORS = [
     {'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator'},
@@ -121,7 +195,14 @@ LOGOUT_REDIRECT_URL = '/clientes/login/'
 # === SESIONES ===
 SESSION_COOKIE_AGE = 60 * 60 * 2  # 2 horas
 SESSION_EXPIRE_AT_BROWSER_CLOSE = False
+# Expiración deslizante: el motor solo escribe en la base cuando los datos
+# cambian o el vencimiento necesita renovarse (ver core/sesiones.py)
 SESSION_SAVE_EVERY_REQUEST = True
+SESSION_ENGINE = 'core.sesiones'
+SESSION_CACHE_ALIAS = 'sesiones'
+# Cambios no críticos (contadores, preferencias) se agrupan en la caché
+SESION_INTERVALO_ESCRITURA = env.int('SESION_INTERVALO_ESCRITURA', default=300)
+SESION_RENOVAR_CADA = env.int('SESION_RENOVAR_CADA', default=600)
 SESSION_COOKIE_SECURE = False
 SESSION_COOKIE_SAMESITE = 'Lax'
 
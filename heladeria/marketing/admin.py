@@ -1,9 +1,15 @@
 from django.contrib import admin
-from django.utils import timezone
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
 from django.utils.html import format_html
 from django.core.exceptions import ValidationError
 from datetime import timedelta
-from .models import Promocion, Producto  
+from core.listados import PaginadorEstimado
+from core.roles import gestiona_marketing
+from productos.catalogo import invalidar_catalogo
+from .elegibilidad import reindexar
+from .models import FINALIZADA, INACTIVA, VIGENTE, Promocion, Producto, ReglaFidelizacion
+from .vigencia import sincronizar
 
 class ProductoInline(admin.TabularInline):
     model = Promocion.productos.through
@@ -13,12 +19,22 @@ class ProductoInline(admin.TabularInline):
 
 
 def activar_promociones(modeladmin, request, queryset):
-    updated = queryset.update(activa=True)
+    ids = list(queryset.values_list('id', flat=True))
+    updated = Promocion.objects.filter(id__in=ids).update(activa=True)
+    # update() no pasa por save() ni por post_save: el estado y el índice
+    # de elegibilidad se recalculan aparte
+    sincronizar(Promocion, ids)
+    reindexar(ids)
+    invalidar_catalogo()
     modeladmin.message_user(request, f"{updated} promoción(es) activada(s).")
 activar_promociones.short_description = "Activar promociones seleccionadas"
 
 def desactivar_promociones(modeladmin, request, queryset):
-    updated = queryset.update(activa=False)
+    ids = list(queryset.values_list('id', flat=True))
+    updated = Promocion.objects.filter(id__in=ids).update(activa=False)
+    sincronizar(Promocion, ids)
+    reindexar(ids)
+    invalidar_catalogo()
     modeladmin.message_user(request, f"{updated} promoción(es) desactivada(s).")
 desactivar_promociones.short_description = "Desactivar promociones seleccionadas"
 
@@ -32,45 +48,51 @@ extender_fechas.short_description = "Extender fechas 7 días"
 @admin.register(Promocion)
 class PromocionAdmin(admin.ModelAdmin):
     list_display = ('nombre', 'tipo', 'valor_descuento', 'rango_fechas', 'es_vigente_status', 'num_productos')
-    list_filter = ('activa', 'tipo', 'fecha_inicio', 'fecha_fin')
+    list_filter = ('estado', 'activa', 'tipo', 'fecha_inicio', 'fecha_fin')
     search_fields = ('nombre', 'descripcion')
     date_hierarchy = 'fecha_inicio'
     filter_horizontal = ('productos',)
     inlines = [ProductoInline]
     actions = [activar_promociones, desactivar_promociones, extender_fechas]
+    paginator = PaginadorEstimado
+    show_full_result_count = False
 
     def rango_fechas(self, obj):
         return f"{obj.fecha_inicio.strftime('%d/%m/%y')} a {obj.fecha_fin.strftime('%d/%m/%y')}"
     rango_fechas.short_description = "Vigencia"
 
     def es_vigente_status(self, obj):
-        hoy = timezone.now().date()
-        if obj.es_vigente:
+        # Estado precalculado (marketing/vigencia.py), sin comparar fechas por fila
+        if obj.estado == VIGENTE:
             return format_html('<span style="color: green; font-weight: bold;">ACTIVA</span>')
-        elif obj.fecha_fin < hoy:
+        elif obj.estado == FINALIZADA:
             return format_html('<span style="color: red;">FINALIZADA</span>')
-        elif not obj.activa:
+        elif obj.estado == INACTIVA:
             return format_html('<span style="color: orange;">INACTIVA (Manual)</span>')
         else:
             return format_html('<span style="color: blue;">PRÓXIMA</span>')
     es_vigente_status.short_description = 'Estado'
+    es_vigente_status.admin_order_field = 'estado'
 
     def num_productos(self, obj):
-        return obj.productos.count() if obj.productos.exists() else "Global/Todos"
+        return obj._num_productos or "Global/Todos"
     num_productos.short_description = 'Aplica a'
 
 
     def get_queryset(self, request):
-        return super().get_queryset(request)
+        # Productos por promoción en una subconsulta, no dos consultas por fila
+        productos = (Promocion.productos.through.objects.filter(promocion=OuterRef('pk')).order_by()
+                     .values('promocion').annotate(n=Count('id')).values('n'))
+        return super().get_queryset(request).annotate(_num_productos=Coalesce(Subquery(productos), 0))
 
     def has_add_permission(self, request):
-        return request.user.is_superuser or request.user.groups.filter(name='Marketing').exists()
+        return gestiona_marketing(request.user)
 
     def has_change_permission(self, request, obj=None):
-        return request.user.is_superuser or request.user.groups.filter(name='Marketing').exists()
+        return gestiona_marketing(request.user)
 
     def has_delete_permission(self, request, obj=None):
-        return request.user.is_superuser or request.user.groups.filter(name='Marketing').exists()
+        return gestiona_marketing(request.user)
 
     def save_model(self, request, obj, form, change):
         if obj.fecha_fin < obj.fecha_inicio:
@@ -82,3 +104,20 @@ class PromocionAdmin(admin.ModelAdmin):
         if obj.tipo == '2X1' and obj.valor_descuento not in (0, None):
             raise ValidationError({'valor_descuento': "2x1 no requiere valor de descuento."})
         super().save_model(request, obj, form, change)
+
+
+@admin.register(ReglaFidelizacion)
+class ReglaFidelizacionAdmin(admin.ModelAdmin):
+    list_display = ('nombre', 'promocion', 'criterio', 'umbral', 'dias_periodo', 'activa')
+    list_filter = ('activa', 'criterio')
+    list_select_related = ('promocion',)
+    search_fields = ('nombre', 'promocion__nombre')
+
+    def has_add_permission(self, request):
+        return gestiona_marketing(request.user)
+
+    def has_change_permission(self, request, obj=None):
+        return gestiona_marketing(request.user)
+
+    def has_delete_permission(self, request, obj=None):
+        return gestiona_marketing(request.user)
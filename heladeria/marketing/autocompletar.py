@@ -0,0 +1,88 @@
+"""
+Búsqueda por prefijo para los selectores de productos y clientes.
+
+Los formularios de marketing ya no traen todas las filas: el widget
+``SelectorAutocompletar`` (marketing/forms.py) pide coincidencias a estas
+funciones mientras se escribe, a través de las vistas JSON.
+
+- El texto se busca como prefijo (``LIKE 'texto%'``), que puede recorrer
+  los índices de ``Producto.nombre``/``codigo`` y ``User.username``/
+  ``Cliente.rut`` en vez de leer la tabla completa.
+- Las páginas siguientes se piden con un cursor (keyset) sobre el mismo
+  orden de la búsqueda, sin ``OFFSET``; cada página trae una fila de más
+  para saber si hay otra.
+"""
+from django.conf import settings
+from django.db.models import Q
+
+from clientes.models import Cliente
+from productos.models import Producto
+
+
+def limite_maximo():
+    return getattr(settings, 'AUTOCOMPLETAR_LIMITE', 20)
+
+
+def _limite(valor):
+    try:
+        return min(max(int(valor), 1), limite_maximo())
+    except (TypeError, ValueError):
+        return limite_maximo()
+
+
+def _pagina(consulta, limite, cursor_de):
+    filas = list(consulta[:limite + 1])
+    siguiente = cursor_de(filas[limite - 1]) if len(filas) > limite else None
+    return filas[:limite], siguiente
+
+
+def buscar_productos(texto='', despues=None, limite=None):
+    """``([{'id', 'texto'}], cursor_siguiente)`` ordenados por nombre."""
+    limite = _limite(limite)
+    productos = Producto.objects.only('id', 'nombre', 'codigo').order_by('nombre', 'id')
+    if texto:
+        productos = productos.filter(Q(nombre__istartswith=texto) | Q(codigo__istartswith=texto))
+    if despues:
+        # Cursor "nombre|id": el id desempata productos con el mismo nombre
+        nombre, _, pk = despues.rpartition('|')
+        if pk.isdigit():
+            productos = productos.filter(Q(nombre__gt=nombre) | Q(nombre=nombre, id__gt=int(pk)))
+
+    filas, siguiente = _pagina(productos, limite, lambda p: f"{p.nombre}|{p.id}")
+    return [
+        {'id': p.id, 'texto': f"{p.nombre} ({p.codigo})" if p.codigo else p.nombre}
+        for p in filas
+    ], siguiente
+
+
+def buscar_clientes(texto='', despues=None, limite=None, promocion_id=None):
+    """
+    ``([{'id', 'texto'}], cursor_siguiente)`` ordenados por usuario. Con
+    ``promocion_id`` solo busca entre los beneficiados de esa promoción.
+    """
+    limite = _limite(limite)
+    clientes = (Cliente.objects.select_related('user')
+                .only('id', 'rut', 'user__username', 'user__first_name', 'user__last_name')
+                .order_by('user__username'))
+    if texto:
+        clientes = clientes.filter(Q(user__username__istartswith=texto) | Q(rut__startswith=texto))
+    if promocion_id is not None:
+        clientes = clientes.filter(promociones_beneficiadas=promocion_id)
+    if despues:
+        # El usuario es único: basta como cursor
+        clientes = clientes.filter(user__username__gt=despues)
+
+    filas, siguiente = _pagina(clientes, limite, lambda c: c.user.username)
+    return [
+        {'id': c.id, 'texto': etiqueta_cliente(c)}
+        for c in filas
+    ], siguiente
+
+
+def etiqueta_cliente(cliente):
+    texto = cliente.user.username
+    if cliente.nombre != texto:
+        texto += f" — {cliente.nombre}"
+    if cliente.rut:
+        texto += f" ({cliente.rut})"
+    return texto
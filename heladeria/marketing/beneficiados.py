@@ -0,0 +1,154 @@
+"""
+Asignación masiva de clientes beneficiados a una promoción.
+
+Con cientos de miles de clientes no se eligen de a uno en el formulario:
+se asignan por regla (los mismos criterios de ``ReglaFidelizacion``,
+evaluados sobre toda la base de clientes) o subiendo un archivo con el
+segmento (un usuario o RUT por fila).
+
+En ambos casos los ids se procesan por lotes de ``TAMANO_LOTE``:
+
+1. ``bulk_create(ignore_conflicts=True)`` sobre la tabla intermedia, una
+   sentencia por lote (la asignación cliente–promoción es única, repetir
+   una carga no duplica nada);
+2. ``agregar_beneficiados`` suma el lote al índice de elegibilidad, ya que
+   ``bulk_create`` no dispara ``m2m_changed``;
+3. al confirmar la transacción se invalida el catálogo.
+"""
+import csv
+import io
+from dataclasses import dataclass
+from datetime import timedelta
+from itertools import islice
+
+from django.db import transaction
+from django.db.models import Count, Q
+from django.utils import timezone
+
+from clientes.models import Cliente
+from productos.catalogo import invalidar_catalogo
+from ventas.models import Venta
+from .elegibilidad import agregar_beneficiados
+from .models import Promocion, ReglaFidelizacion
+
+
+TAMANO_LOTE = 5000
+
+# Encabezados aceptados en la primera fila del archivo de segmento
+ENCABEZADOS = {'usuario', 'username', 'rut', 'cliente'}
+
+
+class SegmentoInvalido(Exception):
+    """El archivo del segmento no se puede leer."""
+
+
+@dataclass
+class ResultadoAsignacion:
+    leidos: int = 0
+    asignados: int = 0          # asignaciones nuevas (sin contar las que ya existían)
+    no_encontrados: int = 0
+
+    def resumen(self):
+        texto = f"{self.asignados} cliente(s) nuevos asignados"
+        if self.leidos:
+            texto += f" de {self.leidos} leídos, {self.no_encontrados} no encontrado(s)"
+        return texto + "."
+
+
+def _lotes(valores):
+    valores = iter(valores)
+    while lote := list(islice(valores, TAMANO_LOTE)):
+        yield lote
+
+
+def _asignar_lote(promocion, cliente_ids):
+    Beneficiados = Promocion.clientes_beneficiados.through
+    Beneficiados.objects.bulk_create(
+        [Beneficiados(promocion_id=promocion.pk, cliente_id=cliente_id) for cliente_id in cliente_ids],
+        ignore_conflicts=True,
+    )
+    agregar_beneficiados((cliente_id, promocion.pk) for cliente_id in cliente_ids)
+
+
+def asignar(promocion, lotes_de_ids):
+    """
+    Asigna a ``promocion`` los clientes de ``lotes_de_ids`` (iterable de
+    listas de ids). Devuelve cuántas asignaciones son nuevas.
+    """
+    Beneficiados = Promocion.clientes_beneficiados.through
+    asignados = Beneficiados.objects.filter(promocion_id=promocion.pk)
+    with transaction.atomic():
+        antes = asignados.count()
+        for cliente_ids in lotes_de_ids:
+            if cliente_ids:
+                _asignar_lote(promocion, cliente_ids)
+        nuevos = asignados.count() - antes
+        if nuevos:
+            transaction.on_commit(invalidar_catalogo)
+    return nuevos
+
+
+# --------------------------------------------------------------------------
+# Por regla
+# --------------------------------------------------------------------------
+
+def clientes_por_regla(criterio, umbral, dias_periodo, ahora=None):
+    """
+    Ids de los clientes que cumplen el criterio en los últimos
+    ``dias_periodo`` días, calculados en la base de datos:
+
+    - ``COMPRAS_EN_PERIODO``: al menos ``umbral`` compras;
+    - ``MONTO_COMPRA``: alguna compra de al menos ``umbral``.
+    """
+    ahora = ahora or timezone.now()
+    ventas = Venta.objects.filter(cliente__isnull=False, fecha_venta__gte=ahora - timedelta(days=dias_periodo))
+    if criterio == ReglaFidelizacion.COMPRAS_EN_PERIODO:
+        ventas = ventas.values('cliente_id').annotate(compras=Count('id')).filter(compras__gte=umbral)
+    elif criterio == ReglaFidelizacion.MONTO_COMPRA:
+        ventas = ventas.filter(total__gte=umbral).values('cliente_id').distinct()
+    else:
+        raise ValueError(f"Criterio desconocido: {criterio}")
+    return ventas.order_by('cliente_id').values_list('cliente_id', flat=True)
+
+
+def asignar_por_regla(promocion, criterio, umbral, dias_periodo):
+    ids = clientes_por_regla(criterio, umbral, dias_periodo).iterator(chunk_size=TAMANO_LOTE)
+    return ResultadoAsignacion(asignados=asignar(promocion, _lotes(ids)))
+
+
+# --------------------------------------------------------------------------
+# Por archivo de segmento
+# --------------------------------------------------------------------------
+
+def leer_segmento(archivo):
+    """Identificadores (usuario o RUT) de la primera columna de un CSV o TXT binario."""
+    try:
+        texto = io.TextIOWrapper(archivo, encoding='utf-8-sig', newline='')
+        muestra = texto.read(4096)
+        texto.seek(0)
+        delimitador = ';' if ';' in muestra else ','
+        for numero, fila in enumerate(csv.reader(texto, delimiter=delimitador)):
+            valor = fila[0].strip() if fila else ''
+            if valor and not (numero == 0 and valor.lower() in ENCABEZADOS):
+                yield valor
+    except (UnicodeDecodeError, csv.Error) as e:
+        raise SegmentoInvalido(f"No se pudo leer el archivo: {e}") from e
+
+
+def asignar_segmento(promocion, identificadores):
+    resultado = ResultadoAsignacion()
+
+    def lotes_de_ids():
+        for lote in _lotes(identificadores):
+            lote = set(lote)
+            encontrados = list(
+                Cliente.objects.filter(Q(user__username__in=lote) | Q(rut__in=lote))
+                .values_list('id', 'user__username', 'rut')
+            )
+            conocidos = {u for _, u, _ in encontrados} | {r for _, _, r in encontrados}
+            resultado.leidos += len(lote)
+            resultado.no_encontrados += len(lote - conocidos)
+            yield [cliente_id for cliente_id, _, _ in encontrados]
+
+    resultado.asignados = asignar(promocion, lotes_de_ids())
+    return resultado
@@ -0,0 +1,85 @@
+"""
+Vitrina de campañas vigentes, cacheada por categoría.
+
+Las campañas de una categoría comparten los productos con stock de esa
+categoría, así que la página se arma por categoría:
+
+- Las campañas vigentes (pocas) se leen en una consulta y se guardan en la
+  caché agrupadas por categoría.
+- Los productos salen de ``paginas_por_categoria`` (productos/catalogo.py):
+  una sola consulta con ventana por categoría, stock y orden resueltos en
+  la base de datos y solo ``CAMPANAS_PRODUCTOS_POR_PAGINA`` productos de la
+  página pedida en cada categoría.
+- El HTML de cada categoría (sus campañas y su página de productos) se
+  cachea como fragmento; si falta alguno, se piden juntas solo las
+  categorías que faltan.
+
+Las claves usan la versión del catálogo (``SnapshotCatalogo.clave``), que
+sube con los cambios de productos, categorías y campañas, cuando una venta
+agota un producto o lo repone, y con el cambio de día. Las demás ventas no
+la tocan, así que los fragmentos no muestran el stock exacto, solo si hay.
+Con caché compartida (``core/versiones.py``) una visita repetida no
+consulta la base de datos en ningún worker; con caché local por proceso
+cada worker reconstruye los fragmentos cada ``CACHE_LOCAL_SEGUNDOS``.
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.template.loader import render_to_string
+
+from productos.catalogo import DURACION_SNAPSHOT, paginas_por_categoria
+from .models import VIGENTE, Campana
+
+
+def productos_por_pagina():
+    return getattr(settings, 'CAMPANAS_PRODUCTOS_POR_PAGINA', 8)
+
+
+def campanas_por_categoria(snapshot):
+    """``{categoria_id: [campañas]}`` de las categorías vigentes con stock, cacheado por versión."""
+    clave = snapshot.clave('campanas')
+    agrupadas = cache.get(clave)
+    if agrupadas is None:
+        agrupadas = {}
+        campanas = (Campana.objects
+                    .filter(estado=VIGENTE, categoria_id__in=snapshot.categorias.values())
+                    .select_related('categoria')
+                    .order_by('categoria__nombre', '-fecha_inicio', 'id'))
+        for campana in campanas:
+            agrupadas.setdefault(campana.categoria_id, []).append(campana)
+        cache.set(clave, agrupadas, DURACION_SNAPSHOT)
+    return agrupadas
+
+
+def fragmentos_campanas(snapshot, categorias, paginas):
+    """
+    HTML de cada categoría de ``categorias`` (``{id: [campañas]}``), en el
+    orden recibido. ``paginas``: categoria_id → página de productos pedida.
+    """
+    por_pagina = productos_por_pagina()
+    claves = {
+        cid: snapshot.clave('campanas', 'html', cid, paginas.get(cid, 1), por_pagina)
+        for cid in categorias
+    }
+    guardados = cache.get_many(claves.values())
+    faltantes = {cid: campanas for cid, campanas in categorias.items() if claves[cid] not in guardados}
+
+    if faltantes:
+        nombres = {campanas[0].categoria.nombre: cid for cid, campanas in faltantes.items()}
+        paginados = paginas_por_categoria(
+            snapshot,
+            {nombre: paginas.get(cid, 1) for nombre, cid in nombres.items()},
+            por_pagina,
+            categorias=set(nombres),
+        )
+        nuevos = {}
+        for nombre, cid in nombres.items():
+            nuevos[claves[cid]] = render_to_string('marketing/campanas_categoria.html', {
+                'categoria_id': cid,
+                'categoria': nombre,
+                'campanas': faltantes[cid],
+                'productos': paginados.get(nombre),
+            })
+        cache.set_many(nuevos, DURACION_SNAPSHOT)
+        guardados.update(nuevos)
+
+    return [guardados[claves[cid]] for cid in categorias]
@@ -0,0 +1,141 @@
+"""
+Índice de elegibilidad de promociones (``ElegibilidadPromocion``).
+
+Cada promoción activa se expande en filas ``(producto, cliente)``:
+
+- promoción con productos → una fila por producto; sin productos → ``TODOS``;
+- promoción general → cliente ``TODOS``; si no, una fila por beneficiado
+  y otra ``SIN_CLIENTE`` (las líneas sin cliente ven todas las promociones,
+  como en ``MotorPrecios.elegibles``).
+
+Así, las promociones que aplican a una línea salen de una sola consulta por
+índice (``promociones_de_linea``), sin los JOIN con las tablas M2M ni el
+``DISTINCT`` que necesitaba calcularlas en línea.
+
+El índice se mantiene desde ``marketing/signals.py``:
+
+- guardar una promoción o cambiar sus productos la reindexa completa;
+- agregar o quitar beneficiados solo inserta o borra sus filas;
+- las asignaciones masivas sin señales (fidelización, cargas) llaman a
+  ``agregar_beneficiados`` o a ``reconstruir_indice``;
+- los ``update()`` de ``activa`` o de fechas (acciones del admin) llaman a
+  ``reindexar`` con los ids tocados.
+"""
+from django.utils import timezone
+
+from .models import ElegibilidadPromocion, Promocion
+
+
+TODOS = ElegibilidadPromocion.TODOS
+SIN_CLIENTE = ElegibilidadPromocion.SIN_CLIENTE
+TAMANO_LOTE = 5000
+
+
+def _insertar(filas):
+    lote = []
+    for fila in filas:
+        lote.append(fila)
+        if len(lote) >= TAMANO_LOTE:
+            ElegibilidadPromocion.objects.bulk_create(lote)
+            lote = []
+    if lote:
+        ElegibilidadPromocion.objects.bulk_create(lote)
+
+
+def _filas(promocion, productos, clientes):
+    return (
+        ElegibilidadPromocion(
+            promocion_id=promocion.id, producto_id=producto_id, cliente_id=cliente_id,
+            fecha_inicio=promocion.fecha_inicio, fecha_fin=promocion.fecha_fin,
+        )
+        for producto_id in productos
+        for cliente_id in clientes
+    )
+
+
+def _productos_de(promocion):
+    return list(Promocion.productos.through.objects.filter(promocion_id=promocion.id)
+                .values_list('producto_id', flat=True)) or [TODOS]
+
+
+def _clientes_de(promocion):
+    if promocion.es_general:
+        return [TODOS]
+    beneficiados = (Promocion.clientes_beneficiados.through.objects
+                    .filter(promocion_id=promocion.id).values_list('cliente_id', flat=True))
+    return [SIN_CLIENTE, *beneficiados]
+
+
+def reindexar(promocion_ids):
+    """Recalcula las filas de las promociones indicadas."""
+    ElegibilidadPromocion.objects.filter(promocion_id__in=promocion_ids).delete()
+    for promocion in Promocion.objects.filter(id__in=promocion_ids, activa=True):
+        _insertar(_filas(promocion, _productos_de(promocion), _clientes_de(promocion)))
+
+
+def reconstruir_indice():
+    """Borra y recalcula el índice completo (tras cargas masivas)."""
+    ElegibilidadPromocion.objects.all().delete()
+    for promocion in Promocion.objects.filter(activa=True).iterator():
+        _insertar(_filas(promocion, _productos_de(promocion), _clientes_de(promocion)))
+
+
+def agregar_beneficiados(pares):
+    """
+    Agrega al índice asignaciones ``(cliente_id, promocion_id)`` nuevas, en
+    un número fijo de consultas sin importar cuántas asignaciones vengan.
+    """
+    por_promocion = {}
+    for cliente_id, promocion_id in pares:
+        por_promocion.setdefault(promocion_id, set()).add(cliente_id)
+    promociones = list(Promocion.objects.filter(id__in=por_promocion, activa=True, es_general=False))
+    if not promociones:
+        return
+    ids = [p.id for p in promociones]
+    productos = {}
+    for promocion_id, producto_id in (Promocion.productos.through.objects
+                                      .filter(promocion_id__in=ids).values_list('promocion_id', 'producto_id')):
+        productos.setdefault(promocion_id, []).append(producto_id)
+    # Sin duplicar las que ya estaban indexadas
+    indexadas = set(
+        ElegibilidadPromocion.objects
+        .filter(promocion_id__in=ids, cliente_id__in=set().union(*(por_promocion[i] for i in ids)))
+        .values_list('promocion_id', 'cliente_id')
+    )
+    _insertar(
+        fila
+        for promocion in promociones
+        for fila in _filas(
+            promocion,
+            productos.get(promocion.id, [TODOS]),
+            [c for c in por_promocion[promocion.id] if (promocion.id, c) not in indexadas],
+        )
+    )
+
+
+def quitar_beneficiados(promocion_id, cliente_ids):
+    """Quita del índice a los clientes de una promoción (o de todas si ``promocion_id`` es None)."""
+    filas = ElegibilidadPromocion.objects.filter(cliente_id__in=cliente_ids)
+    if promocion_id is not None:
+        filas = filas.filter(promocion_id=promocion_id)
+    filas.delete()
+
+
+def promociones_de_linea(producto_id, cliente_id=None, hoy=None):
+    """
+    Promociones vigentes que aplican a ``producto_id`` para ``cliente_id``,
+    en una consulta sobre ``elegibilidad_linea_idx``. Sin cliente aplican
+    todas, igual que en ``MotorPrecios``.
+    """
+    hoy = hoy or timezone.localdate()
+    clientes = [TODOS, SIN_CLIENTE] if cliente_id is None else [cliente_id, TODOS]
+    promocion_ids = (
+        ElegibilidadPromocion.objects
+        .filter(producto_id__in=[producto_id, TODOS], cliente_id__in=clientes,
+                fecha_fin__gte=hoy, fecha_inicio__lte=hoy)
+        .values('promocion_id')
+    )
+    return list(
+        Promocion.objects.filter(id__in=promocion_ids)
+        .only('id', 'nombre', 'tipo', 'valor_descuento', 'es_general')
+    )
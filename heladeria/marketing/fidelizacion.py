@@ -0,0 +1,149 @@
+"""
+Asignación automática de promociones de fidelización.
+
+El checkout solo deja un ``EventoVenta`` en la bandeja de salida (outbox),
+dentro de su transacción; las ventas cargadas en el admin lo dejan desde
+``DetalleVenta.save``. El comando ``python manage.py procesar_fidelizacion``
+drena la bandeja por lotes y evalúa las ``ReglaFidelizacion`` activas.
+
+Cada evento se evalúa a la fecha de su venta, no a la hora en que corre el
+worker: con la bandeja atrasada, una venta de ayer cuenta las compras de los
+días previos a ayer y solo califica para promociones en fechas ese día.
+
+Cada lote usa un número fijo de consultas sin importar cuántas ventas traiga:
+
+1. toma los eventos pendientes (``FOR UPDATE SKIP LOCKED``);
+2. carga las reglas activas cuya promoción estuvo en fechas en los días
+   de esas ventas;
+3. lee las fechas de compra de los clientes del lote en la ventana que
+   cubren sus ventas (una sola consulta) y cuenta, para cada evento y
+   período configurado, las que caen antes de su venta;
+4. inserta las asignaciones con ``bulk_create(ignore_conflicts=True)`` y
+   las suma al índice de elegibilidad (``marketing/elegibilidad.py``);
+5. borra los eventos procesados.
+
+Reprocesar un evento no duplica nada: la asignación cliente–promoción es
+única en la tabla intermedia.
+"""
+from bisect import bisect_left, bisect_right
+from collections import defaultdict
+from datetime import timedelta
+
+from django.db import transaction
+from django.utils import timezone
+
+from productos.catalogo import invalidar_catalogo
+from ventas.models import EventoVenta, Venta
+from .elegibilidad import agregar_beneficiados
+from .models import Promocion, ReglaFidelizacion
+
+
+TAMANO_LOTE = 5000
+
+
+def reglas_en_fechas(desde, hasta):
+    """
+    Reglas activas cuya promoción estuvo en fechas algún día entre ``desde``
+    y ``hasta`` (los días de las ventas del lote). No se usa
+    ``Promocion.estado``: una venta hecha mientras la promoción corría
+    cuenta aunque el worker la procese cuando ya está FINALIZADA.
+    """
+    return list(
+        ReglaFidelizacion.objects
+        .filter(activa=True, promocion__activa=True,
+                promocion__fecha_inicio__lte=hasta, promocion__fecha_fin__gte=desde)
+        .select_related('promocion')
+        .only('criterio', 'umbral', 'dias_periodo', 'promocion__fecha_inicio', 'promocion__fecha_fin')
+    )
+
+
+def _compras_previas(eventos, periodos):
+    """
+    ``{(evento_id, dias): compras}``: compras del cliente en los ``dias``
+    anteriores a la venta del evento, ella incluida, para cada período.
+    """
+    if not periodos:
+        return {}
+    fechas = defaultdict(list)
+    ventas = (
+        Venta.objects
+        .filter(
+            cliente_id__in={evento.cliente_id for evento in eventos},
+            fecha_venta__gte=min(evento.fecha_venta for evento in eventos) - timedelta(days=max(periodos)),
+            fecha_venta__lte=max(evento.fecha_venta for evento in eventos),
+        )
+        .order_by('cliente_id', 'fecha_venta')
+        .values_list('cliente_id', 'fecha_venta')
+    )
+    for cliente_id, fecha_venta in ventas:
+        fechas[cliente_id].append(fecha_venta)
+    return {
+        (evento.id, dias): (
+            bisect_right(fechas[evento.cliente_id], evento.fecha_venta)
+            - bisect_left(fechas[evento.cliente_id], evento.fecha_venta - timedelta(days=dias))
+        )
+        for evento in eventos
+        for dias in periodos
+    }
+
+
+def evaluar(eventos, reglas):
+    """
+    Pares ``(cliente_id, promocion_id)`` que cumplen alguna regla, cada evento
+    evaluado a la fecha de su venta: la promoción debía estar en fechas ese
+    día y las compras se cuentan hacia atrás desde esa venta.
+    """
+    periodos = {
+        regla.dias_periodo for regla in reglas
+        if regla.criterio == ReglaFidelizacion.COMPRAS_EN_PERIODO
+    }
+    compras = _compras_previas(eventos, periodos)
+
+    asignaciones = set()
+    for evento in eventos:
+        dia = timezone.localdate(evento.fecha_venta)
+        for regla in reglas:
+            promocion = regla.promocion
+            if not promocion.fecha_inicio <= dia <= promocion.fecha_fin:
+                continue
+            if regla.criterio == ReglaFidelizacion.MONTO_COMPRA:
+                cumple = evento.total >= regla.umbral
+            elif regla.criterio == ReglaFidelizacion.COMPRAS_EN_PERIODO:
+                cumple = compras[(evento.id, regla.dias_periodo)] >= regla.umbral
+            else:
+                cumple = False
+            if cumple:
+                asignaciones.add((evento.cliente_id, promocion.pk))
+    return asignaciones
+
+
+def procesar_lote(tamano=TAMANO_LOTE):
+    """
+    Procesa hasta ``tamano`` eventos pendientes. Devuelve ``(eventos, asignaciones)``.
+    Seguro con varios workers en paralelo.
+    """
+    Beneficiados = Promocion.clientes_beneficiados.through
+    with transaction.atomic():
+        eventos = list(
+            EventoVenta.objects
+            .select_for_update(skip_locked=True)
+            .order_by('id')
+            .only('id', 'cliente_id', 'total', 'fecha_venta')[:tamano]
+        )
+        if not eventos:
+            return 0, 0
+
+        dias = [timezone.localdate(evento.fecha_venta) for evento in eventos]
+        reglas = reglas_en_fechas(min(dias), max(dias))
+        asignaciones = evaluar(eventos, reglas) if reglas else set()
+        if asignaciones:
+            Beneficiados.objects.bulk_create(
+                [Beneficiados(cliente_id=c, promocion_id=p) for c, p in asignaciones],
+                ignore_conflicts=True,
+            )
+            # bulk_create no dispara m2m_changed: los precios por cliente cambian
+            agregar_beneficiados(asignaciones)
+            transaction.on_commit(invalidar_catalogo)
+
+        EventoVenta.objects.filter(id__in=[evento.id for evento in eventos]).delete()
+    return len(eventos), len(asignaciones)
@@ -1,25 +1,77 @@
 from django import forms
+from django.urls import reverse
 from django.utils import timezone
-from .models import Promocion, Campana
+from .autocompletar import etiqueta_cliente
+from .models import Promocion, Campana, ReglaFidelizacion
 from productos.models import Producto, Categoria
 from clientes.models import Cliente
 
 
+class SelectorAutocompletar(forms.SelectMultiple):
+    """
+    Selección múltiple que solo dibuja las opciones elegidas; el resto se
+    busca por prefijo en ``url_name`` mientras se escribe
+    (marketing/autocompletar.py, static/marketing/js/autocompletar.js).
+    """
+
+    class Media:
+        js = ('marketing/js/autocompletar.js',)
+
+    def __init__(self, url_name, etiqueta=str, attrs=None):
+        super().__init__(attrs)
+        self.url_name = url_name
+        self.etiqueta = etiqueta
+        self.parametros = ''
+
+    def get_context(self, name, value, attrs):
+        contexto = super().get_context(name, value, attrs)
+        url = reverse(self.url_name)
+        contexto['widget']['attrs']['data-autocompletar'] = f"{url}?{self.parametros}" if self.parametros else url
+        return contexto
+
+    def optgroups(self, name, value, attrs=None):
+        # Una consulta por las elegidas, en vez de recorrer todo el queryset
+        ids = [v for v in value if str(v).isdigit()]
+        elegidos = self.choices.queryset.filter(pk__in=ids) if ids else []
+        return [(None, [
+            self.create_option(name, obj.pk, self.etiqueta(obj), True, indice, attrs=attrs)
+            for indice, obj in enumerate(elegidos)
+        ], 0)]
+
+
 class PromocionForm(forms.ModelForm):
     productos = forms.ModelMultipleChoiceField(
-        queryset=Producto.objects.all().order_by('nombre'),
-        widget=forms.CheckboxSelectMultiple,
+        queryset=Producto.objects.all(),
+        widget=SelectorAutocompletar('marketing:autocompletar_productos'),
         required=False,
         label="Productos (dejar vacío para aplicar a TODA la tienda)"
     )
 
-    clientes_beneficiados = forms.ModelMultipleChoiceField(
-        queryset=Cliente.objects.all().order_by('user__first_name'),
-        widget=forms.CheckboxSelectMultiple,
+    # Los beneficiados pueden ser miles: el formulario solo agrega o quita
+    # algunos; las asignaciones masivas van por marketing/beneficiados.py
+    agregar_clientes = forms.ModelMultipleChoiceField(
+        queryset=Cliente.objects.select_related('user'),
+        widget=SelectorAutocompletar('marketing:autocompletar_clientes', etiqueta=etiqueta_cliente),
         required=False,
-        label="Clientes beneficiados (dejar vacío si es general)"
+        label="Agregar clientes beneficiados"
     )
 
+    quitar_clientes = forms.ModelMultipleChoiceField(
+        queryset=Cliente.objects.select_related('user'),
+        widget=SelectorAutocompletar('marketing:autocompletar_clientes', etiqueta=etiqueta_cliente),
+        required=False,
+        label="Quitar clientes beneficiados"
+    )
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        if self.instance.pk:
+            # Solo se ofrecen los que ya son beneficiados
+            self.fields['quitar_clientes'].queryset = self.instance.clientes_beneficiados.select_related('user')
+            self.fields['quitar_clientes'].widget.parametros = f"promocion={self.instance.pk}"
+        else:
+            del self.fields['quitar_clientes']
+
     class Meta:
         model = Promocion
         fields = [
@@ -30,7 +82,6 @@ class PromocionForm(forms.ModelForm):
             'fecha_inicio',
             'fecha_fin',
             'productos',
-            'clientes_beneficiados',
             'es_general',
             'activa'
         ]
@@ -56,6 +107,14 @@ class PromocionForm(forms.ModelForm):
 
         return cleaned_data
 
+    def _save_m2m(self):
+        super()._save_m2m()
+        # add/remove disparan m2m_changed: índice de elegibilidad y catálogo al día
+        if self.cleaned_data.get('agregar_clientes'):
+            self.instance.clientes_beneficiados.add(*self.cleaned_data['agregar_clientes'])
+        if self.cleaned_data.get('quitar_clientes'):
+            self.instance.clientes_beneficiados.remove(*self.cleaned_data['quitar_clientes'])
+
 
 class CampanaForm(forms.ModelForm):
     categoria = forms.ModelChoiceField(
@@ -96,3 +155,30 @@ class CampanaForm(forms.ModelForm):
             self.add_error('fecha_fin', "La fecha de fin no puede ser anterior a la fecha de inicio.")
 
         return cleaned_data
+
+
+class AsignarBeneficiadosForm(forms.Form):
+    """Asignación masiva de beneficiados por regla o por archivo (marketing/beneficiados.py)."""
+    POR_REGLA = 'regla'
+    POR_ARCHIVO = 'archivo'
+
+    modo = forms.ChoiceField(
+        choices=[(POR_REGLA, "Por regla de compra"), (POR_ARCHIVO, "Por archivo de segmento")],
+        widget=forms.RadioSelect, initial=POR_REGLA,
+    )
+    criterio = forms.ChoiceField(choices=ReglaFidelizacion.CRITERIOS, required=False)
+    umbral = forms.DecimalField(min_value=0, max_digits=12, decimal_places=2, required=False,
+                                help_text="Compras mínimas en el período, o monto mínimo de una compra.")
+    dias_periodo = forms.IntegerField(min_value=1, initial=30, required=False, label="Días del período")
+    archivo = forms.FileField(required=False,
+                              help_text="CSV o TXT con un usuario o RUT por fila (primera columna).")
+
+    def clean(self):
+        cleaned_data = super().clean()
+        if cleaned_data.get('modo') == self.POR_REGLA:
+            for campo in ('criterio', 'umbral', 'dias_periodo'):
+                if cleaned_data.get(campo) in (None, ''):
+                    self.add_error(campo, "Obligatorio para asignar por regla.")
+        elif cleaned_data.get('modo') == self.POR_ARCHIVO and not cleaned_data.get('archivo'):
+            self.add_error('archivo', "Suba el archivo del segmento.")
+        return cleaned_data
@@ -0,0 +1,52 @@
+# Generated by Django 5.2.7 on 2026-10-18 15:08
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def crear_reglas_existentes(apps, schema_editor):
+    """
+    Convierte en reglas declarativas los criterios que antes estaban fijos
+    en ventas/signals.py (promociones buscadas por nombre).
+    """
+    Promocion = apps.get_model('marketing', 'Promocion')
+    ReglaFidelizacion = apps.get_model('marketing', 'ReglaFidelizacion')
+    fidelidad = Promocion.objects.filter(nombre__icontains="Fidelidad").order_by('id').first()
+    if fidelidad:
+        ReglaFidelizacion.objects.create(
+            nombre="3 compras en 30 días", promocion=fidelidad,
+            criterio='COMPRAS_EN_PERIODO', umbral=3, dias_periodo=30,
+        )
+    compra_alta = Promocion.objects.filter(nombre__icontains="Compra Alta").order_by('id').first()
+    if compra_alta:
+        ReglaFidelizacion.objects.create(
+            nombre="Compra sobre $20.000", promocion=compra_alta,
+            criterio='MONTO_COMPRA', umbral=20000,
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('marketing', '0003_remove_campana_valor_descuento'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReglaFidelizacion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('nombre', models.CharField(max_length=100)),
+                ('criterio', models.CharField(choices=[('COMPRAS_EN_PERIODO', 'Cantidad de compras en el período'), ('MONTO_COMPRA', 'Monto de una compra')], max_length=20)),
+                ('umbral', models.DecimalField(decimal_places=2, help_text='Compras mínimas en el período, o monto mínimo de la compra.', max_digits=12)),
+                ('dias_periodo', models.PositiveIntegerField(default=30, help_text="Solo para 'Cantidad de compras en el período'.")),
+                ('activa', models.BooleanField(default=True)),
+                ('promocion', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='reglas_fidelizacion', to='marketing.promocion')),
+            ],
+            options={
+                'verbose_name': 'Regla de fidelización',
+                'verbose_name_plural': 'Reglas de fidelización',
+            },
+        ),
+        migrations.RunPython(crear_reglas_existentes, migrations.RunPython.noop),
+    ]
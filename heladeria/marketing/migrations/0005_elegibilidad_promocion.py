@@ -0,0 +1,50 @@
+# Generated by Django 5.2.7 on 2026-10-18 15:32
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def poblar_indice(apps, schema_editor):
+    """Expande las promociones activas igual que marketing.elegibilidad.reindexar."""
+    Promocion = apps.get_model('marketing', 'Promocion')
+    ElegibilidadPromocion = apps.get_model('marketing', 'ElegibilidadPromocion')
+    todos, sin_cliente = 0, -1
+    for promocion in Promocion.objects.filter(activa=True).iterator():
+        productos = list(promocion.productos.values_list('id', flat=True)) or [todos]
+        if promocion.es_general:
+            clientes = [todos]
+        else:
+            clientes = [sin_cliente] + list(promocion.clientes_beneficiados.values_list('id', flat=True))
+        ElegibilidadPromocion.objects.bulk_create([
+            ElegibilidadPromocion(
+                promocion_id=promocion.id, producto_id=producto_id, cliente_id=cliente_id,
+                fecha_inicio=promocion.fecha_inicio, fecha_fin=promocion.fecha_fin,
+            )
+            for producto_id in productos
+            for cliente_id in clientes
+        ], batch_size=5000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('marketing', '0004_reglafidelizacion'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ElegibilidadPromocion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('producto_id', models.BigIntegerField()),
+                ('cliente_id', models.BigIntegerField()),
+                ('fecha_inicio', models.DateField()),
+                ('fecha_fin', models.DateField()),
+                ('promocion', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='elegibilidad', to='marketing.promocion')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['producto_id', 'cliente_id', 'fecha_fin', 'fecha_inicio', 'promocion'], name='elegibilidad_linea_idx'), models.Index(fields=['promocion', 'cliente_id'], name='elegibilidad_promo_idx')],
+            },
+        ),
+        migrations.RunPython(poblar_indice, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 5.2.7 on 2026-10-18 15:37
+
+from django.db import migrations, models
+from django.db.models import Case, CharField, Value, When
+from django.utils import timezone
+
+
+def calcular_estados(apps, schema_editor):
+    """Mismo cálculo que marketing.vigencia.expresion_estado."""
+    hoy = timezone.localdate()
+    estado = Case(
+        When(activa=True, fecha_inicio__lte=hoy, fecha_fin__gte=hoy, then=Value('VIGENTE')),
+        When(fecha_fin__lt=hoy, then=Value('FINALIZADA')),
+        When(activa=False, then=Value('INACTIVA')),
+        default=Value('PROGRAMADA'),
+        output_field=CharField(),
+    )
+    for nombre in ('Promocion', 'Campana'):
+        apps.get_model('marketing', nombre).objects.update(estado=estado)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('marketing', '0005_elegibilidad_promocion'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='campana',
+            name='estado',
+            field=models.CharField(choices=[('PROGRAMADA', 'Programada'), ('VIGENTE', 'Vigente'), ('FINALIZADA', 'Finalizada'), ('INACTIVA', 'Inactiva')], db_index=True, default='PROGRAMADA', editable=False, max_length=10),
+        ),
+        migrations.AddField(
+            model_name='promocion',
+            name='estado',
+            field=models.CharField(choices=[('PROGRAMADA', 'Programada'), ('VIGENTE', 'Vigente'), ('FINALIZADA', 'Finalizada'), ('INACTIVA', 'Inactiva')], db_index=True, default='PROGRAMADA', editable=False, max_length=10),
+        ),
+        migrations.RunPython(calcular_estados, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 5.2.7 on 2026-10-18 15:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('clientes', '0003_cliente_metricas'),
+        ('marketing', '0006_estado_vigencia'),
+        ('productos', '0005_indices_compuestos'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='campana',
+            name='estado',
+            field=models.CharField(choices=[('PROGRAMADA', 'Programada'), ('VIGENTE', 'Vigente'), ('FINALIZADA', 'Finalizada'), ('INACTIVA', 'Inactiva')], default='PROGRAMADA', editable=False, max_length=10),
+        ),
+        migrations.AlterField(
+            model_name='promocion',
+            name='estado',
+            field=models.CharField(choices=[('PROGRAMADA', 'Programada'), ('VIGENTE', 'Vigente'), ('FINALIZADA', 'Finalizada'), ('INACTIVA', 'Inactiva')], default='PROGRAMADA', editable=False, max_length=10),
+        ),
+        migrations.AddIndex(
+            model_name='campana',
+            index=models.Index(fields=['estado', 'categoria', '-fecha_inicio'], name='campana_estado_cat_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='campana',
+            index=models.Index(fields=['estado', 'fecha_fin'], name='campana_estado_fin_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='promocion',
+            index=models.Index(fields=['estado', 'fecha_inicio'], name='promocion_estado_inicio_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='promocion',
+            index=models.Index(fields=['estado', 'fecha_fin'], name='promocion_estado_fin_idx'),
+        ),
+    ]
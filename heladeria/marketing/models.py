@@ -11,6 +11,36 @@ TIPO_PROMOCION = [
     ('2X1', '2x1'),
 ]
 
+# Estado de vigencia, precalculado en ``estado`` (ver marketing/vigencia.py)
+PROGRAMADA = 'PROGRAMADA'
+VIGENTE = 'VIGENTE'
+FINALIZADA = 'FINALIZADA'
+INACTIVA = 'INACTIVA'
+ESTADO_VIGENCIA = [
+    (PROGRAMADA, 'Programada'),
+    (VIGENTE, 'Vigente'),
+    (FINALIZADA, 'Finalizada'),
+    (INACTIVA, 'Inactiva'),
+]
+
+
+def estado_vigencia(activa, fecha_inicio, fecha_fin, hoy=None):
+    """Estado que corresponde en ``hoy`` (misma regla que ``vigencia.expresion_estado``)."""
+    hoy = hoy or timezone.localdate()
+    if activa and fecha_inicio <= hoy <= fecha_fin:
+        return VIGENTE
+    if fecha_fin < hoy:
+        return FINALIZADA
+    if not activa:
+        return INACTIVA
+    return PROGRAMADA
+
+
+def _guardar_con_estado(instancia, kwargs):
+    instancia.estado = estado_vigencia(instancia.activa, instancia.fecha_inicio, instancia.fecha_fin)
+    if kwargs.get('update_fields') is not None:
+        kwargs['update_fields'] = {*kwargs['update_fields'], 'estado'}
+
 
 class Promocion(models.Model):
     nombre = models.CharField(max_length=100)
@@ -21,6 +51,7 @@ class Promocion(models.Model):
     fecha_inicio = models.DateField()
     fecha_fin = models.DateField()
     activa = models.BooleanField(default=False)
+    estado = models.CharField(max_length=10, choices=ESTADO_VIGENCIA, default=PROGRAMADA, editable=False)
 
     # 🔹 Promoción general o específica
     es_general = models.BooleanField(default=False)
@@ -32,14 +63,24 @@ class Promocion(models.Model):
         related_name='promociones_beneficiadas'
     )
 
+    class Meta:
+        indexes = [
+            # estado=VIGENTE y las fronteras que revisa el programador de vigencias
+            models.Index(fields=['estado', 'fecha_inicio'], name='promocion_estado_inicio_idx'),
+            models.Index(fields=['estado', 'fecha_fin'], name='promocion_estado_fin_idx'),
+        ]
+
     @property
     def es_vigente(self):
-        hoy = timezone.localdate()
-        return self.activa and self.fecha_inicio <= hoy <= self.fecha_fin
+        return self.estado == VIGENTE
 
     def __str__(self):
         return self.nombre
 
+    def save(self, *args, **kwargs):
+        _guardar_con_estado(self, kwargs)
+        super().save(*args, **kwargs)
+
     def clean(self):
         """Validaciones de coherencia de fechas y tipo de promoción."""
         # Validaciones específicas de tipo
@@ -71,6 +112,7 @@ class Campana(models.Model):
     fecha_inicio = models.DateField()
     fecha_fin = models.DateField()
     activa = models.BooleanField(default=False)
+    estado = models.CharField(max_length=10, choices=ESTADO_VIGENCIA, default=PROGRAMADA, editable=False)
 
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
@@ -79,6 +121,11 @@ class Campana(models.Model):
         ordering = ['-fecha_inicio']
         verbose_name = "Campana"
         verbose_name_plural = "Campanas"
+        indexes = [
+            # Campañas vigentes por categoría, en el orden por defecto
+            models.Index(fields=['estado', 'categoria', '-fecha_inicio'], name='campana_estado_cat_idx'),
+            models.Index(fields=['estado', 'fecha_fin'], name='campana_estado_fin_idx'),
+        ]
 
     def __str__(self):
         return f"{self.nombre} ({self.categoria.nombre})"
@@ -86,8 +133,11 @@ class Campana(models.Model):
     @property
     def es_vigente(self):
         """Retorna True si la campaña está activa y dentro de las fechas."""
-        hoy = timezone.localdate()
-        return self.activa and self.fecha_inicio <= hoy <= self.fecha_fin
+        return self.estado == VIGENTE
+
+    def save(self, *args, **kwargs):
+        _guardar_con_estado(self, kwargs)
+        super().save(*args, **kwargs)
 
     def clean(self):
         """Validaciones de fechas."""
@@ -99,3 +149,76 @@ class Campana(models.Model):
 
         if self.fecha_inicio and self.fecha_fin and self.fecha_fin < self.fecha_inicio:
             raise ValidationError({'fecha_fin': "La fecha de fin no puede ser anterior a la fecha de inicio."})
+
+
+class ReglaFidelizacion(models.Model):
+    """
+    Regla declarativa para asignar una promoción a los clientes que cumplen
+    un criterio de compra. La evalúa el worker de fidelización
+    (``python manage.py procesar_fidelizacion``), nunca el checkout.
+    """
+    COMPRAS_EN_PERIODO = 'COMPRAS_EN_PERIODO'
+    MONTO_COMPRA = 'MONTO_COMPRA'
+    CRITERIOS = [
+        (COMPRAS_EN_PERIODO, 'Cantidad de compras en el período'),
+        (MONTO_COMPRA, 'Monto de una compra'),
+    ]
+
+    nombre = models.CharField(max_length=100)
+    promocion = models.ForeignKey(Promocion, on_delete=models.CASCADE, related_name='reglas_fidelizacion')
+    criterio = models.CharField(max_length=20, choices=CRITERIOS)
+    umbral = models.DecimalField(
+        max_digits=12, decimal_places=2,
+        help_text="Compras mínimas en el período, o monto mínimo de la compra.",
+    )
+    dias_periodo = models.PositiveIntegerField(
+        default=30, help_text="Solo para 'Cantidad de compras en el período'.",
+    )
+    activa = models.BooleanField(default=True)
+
+    class Meta:
+        verbose_name = "Regla de fidelización"
+        verbose_name_plural = "Reglas de fidelización"
+
+    def __str__(self):
+        return f"{self.nombre} → {self.promocion.nombre}"
+
+    def clean(self):
+        if self.umbral is not None and self.umbral <= 0:
+            raise ValidationError({'umbral': "El umbral debe ser mayor a cero."})
+        if self.criterio == self.COMPRAS_EN_PERIODO and not self.dias_periodo:
+            raise ValidationError({'dias_periodo': "Indica la cantidad de días del período."})
+
+
+class ElegibilidadPromocion(models.Model):
+    """
+    Índice desnormalizado de qué promoción aplica a qué producto y cliente.
+
+    ``producto_id`` o ``cliente_id`` en ``TODOS`` (0) significa "cualquiera":
+    promoción sin productos, o general. Las promociones no generales llevan
+    además filas con ``cliente_id = SIN_CLIENTE`` (-1) para las líneas sin
+    cliente, a las que el motor de precios les aplica todas. Solo contiene
+    promociones activas; lo mantiene ``marketing/elegibilidad.py`` desde las
+    señales de ``Promocion``.
+    """
+    TODOS = 0
+    SIN_CLIENTE = -1
+
+    promocion = models.ForeignKey(Promocion, on_delete=models.CASCADE, related_name='elegibilidad')
+    producto_id = models.BigIntegerField()
+    cliente_id = models.BigIntegerField()
+    fecha_inicio = models.DateField()
+    fecha_fin = models.DateField()
+
+    class Meta:
+        indexes = [
+            # Cubre la búsqueda por línea: producto IN (p, 0) AND cliente IN (c, 0) AND vigencia
+            models.Index(
+                fields=['producto_id', 'cliente_id', 'fecha_fin', 'fecha_inicio', 'promocion'],
+                name='elegibilidad_linea_idx',
+            ),
+            models.Index(fields=['promocion', 'cliente_id'], name='elegibilidad_promo_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.promocion_id}: producto {self.producto_id or 'todos'}, cliente {self.cliente_id or 'todos'}"
@@ -0,0 +1,210 @@
+"""
+Motor de precios con promociones.
+
+Carga una sola vez las promociones vigentes, las compila en un índice
+producto → reglas y luego calcula precios de muchas líneas
+``(producto, cantidad, cliente)`` sin volver a consultar la base de datos.
+Lo usan el listado de la tienda, el carrito, el checkout y ``DetalleVenta``.
+
+Lo vigente se decide por ``activa`` y las fechas respecto de ``hoy``, igual
+que en el índice de elegibilidad que usa ``para_linea``, y no por
+``Promocion.estado``: el estado lo pone al día el programador y entre dos
+pasadas (o para un ``hoy`` que no es hoy) los dos motores tarificarían
+distinto la misma línea.
+"""
+import copy
+from dataclasses import dataclass
+from decimal import Decimal, ROUND_HALF_UP
+
+from django.utils import timezone
+
+from .elegibilidad import promociones_de_linea
+from .models import Promocion
+
+
+CENTAVO = Decimal('0.01')
+
+
+@dataclass(frozen=True)
+class ReglaPromocion:
+    """Versión compilada (inmutable) de una ``Promocion``."""
+    id: int
+    nombre: str
+    tipo: str
+    valor_descuento: Decimal
+    es_general: bool
+
+    @classmethod
+    def desde_promocion(cls, promo):
+        return cls(
+            id=promo.id,
+            nombre=promo.nombre,
+            tipo=promo.tipo,
+            valor_descuento=Decimal(promo.valor_descuento or 0),
+            es_general=promo.es_general,
+        )
+
+    def precio_unitario(self, precio_base, cantidad):
+        """Precio unitario resultante de aplicar esta regla a la línea."""
+        if self.tipo == 'PORCENTAJE' and self.valor_descuento:
+            descuento = (precio_base * (self.valor_descuento / Decimal('100'))).quantize(CENTAVO)
+            return precio_base - descuento
+        if self.tipo == 'VALOR_FIJO' and self.valor_descuento:
+            return max(precio_base - self.valor_descuento, Decimal('0.00'))
+        if self.tipo == '2X1' and cantidad >= 2:
+            unidades_pagas = (cantidad + 1) // 2
+            return (precio_base * unidades_pagas / cantidad).quantize(CENTAVO)
+        return precio_base
+
+
+@dataclass(frozen=True)
+class LineaPrecio:
+    """Resultado de tarificar una línea."""
+    producto: object
+    cantidad: int
+    precio_original: Decimal
+    precio_unitario: Decimal
+    subtotal: Decimal
+    promocion: ReglaPromocion = None
+    promociones: tuple = ()
+
+
+class MotorPrecios:
+    """
+    Índice en memoria de las promociones vigentes en un día.
+
+    - ``por_producto``: producto_id → reglas que nombran ese producto.
+    - ``globales``: reglas sin productos (aplican a toda la tienda).
+    - ``beneficiadas``: cliente_id → ids de promociones asignadas al cliente.
+    """
+
+    def __init__(self, por_producto, globales, beneficiadas=None, hoy=None):
+        self.por_producto = {pid: tuple(reglas) for pid, reglas in por_producto.items()}
+        self.globales = tuple(globales)
+        self.con_productos = {r.id: r for reglas in self.por_producto.values() for r in reglas}
+        self.beneficiadas = dict(beneficiadas or {})
+        self.hoy = hoy
+
+    @classmethod
+    def cargar(cls, clientes=(), hoy=None):
+        """Compila las promociones vigentes en ``hoy`` (máximo 3 consultas)."""
+        hoy = hoy or timezone.localdate()
+        promociones = (
+            Promocion.objects
+            .filter(activa=True, fecha_inicio__lte=hoy, fecha_fin__gte=hoy)
+            .only('id', 'nombre', 'tipo', 'valor_descuento', 'es_general')
+        )
+        reglas = {p.id: ReglaPromocion.desde_promocion(p) for p in promociones}
+
+        por_producto = {}
+        con_productos = set()
+        if reglas:
+            relaciones = Promocion.productos.through.objects.filter(
+                promocion_id__in=reglas.keys()
+            ).values_list('promocion_id', 'producto_id')
+            for promo_id, producto_id in relaciones:
+                por_producto.setdefault(producto_id, []).append(reglas[promo_id])
+                con_productos.add(promo_id)
+
+        globales = [r for pid, r in reglas.items() if pid not in con_productos]
+        motor = cls(por_producto, globales, hoy=hoy)
+        motor.cargar_clientes([c for c in clientes if c is not None])
+        return motor
+
+    @classmethod
+    def para_linea(cls, producto_id, cliente=None, hoy=None):
+        """
+        Motor para tarificar una sola línea (``DetalleVenta``): una consulta
+        al índice de elegibilidad en vez de compilar todo el catálogo.
+        """
+        hoy = hoy or timezone.localdate()
+        reglas = [
+            ReglaPromocion.desde_promocion(p)
+            for p in promociones_de_linea(producto_id, cliente.pk if cliente else None, hoy)
+        ]
+        # El índice ya filtró por cliente: todas las reglas le están asignadas
+        beneficiadas = {cliente.pk: {r.id for r in reglas}} if cliente else {}
+        return cls({producto_id: reglas}, (), beneficiadas, hoy=hoy)
+
+    def cargar_clientes(self, clientes):
+        """Indexa en una consulta las promociones asignadas a estos clientes."""
+        ids = {c.pk for c in clientes} - set(self.beneficiadas)
+        if not ids:
+            return
+        for cliente_id in ids:
+            self.beneficiadas[cliente_id] = set()
+        promo_ids = set(self.con_productos)
+        promo_ids.update(r.id for r in self.globales)
+        if not promo_ids:
+            return
+        asignaciones = Promocion.clientes_beneficiados.through.objects.filter(
+            cliente_id__in=ids, promocion_id__in=promo_ids
+        ).values_list('cliente_id', 'promocion_id')
+        for cliente_id, promo_id in asignaciones:
+            self.beneficiadas[cliente_id].add(promo_id)
+
+    def copia(self):
+        """Copia que comparte el índice pero con sus propios clientes cargados."""
+        motor = copy.copy(self)
+        motor.beneficiadas = {}
+        return motor
+
+    # ------------------------------------------------------------------
+    # Consultas sobre el índice (sin acceso a la base de datos)
+    # ------------------------------------------------------------------
+    def elegibles(self, reglas, cliente=None):
+        """Filtra las reglas que puede usar el cliente (todas si no hay cliente)."""
+        reglas = tuple(reglas)
+        if cliente is None:
+            return reglas
+        if cliente.pk not in self.beneficiadas:
+            self.cargar_clientes([cliente])
+        asignadas = self.beneficiadas[cliente.pk]
+        return tuple(r for r in reglas if r.es_general or r.id in asignadas)
+
+    def promociones_de(self, producto_id, cliente=None):
+        """Reglas que aplican a un producto (y cliente, si se indica)."""
+        return self.elegibles(self.por_producto.get(producto_id, ()) + self.globales, cliente)
+
+    def precio(self, producto, cantidad=1, cliente=None):
+        """Tarifica una línea aplicando la mejor promoción disponible."""
+        precio_base = Decimal(producto.precio)
+        reglas = self.promociones_de(producto.id, cliente)
+
+        mejor_precio, aplicada = precio_base, None
+        for regla in reglas:
+            precio_desc = regla.precio_unitario(precio_base, cantidad)
+            if precio_desc < mejor_precio:
+                mejor_precio, aplicada = precio_desc, regla
+
+        precio_unitario = mejor_precio.quantize(CENTAVO, rounding=ROUND_HALF_UP)
+        subtotal = (precio_unitario * cantidad).quantize(CENTAVO, rounding=ROUND_HALF_UP)
+        return LineaPrecio(
+            producto=producto,
+            cantidad=cantidad,
+            precio_original=precio_base,
+            precio_unitario=precio_unitario,
+            subtotal=subtotal,
+            promocion=aplicada,
+            promociones=reglas,
+        )
+
+    def precios(self, lineas):
+        """
+        Tarifica un lote de líneas ``(producto, cantidad[, cliente])``.
+
+        Los clientes del lote que aún no estén indexados se cargan en una
+        sola consulta antes de calcular.
+        """
+        lineas = [tuple(linea) + (None,) * (3 - len(linea)) for linea in lineas]
+        self.cargar_clientes([c for _, _, c in lineas if c is not None])
+        return [self.precio(producto, cantidad, cliente) for producto, cantidad, cliente in lineas]
+
+
+def motor_para(request):
+    """Motor de precios memoizado en el request (se carga una vez por request)."""
+    motor = getattr(request, '_motor_precios', None)
+    if motor is None:
+        motor = MotorPrecios.cargar()
+        request._motor_precios = motor
+    return motor
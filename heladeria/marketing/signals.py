@@ -2,6 +2,11 @@
 
 from django.contrib.auth.models import Group, Permission
 from django.contrib.contenttypes.models import ContentType
+from django.db.models.signals import m2m_changed, post_save
+from django.dispatch import receiver
+
+from .elegibilidad import agregar_beneficiados, quitar_beneficiados, reindexar
+from .models import Promocion
 
 # Lista de modelos a los que el grupo 'Marketing' debe tener acceso de SOLO LECTURA
 MODELOS_SOLO_LECTURA = [
@@ -42,4 +47,44 @@ def asignar_permisos_marketing(sender, **kwargs):
 
         except (ContentType.DoesNotExist, Permission.DoesNotExist):
             # Ignorar si algún modelo o permiso no existe (ej. si una app no está migrada)
-            continue
\ No newline at end of file
+            continue
+
+
+# ================================
+# 🔹 Índice de elegibilidad
+# ================================
+# Ver marketing/elegibilidad.py. Se actualiza en la misma transacción que el
+# cambio; el borrado de una promoción arrastra sus filas (CASCADE).
+@receiver(post_save, sender=Promocion)
+def reindexar_promocion(sender, instance, raw=False, **kwargs):
+    if not raw:
+        reindexar([instance.pk])
+
+
+@receiver(m2m_changed, sender=Promocion.productos.through)
+def reindexar_por_productos(sender, instance, action, reverse, pk_set, **kwargs):
+    if action == 'pre_clear' and reverse:
+        # Después del clear() ya no se sabe en qué promociones estaba el producto
+        instance._promociones_previas = list(instance.promocion_set.values_list('pk', flat=True))
+    elif action in ('post_add', 'post_remove'):
+        reindexar(pk_set if reverse else [instance.pk])
+    elif action == 'post_clear':
+        reindexar(getattr(instance, '_promociones_previas', []) if reverse else [instance.pk])
+
+
+@receiver(m2m_changed, sender=Promocion.clientes_beneficiados.through)
+def actualizar_beneficiados(sender, instance, action, reverse, pk_set, **kwargs):
+    if action == 'post_add':
+        pares = [(instance.pk, pk) for pk in pk_set] if reverse else [(pk, instance.pk) for pk in pk_set]
+        agregar_beneficiados(pares)
+    elif action == 'post_remove':
+        if reverse:
+            for promocion_id in pk_set:
+                quitar_beneficiados(promocion_id, [instance.pk])
+        else:
+            quitar_beneficiados(instance.pk, pk_set)
+    elif action == 'post_clear':
+        if reverse:
+            quitar_beneficiados(None, [instance.pk])
+        else:
+            reindexar([instance.pk])
@@ -0,0 +1,80 @@
+// Selectores con autocompletar (SelectorAutocompletar en marketing/forms.py).
+// El <select multiple> solo lleva las opciones elegidas; las coincidencias se
+// piden al endpoint JSON de data-autocompletar mientras se escribe.
+document.addEventListener("DOMContentLoaded", function () {
+    document.querySelectorAll("select[data-autocompletar]").forEach(function (select) {
+        const url = select.dataset.autocompletar;
+        const buscador = document.createElement("input");
+        buscador.type = "search";
+        buscador.className = "form-control mb-1";
+        buscador.placeholder = "Escriba para buscar...";
+        buscador.autocomplete = "off";
+        const lista = document.createElement("div");
+        lista.className = "list-group mb-2 shadow-sm";
+        lista.style.maxHeight = "240px";
+        lista.style.overflowY = "auto";
+        select.before(buscador, lista);
+        select.size = Math.max(select.options.length, 3);
+        select.title = "Doble clic para quitar";
+
+        let espera = null;
+        let consulta = null;
+
+        function agregar(item) {
+            if (!select.querySelector('option[value="' + item.id + '"]')) {
+                select.add(new Option(item.texto, item.id, true, true));
+                select.size = Math.max(select.options.length, 3);
+            }
+        }
+
+        function buscar(despues) {
+            if (consulta) consulta.abort();
+            consulta = new AbortController();
+            const parametros = new URLSearchParams({ q: buscador.value.trim() });
+            if (despues) parametros.set("despues", despues);
+            const separador = url.includes("?") ? "&" : "?";
+            fetch(url + separador + parametros, { signal: consulta.signal })
+                .then(function (respuesta) { return respuesta.json(); })
+                .then(function (datos) {
+                    if (!despues) lista.innerHTML = "";
+                    const anterior = lista.querySelector(".mas");
+                    if (anterior) anterior.remove();
+                    datos.resultados.forEach(function (item) {
+                        const boton = document.createElement("button");
+                        boton.type = "button";
+                        boton.className = "list-group-item list-group-item-action py-1";
+                        boton.textContent = item.texto;
+                        boton.addEventListener("click", function () { agregar(item); });
+                        lista.append(boton);
+                    });
+                    if (datos.siguiente) {
+                        const mas = document.createElement("button");
+                        mas.type = "button";
+                        mas.className = "list-group-item list-group-item-light text-center py-1 mas";
+                        mas.textContent = "Ver más...";
+                        mas.addEventListener("click", function () { buscar(datos.siguiente); });
+                        lista.append(mas);
+                    }
+                })
+                .catch(function () {});
+        }
+
+        buscador.addEventListener("input", function () {
+            clearTimeout(espera);
+            if (!buscador.value.trim()) {
+                lista.innerHTML = "";
+                return;
+            }
+            espera = setTimeout(function () { buscar(null); }, 250);
+        });
+
+        select.addEventListener("dblclick", function (evento) {
+            if (evento.target.tagName === "OPTION") evento.target.remove();
+        });
+
+        // Todo lo que quedó en la lista se envía, aunque se haya deseleccionado al hacer clic
+        select.form.addEventListener("submit", function () {
+            Array.from(select.options).forEach(function (opcion) { opcion.selected = true; });
+        });
+    });
+});
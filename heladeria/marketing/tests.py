@@ -1,3 +1,550 @@
-from django.test import TestCase
+from datetime import timedelta
+from decimal import Decimal
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from clientes.models import Cliente
+from productos.models import Categoria, Producto
+from ventas.checkout import registrar_venta
+from ventas.models import DetalleVenta, EventoVenta, Venta
+from .beneficiados import asignar_por_regla, asignar_segmento, leer_segmento
+from .elegibilidad import promociones_de_linea, reconstruir_indice, reindexar
+from .fidelizacion import procesar_lote
+from .models import (
+    FINALIZADA, INACTIVA, PROGRAMADA, VIGENTE, Campana, ElegibilidadPromocion, Promocion, ReglaFidelizacion,
+)
+from .precios import MotorPrecios
+from .vigencia import actualizar_estados, sincronizar, vigencia_cambiada
+
+
+class MotorPreciosTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        hoy = timezone.localdate()
+        categoria = Categoria.objects.create(nombre="Helado")
+        cls.productos = [
+            Producto.objects.create(nombre=f"Helado {i}", precio=Decimal('1000'), stock=10, categoria=categoria)
+            for i in range(20)
+        ]
+        cls.cliente = Cliente.objects.create(user=User.objects.create_user('cliente', password='x'))
+
+        porcentaje = Promocion.objects.create(
+            nombre="10%", tipo='PORCENTAJE', valor_descuento=10,
+            fecha_inicio=hoy, fecha_fin=hoy + timedelta(days=5), activa=True,
+        )
+        porcentaje.productos.add(cls.productos[0])
+        dos_por_uno = Promocion.objects.create(
+            nombre="2x1", tipo='2X1',
+            fecha_inicio=hoy, fecha_fin=hoy + timedelta(days=5), activa=True,
+        )
+        dos_por_uno.productos.add(cls.productos[0])
+        cls.exclusiva = Promocion.objects.create(
+            nombre="Exclusiva", tipo='VALOR_FIJO', valor_descuento=300,
+            fecha_inicio=hoy, fecha_fin=hoy + timedelta(days=5), activa=True,
+        )
+
+    def test_aplica_la_mejor_promocion(self):
+        motor = MotorPrecios.cargar()
+        self.assertEqual(motor.precio(self.productos[0], 1).precio_unitario, Decimal('700.00'))
+        self.assertEqual(motor.precio(self.productos[0], 2).precio_unitario, Decimal('500.00'))
+
+    def test_promocion_no_general_solo_para_beneficiados(self):
+        self.exclusiva.clientes_beneficiados.add(self.cliente)
+        otro = Cliente.objects.create(user=User.objects.create_user('otro', password='x'))
+        motor = MotorPrecios.cargar(clientes=[self.cliente, otro])
+
+        self.assertEqual(motor.precio(self.productos[1], 1, self.cliente).precio_unitario, Decimal('700.00'))
+        self.assertEqual(motor.precio(self.productos[1], 1, otro).precio_unitario, Decimal('1000.00'))
+
+    def test_los_dos_motores_usan_las_fechas_y_no_el_estado(self):
+        # El programador aún no pasó: la exclusiva ya terminó pero sigue VIGENTE
+        # y la "10%" ya empezó pero sigue PROGRAMADA
+        ayer = timezone.localdate() - timedelta(days=1)
+        Promocion.objects.filter(pk=self.exclusiva.pk).update(fecha_fin=ayer)
+        reindexar([self.exclusiva.pk])
+        Promocion.objects.filter(nombre="10%").update(estado=PROGRAMADA)
+        self.exclusiva.clientes_beneficiados.add(self.cliente)
+
+        for producto in self.productos[:2]:
+            por_lote = MotorPrecios.cargar(clientes=[self.cliente]).precio(producto, 1, self.cliente)
+            por_linea = MotorPrecios.para_linea(producto.id, self.cliente).precio(producto, 1, self.cliente)
+            self.assertEqual(por_lote.precio_unitario, por_linea.precio_unitario)
+        self.assertEqual(por_lote.precio_unitario, Decimal('1000.00'))
+        self.assertEqual(MotorPrecios.cargar().precio(self.productos[0], 1).precio_unitario, Decimal('900.00'))
+
+        # Con otro día, también coinciden
+        pasado = timezone.localdate() + timedelta(days=10)
+        producto = self.productos[0]
+        self.assertEqual(
+            MotorPrecios.cargar(hoy=pasado).precio(producto, 1).precio_unitario,
+            MotorPrecios.para_linea(producto.id, hoy=pasado).precio(producto, 1).precio_unitario,
+        )
+
+    def test_lote_sin_consultas_por_linea(self):
+        with self.assertNumQueries(3):
+            motor = MotorPrecios.cargar(clientes=[self.cliente])
+        with self.assertNumQueries(0):
+            lineas = motor.precios((p, 3, self.cliente) for p in self.productos)
+        self.assertEqual(len(lineas), len(self.productos))
+
+
+class FidelizacionTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        hoy = timezone.localdate()
+        categoria = Categoria.objects.create(nombre="Helado")
+        cls.producto = Producto.objects.create(nombre="Helado", precio=Decimal('1000'), stock=1000, categoria=categoria)
+        cls.frecuente = Promocion.objects.create(
+            nombre="Cliente frecuente", tipo='PORCENTAJE', valor_descuento=5,
+            fecha_inicio=hoy, fecha_fin=hoy + timedelta(days=30), activa=True,
+        )
+        cls.compra_alta = Promocion.objects.create(
+            nombre="Gran compra", tipo='PORCENTAJE', valor_descuento=10,
+            fecha_inicio=hoy, fecha_fin=hoy + timedelta(days=30), activa=True,
+        )
+        ReglaFidelizacion.objects.create(
+            nombre="3 compras", promocion=cls.frecuente,
+            criterio=ReglaFidelizacion.COMPRAS_EN_PERIODO, umbral=3, dias_periodo=30,
+        )
+        ReglaFidelizacion.objects.create(
+            nombre="Compra alta", promocion=cls.compra_alta,
+            criterio=ReglaFidelizacion.MONTO_COMPRA, umbral=5000,
+        )
+        cls.clientes = [
+            Cliente.objects.create(user=User.objects.create_user(f'cliente{i}', password='x'))
+            for i in range(3)
+        ]
+
+    def test_checkout_solo_encola_y_el_worker_asigna(self):
+        frecuente, grande, ocasional = self.clientes
+        for _ in range(3):
+            registrar_venta(frecuente, {self.producto.id: 1})
+        registrar_venta(grande, {self.producto.id: 6})
+        registrar_venta(ocasional, {self.producto.id: 1})
+
+        self.assertEqual(EventoVenta.objects.count(), 5)
+        self.assertFalse(self.frecuente.clientes_beneficiados.exists())
+
+        self.assertEqual(procesar_lote(), (5, 2))
+        self.assertEqual(list(self.frecuente.clientes_beneficiados.all()), [frecuente])
+        self.assertEqual(list(self.compra_alta.clientes_beneficiados.all()), [grande])
+        self.assertFalse(EventoVenta.objects.exists())
+        self.assertEqual(procesar_lote(), (0, 0))
+
+    def test_consultas_fijas_e_idempotente(self):
+        for cliente in self.clientes:
+            for _ in range(4):
+                registrar_venta(cliente, {self.producto.id: 1})
+        # Eventos reencolados: ya asignados, no se duplica nada
+        procesar_lote(tamano=3)
+        # eventos, reglas, conteo, asignaciones, índice (4), borrado (+ SAVEPOINT/RELEASE)
+        with self.assertNumQueries(11):
+            procesar_lote()
+        self.assertEqual(self.frecuente.clientes_beneficiados.count(), 3)
+        # Una fila por beneficiado más la de líneas sin cliente
+        self.assertEqual(
+            ElegibilidadPromocion.objects.filter(promocion=self.frecuente).count(), 4
+        )
+
+
+    def test_ventas_del_admin_tambien_encolan(self):
+        _, grande, _ = self.clientes
+        venta = Venta.objects.create(cliente=grande)
+        DetalleVenta(venta=venta, producto=self.producto, cantidad=2).save()
+        DetalleVenta(venta=venta, producto=self.producto, cantidad=4).save()
+
+        evento = EventoVenta.objects.get()
+        self.assertEqual((evento.venta_id, evento.total), (venta.pk, Decimal('6000.00')))
+        self.assertEqual(procesar_lote(), (1, 1))
+        self.assertEqual(list(self.compra_alta.clientes_beneficiados.all()), [grande])
+
+    def test_evalua_a_la_fecha_de_la_venta(self):
+        frecuente, grande, _ = self.clientes
+
+        def venta_del(cliente, unidades, dias_atras):
+            venta = registrar_venta(cliente, {self.producto.id: unidades})
+            fecha = timezone.now() - timedelta(days=dias_atras)
+            Venta.objects.filter(pk=venta.pk).update(fecha_venta=fecha)
+            EventoVenta.objects.filter(venta=venta).update(fecha_venta=fecha)
+
+        # La bandeja se procesa con 60 días de atraso: las compras cuentan
+        # hacia atrás desde cada venta, no desde hoy
+        Promocion.objects.filter(pk=self.frecuente.pk).update(fecha_inicio=timezone.localdate() - timedelta(days=90))
+        for dias_atras in (62, 61, 60):
+            venta_del(frecuente, 1, dias_atras)
+        # Una compra alta anterior al inicio de la promoción no califica
+        venta_del(grande, 6, 10)
+
+        self.assertEqual(procesar_lote(), (4, 1))
+        self.assertEqual(list(self.frecuente.clientes_beneficiados.all()), [frecuente])
+        self.assertFalse(self.compra_alta.clientes_beneficiados.exists())
+
+
+    def test_promocion_ya_finalizada_cuenta_para_ventas_de_su_periodo(self):
+        _, grande, _ = self.clientes
+        venta = registrar_venta(grande, {self.producto.id: 6})
+        fecha = timezone.now() - timedelta(days=10)
+        Venta.objects.filter(pk=venta.pk).update(fecha_venta=fecha)
+        EventoVenta.objects.filter(venta=venta).update(fecha_venta=fecha)
+
+        # La promoción corrió durante la venta y terminó antes de procesar la bandeja
+        hoy = timezone.localdate()
+        self.compra_alta.fecha_inicio = hoy - timedelta(days=20)
+        self.compra_alta.fecha_fin = hoy - timedelta(days=5)
+        self.compra_alta.save()
+        self.assertEqual(self.compra_alta.estado, FINALIZADA)
+
+        self.assertEqual(procesar_lote(), (1, 1))
+        self.assertEqual(list(self.compra_alta.clientes_beneficiados.all()), [grande])
+
+class ElegibilidadTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.hoy = timezone.localdate()
+        categoria = Categoria.objects.create(nombre="Helado")
+        cls.helado, cls.paleta = (
+            Producto.objects.create(nombre=nombre, precio=Decimal('1000'), stock=50, categoria=categoria)
+            for nombre in ("Helado", "Paleta")
+        )
+        cls.cliente, cls.otro = (
+            Cliente.objects.create(user=User.objects.create_user(nombre, password='x'))
+            for nombre in ("cliente", "otro")
+        )
+        cls.general = Promocion.objects.create(
+            nombre="10% helado", tipo='PORCENTAJE', valor_descuento=10, es_general=True,
+            fecha_inicio=cls.hoy, fecha_fin=cls.hoy + timedelta(days=5), activa=True,
+        )
+        cls.general.productos.add(cls.helado)
+        cls.exclusiva = Promocion.objects.create(
+            nombre="Exclusiva", tipo='VALOR_FIJO', valor_descuento=300, es_general=False,
+            fecha_inicio=cls.hoy, fecha_fin=cls.hoy + timedelta(days=5), activa=True,
+        )
+
+    def ids(self, producto, cliente=None):
+        return {p.id for p in promociones_de_linea(producto.id, cliente.pk if cliente else None)}
+
+    def test_el_indice_sigue_a_productos_y_beneficiados(self):
+        self.assertEqual(self.ids(self.helado, self.otro), {self.general.id})
+        self.assertEqual(self.ids(self.paleta, self.cliente), set())
+
+        self.exclusiva.clientes_beneficiados.add(self.cliente)
+        self.assertEqual(self.ids(self.paleta, self.cliente), {self.exclusiva.id})
+        self.assertEqual(self.ids(self.paleta, self.otro), set())
+        # Sin cliente aplican todas, como en MotorPrecios
+        self.assertEqual(self.ids(self.paleta), {self.exclusiva.id})
+
+        self.exclusiva.productos.add(self.helado)
+        self.assertEqual(self.ids(self.paleta, self.cliente), set())
+        self.assertEqual(self.ids(self.helado, self.cliente), {self.general.id, self.exclusiva.id})
+
+        self.cliente.promociones_beneficiadas.remove(self.exclusiva)
+        self.assertEqual(self.ids(self.helado, self.cliente), {self.general.id})
+
+        self.general.productos.clear()
+        self.assertEqual(self.ids(self.paleta, self.otro), {self.general.id})
+
+        self.general.activa = False
+        self.general.save()
+        self.assertEqual(self.ids(self.paleta, self.otro), set())
+
+    def test_vigencia_y_reconstruccion(self):
+        self.exclusiva.clientes_beneficiados.add(self.cliente)
+        manana = self.hoy + timedelta(days=6)
+        self.assertEqual(promociones_de_linea(self.helado.id, self.cliente.pk, manana), [])
+
+        filas = set(ElegibilidadPromocion.objects.values_list('promocion', 'producto_id', 'cliente_id'))
+        reconstruir_indice()
+        self.assertEqual(
+            set(ElegibilidadPromocion.objects.values_list('promocion', 'producto_id', 'cliente_id')), filas
+        )
+
+    def test_una_consulta_por_linea(self):
+        self.exclusiva.clientes_beneficiados.add(self.cliente)
+        with self.assertNumQueries(1):
+            promociones = promociones_de_linea(self.helado.id, self.cliente.pk)
+        self.assertEqual({p.id for p in promociones}, {self.general.id, self.exclusiva.id})
+
+    def test_detalle_venta_usa_el_indice(self):
+        self.exclusiva.clientes_beneficiados.add(self.cliente)
+        venta = Venta.objects.create(cliente=self.cliente)
+        detalle = DetalleVenta.objects.create(venta=venta, producto=self.helado, cantidad=1)
+        self.assertEqual(detalle.precio_unitario, Decimal('700.00'))
+
+
+    def test_acciones_del_admin_reindexan(self):
+        admin = User.objects.create_superuser('admin', password='x')
+        self.client.force_login(admin)
+        url = reverse('admin:marketing_promocion_changelist')
+
+        def accion(nombre):
+            self.client.post(url, {'action': nombre, '_selected_action': [self.general.pk]})
+
+        accion('desactivar_promociones')
+        self.assertEqual(self.ids(self.helado, self.otro), set())
+        accion('activar_promociones')
+        self.assertEqual(self.ids(self.helado, self.otro), {self.general.id})
+
+class VigenciaTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.hoy = timezone.localdate()
+        cls.categoria = Categoria.objects.create(nombre="Helado")
+        cls.promocion = Promocion.objects.create(
+            nombre="Fin de semana", tipo='PORCENTAJE', valor_descuento=10, activa=True,
+            fecha_inicio=cls.hoy + timedelta(days=1), fecha_fin=cls.hoy + timedelta(days=2),
+        )
+        cls.campana = Campana.objects.create(
+            nombre="Verano", categoria=cls.categoria, activa=True,
+            fecha_inicio=cls.hoy, fecha_fin=cls.hoy + timedelta(days=1),
+        )
+
+    def setUp(self):
+        self.eventos = []
+        receptor = lambda sender, ids, **kwargs: self.eventos.append((sender, ids))
+        vigencia_cambiada.connect(receptor, weak=False, dispatch_uid='test_vigencia')
+        self.addCleanup(vigencia_cambiada.disconnect, dispatch_uid='test_vigencia')
+
+    def pasada(self, dias):
+        with self.captureOnCommitCallbacks(execute=True):
+            return actualizar_estados(self.hoy + timedelta(days=dias))
+
+    def test_save_calcula_el_estado(self):
+        self.assertEqual(self.promocion.estado, PROGRAMADA)
+        self.assertEqual(self.campana.estado, VIGENTE)
+        self.promocion.activa = False
+        self.promocion.save(update_fields=['activa'])
+        self.promocion.refresh_from_db()
+        self.assertEqual(self.promocion.estado, INACTIVA)
+
+    def test_el_programador_cambia_estados_en_las_fronteras(self):
+        self.assertEqual(self.pasada(0), {Promocion: 0, Campana: 0})
+        self.assertEqual(self.eventos, [])
+
+        self.assertEqual(self.pasada(1), {Promocion: 1, Campana: 0})
+        self.assertEqual(self.eventos, [(Promocion, [self.promocion.id])])
+        self.assertEqual(Promocion.objects.get().estado, VIGENTE)
+
+        self.pasada(3)
+        self.assertEqual(Promocion.objects.get().estado, FINALIZADA)
+        self.assertEqual(Campana.objects.get().estado, FINALIZADA)
+        # Nada más que cambiar
+        self.assertEqual(self.pasada(3), {Promocion: 0, Campana: 0})
+
+    def test_sincronizar_tras_update_masivo(self):
+        Campana.objects.update(activa=False)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(sincronizar(Campana), [self.campana.id])
+        self.assertEqual(Campana.objects.get().estado, INACTIVA)
+        self.assertEqual(self.eventos, [(Campana, [self.campana.id])])
+
+
+@override_settings(CAMPANAS_PRODUCTOS_POR_PAGINA=2)
+class VitrinaCampanasTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        hoy = timezone.localdate()
+        cls.categorias = [Categoria.objects.create(nombre=f"Categoría {i}") for i in range(3)]
+        for categoria in cls.categorias[:2]:
+            for j in range(3):
+                Producto.objects.create(nombre=f"{categoria.nombre} {j}", precio=Decimal('1000'),
+                                        stock=5, categoria=categoria)
+        # Sin stock: ni la campaña ni el producto se muestran
+        Producto.objects.create(nombre="Agotado", precio=Decimal('1000'), stock=0, categoria=cls.categorias[2])
+        cls.campanas = [
+            Campana.objects.create(nombre=f"Campaña {c.nombre}", categoria=c, activa=True,
+                                   fecha_inicio=hoy, fecha_fin=hoy + timedelta(days=5))
+            for c in cls.categorias
+        ]
+
+    def setUp(self):
+        cache.clear()
+
+    def get(self, **parametros):
+        return self.client.get(reverse('marketing:campanas_disponibles'), parametros).content.decode()
+
+    def test_productos_por_categoria_paginados(self):
+        html = self.get()
+        self.assertIn("Campaña Categoría 0", html)
+        self.assertIn("Campaña Categoría 1", html)
+        self.assertNotIn("Campaña Categoría 2", html)
+        self.assertIn("Categoría 0 1", html)
+        self.assertNotIn("Categoría 0 2", html)
+
+        cid = self.categorias[0].id
+        html = self.get(categoria=cid, **{f'page_{cid}': 2})
+        self.assertIn("Categoría 0 2", html)
+        self.assertNotIn("Categoría 0 1<", html)
+        self.assertNotIn("Campaña Categoría 1", html)
+
+    def test_consultas_fijas_y_fragmentos_en_cache(self):
+        with CaptureQueriesContext(connection) as primera:
+            self.get()
+        hoy = timezone.localdate()
+        for i in range(5):
+            categoria = Categoria.objects.create(nombre=f"Nueva {i}")
+            Producto.objects.create(nombre=f"Nuevo {i}", precio=Decimal('1000'), stock=1, categoria=categoria)
+            Campana.objects.create(nombre=f"Campaña nueva {i}", categoria=categoria, activa=True,
+                                   fecha_inicio=hoy, fecha_fin=hoy + timedelta(days=5))
+        with CaptureQueriesContext(connection) as segunda:
+            self.assertIn("Campaña nueva 4", self.get())
+        self.assertEqual(len(segunda), len(primera))
+
+        with CaptureQueriesContext(connection) as repetida:
+            self.get()
+        self.assertEqual(len(repetida), 0)
+
+    def test_ventas_sin_agotar_no_invalidan_fragmentos(self):
+        cliente = Cliente.objects.create(user=User.objects.create_user('comprador', password='x'))
+        producto = Producto.objects.get(nombre="Categoría 0 0")
+        self.get()
+        with self.captureOnCommitCallbacks(execute=True):
+            registrar_venta(cliente, {producto.id: 2})
+        with CaptureQueriesContext(connection) as consultas:
+            self.get()
+        self.assertEqual(len(consultas), 0)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            registrar_venta(cliente, {producto.id: 3})
+        self.assertNotIn("Categoría 0 0<", self.get())
+
+    def test_invalida_al_cambiar_campana_o_producto(self):
+        self.get()
+        campana = self.campanas[0]
+        campana.nombre = "Campaña renovada"
+        campana.save()
+        self.assertIn("Campaña renovada", self.get())
+
+        producto = Producto.objects.get(nombre="Categoría 1 0")
+        producto.stock = 0
+        producto.save()
+        self.assertNotIn("Categoría 1 0", self.get())
+
+
+class SelectoresPromocionTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        hoy = timezone.localdate()
+        cls.staff = User.objects.create_user('staff', password='x', is_staff=True)
+        categoria = Categoria.objects.create(nombre="Helado")
+        for i in range(30):
+            Producto.objects.create(nombre=f"Helado {i:02}", codigo=f"H{i:02}", precio=Decimal('1000'),
+                                    stock=10, categoria=categoria)
+        Producto.objects.create(nombre="Paleta", precio=Decimal('500'), stock=10, categoria=categoria)
+        cls.clientes = [
+            Cliente.objects.create(user=User.objects.create_user(f'cli{i:02}', password='x'), rut=f"{i}-9")
+            for i in range(25)
+        ]
+        cls.promocion = Promocion.objects.create(
+            nombre="Exclusiva", tipo='PORCENTAJE', valor_descuento=10, activa=True,
+            fecha_inicio=hoy, fecha_fin=hoy + timedelta(days=5),
+        )
+
+    def setUp(self):
+        self.client.force_login(self.staff)
+
+    def test_autocompletar_por_prefijo_y_cursor(self):
+        url = reverse('marketing:autocompletar_productos')
+        datos = self.client.get(url, {'q': 'hel', 'limite': 20}).json()
+        vistos = [r['texto'] for r in datos['resultados']]
+        while datos['siguiente']:
+            datos = self.client.get(url, {'q': 'hel', 'limite': 20, 'despues': datos['siguiente']}).json()
+            vistos += [r['texto'] for r in datos['resultados']]
+        self.assertEqual(vistos, [f"Helado {i:02} (H{i:02})" for i in range(30)])
+
+        datos = self.client.get(reverse('marketing:autocompletar_clientes'), {'q': '3-'}).json()
+        self.assertEqual([r['id'] for r in datos['resultados']], [self.clientes[3].id])
+
+        self.client.logout()
+        self.assertEqual(self.client.get(url).status_code, 302)
+
+    def test_formulario_no_carga_todas_las_filas(self):
+        self.promocion.clientes_beneficiados.add(*self.clientes[:20])
+        respuesta = self.client.get(reverse('marketing:editar_promocion', args=[self.promocion.pk]))
+        html = respuesta.content.decode()
+        self.assertNotIn("Helado 00", html)
+        self.assertNotIn("cli00", html)
+        self.assertIn('data-autocompletar="/marketing/autocompletar/clientes/?promocion=', html)
+        self.assertIn("marketing/js/autocompletar.js", html)
+
+    def test_agregar_y_quitar_beneficiados_desde_el_formulario(self):
+        self.promocion.clientes_beneficiados.add(self.clientes[0], self.clientes[1])
+        producto = Producto.objects.get(codigo="H05")
+        hoy = timezone.localdate()
+        self.client.post(reverse('marketing:editar_promocion', args=[self.promocion.pk]), {
+            'nombre': "Exclusiva", 'tipo': 'PORCENTAJE', 'valor_descuento': 10, 'activa': 'on',
+            'fecha_inicio': hoy, 'fecha_fin': hoy + timedelta(days=5),
+            'productos': [producto.pk],
+            'agregar_clientes': [self.clientes[2].pk],
+            'quitar_clientes': [self.clientes[0].pk],
+        })
+        self.assertEqual(set(self.promocion.clientes_beneficiados.all()), {self.clientes[1], self.clientes[2]})
+        self.assertEqual([p.id for p in promociones_de_linea(producto.id, self.clientes[2].id)], [self.promocion.id])
+        self.assertEqual(promociones_de_linea(producto.id, self.clientes[0].id), [])
+
+
+class BeneficiadosMasivosTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        hoy = timezone.localdate()
+        categoria = Categoria.objects.create(nombre="Helado")
+        cls.producto = Producto.objects.create(nombre="Helado", precio=Decimal('1000'), stock=10, categoria=categoria)
+        cls.clientes = [
+            Cliente.objects.create(user=User.objects.create_user(f'cli{i}', password='x'), rut=f"{i}-K")
+            for i in range(6)
+        ]
+        for i, cliente in enumerate(cls.clientes):
+            for _ in range(i):
+                Venta.objects.create(cliente=cliente, total=Decimal(1000 * i))
+        cls.promocion = Promocion.objects.create(
+            nombre="Segmento", tipo='PORCENTAJE', valor_descuento=10, activa=True,
+            fecha_inicio=hoy, fecha_fin=hoy + timedelta(days=5),
+        )
+
+    def beneficiados(self):
+        return set(self.promocion.clientes_beneficiados.values_list('user__username', flat=True))
+
+    def test_por_regla_en_lotes_y_sin_duplicar(self):
+        from unittest import mock
+        from . import beneficiados
+        with mock.patch.object(beneficiados, 'TAMANO_LOTE', 2), self.captureOnCommitCallbacks(execute=True) as callbacks:
+            resultado = asignar_por_regla(self.promocion, ReglaFidelizacion.COMPRAS_EN_PERIODO, 3, 30)
+        self.assertEqual(len(callbacks), 1)  # invalidación del catálogo
+        self.assertEqual(resultado.asignados, 3)
+        self.assertEqual(self.beneficiados(), {'cli3', 'cli4', 'cli5'})
+        self.assertEqual([p.id for p in promociones_de_linea(self.producto.id, self.clientes[4].id)],
+                         [self.promocion.id])
+
+        resultado = asignar_por_regla(self.promocion, ReglaFidelizacion.MONTO_COMPRA, 2000, 30)
+        self.assertEqual(resultado.asignados, 1)  # cli2; cli3..5 ya estaban
+        self.assertEqual(self.promocion.clientes_beneficiados.count(), 4)
+
+    def test_por_archivo_de_segmento(self):
+        import io
+        archivo = io.BytesIO("usuario\ncli1\n0-K\ndesconocido\ncli1\n".encode())
+        resultado = asignar_segmento(self.promocion, leer_segmento(archivo))
+        self.assertEqual((resultado.asignados, resultado.no_encontrados), (2, 1))
+        self.assertEqual(self.beneficiados(), {'cli0', 'cli1'})
+
+    def test_vista(self):
+        from django.core.files.uploadedfile import SimpleUploadedFile
+        self.client.force_login(User.objects.create_user('staff', password='x', is_staff=True))
+        url = reverse('marketing:asignar_beneficiados', args=[self.promocion.pk])
+        self.assertEqual(self.client.get(url).status_code, 200)
+        respuesta = self.client.post(url, {'modo': 'archivo',
+                                           'archivo': SimpleUploadedFile('segmento.csv', b"rut;\n5-K;\n")})
+        self.assertRedirects(respuesta, reverse('marketing:editar_promocion', args=[self.promocion.pk]))
+        self.assertEqual(self.beneficiados(), {'cli5'})
+        self.assertEqual(self.client.post(url, {'modo': 'regla'}).status_code, 200)
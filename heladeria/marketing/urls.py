@@ -10,6 +10,11 @@ urlpatterns = [
     path('promocion/crear/', views.crear_promocion, name='crear_promocion'),
     path('promocion/editar/<int:pk>/', views.editar_promocion, name='editar_promocion'),
     path('promocion/eliminar/<int:pk>/', views.eliminar_promocion, name='eliminar_promocion'),
+    path('promocion/<int:pk>/beneficiados/', views.asignar_beneficiados, name='asignar_beneficiados'),
+
+    # Autocompletar de los formularios
+    path('autocompletar/productos/', views.autocompletar_productos, name='autocompletar_productos'),
+    path('autocompletar/clientes/', views.autocompletar_clientes, name='autocompletar_clientes'),
 
     # Campañas
     path('campana/crear/', views.crear_campana, name='crear_campana'),
@@ -2,14 +2,21 @@ from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib.auth.decorators import login_required, user_passes_test
 from django.contrib import messages
 from datetime import timedelta
-from django.db.models import Sum, Count, Subquery, OuterRef, Prefetch
+from django.core.cache import cache
+from django.http import JsonResponse
+from django.db.models import F, Sum
 from django.utils import timezone
 
 from clientes.models import Cliente
-from productos.models import Producto, Categoria
-from .models import Promocion, Campana
-from ventas.models import Venta, DetalleVenta
-from .forms import PromocionForm, CampanaForm
+from clientes.views import contexto_reporte_clientes
+from productos.models import Producto
+from productos.catalogo import obtener_snapshot
+from .autocompletar import buscar_clientes, buscar_productos
+from .beneficiados import SegmentoInvalido, asignar_por_regla, asignar_segmento, leer_segmento
+from .campanas import campanas_por_categoria, fragmentos_campanas
+from .models import VIGENTE, Promocion, Campana
+from ventas.models import Venta, ResumenVentaDiaria, ResumenProductoAcumulado
+from .forms import AsignarBeneficiadosForm, PromocionForm, CampanaForm
 
 
 # ------------------------------
@@ -22,44 +29,47 @@ def is_staff_user(user):
 # ------------------------------
 # 📊 DASHBOARD PRINCIPAL DE MARKETING
 # ------------------------------
+DURACION_CONTEOS = 5 * 60  # segundos; clientes y productos cambian poco
+
+
 @login_required
 @user_passes_test(is_staff_user, login_url='/')
 def marketing_dashboard(request):
     hoy = timezone.now().date()
 
-    promociones_vigentes = Promocion.objects.filter(
-        activa=True,
-        fecha_inicio__lte=hoy,
-        fecha_fin__gte=hoy
-    )
+    promociones_vigentes = Promocion.objects.filter(estado=VIGENTE)
 
-    campanas_vigentes = Campana.objects.filter(
-        activa=True,
-        fecha_inicio__lte=hoy,
-        fecha_fin__gte=hoy
-    )
+    campanas_vigentes = Campana.objects.filter(estado=VIGENTE)
+
+    # Totales de ventas desde los resúmenes (ver ventas/resumenes.py), no
+    # desde las tablas de ventas: el costo no crece con el historial.
+    totales = ResumenVentaDiaria.objects.aggregate(ventas=Sum('num_ventas'), monto=Sum('monto'))
+    conteos = cache.get('marketing:dashboard:conteos')
+    if conteos is None:
+        conteos = {'clientes': Cliente.objects.count(), 'productos': Producto.objects.count()}
+        cache.set('marketing:dashboard:conteos', conteos, DURACION_CONTEOS)
 
     resumen = {
-        'total_clientes': Cliente.objects.count(),
-        'total_ventas': Venta.objects.count(),
-        'total_productos': Producto.objects.count(),
+        'total_clientes': conteos['clientes'],
+        'total_ventas': totales['ventas'] or 0,
+        'total_productos': conteos['productos'],
         'promociones_activas': promociones_vigentes.count(),
         'campanas_activas': campanas_vigentes.count(),
-        'ventas_total_monto': Venta.objects.aggregate(total=Sum('total'))['total'] or 0,
+        'ventas_total_monto': totales['monto'] or 0,
     }
 
     ultimas_ventas = (
         Venta.objects
         .select_related('cliente__user')
         .prefetch_related('detalles__producto')
-        .order_by('-fecha_venta')[:5]
+        .order_by('-id')[:5]
     )
 
     productos_mas_vendidos = (
-        DetalleVenta.objects
-        .values('producto__nombre')
-        .annotate(total_vendido=Sum('cantidad'))
-        .order_by('-total_vendido')[:5]
+        ResumenProductoAcumulado.objects
+        .filter(unidades__gt=0)
+        .order_by('-unidades')
+        .values('producto__nombre', total_vendido=F('unidades'))[:5]
     )
 
     productos_por_vencer = (
@@ -101,17 +111,11 @@ def crear_promocion(request):
     else:
         form = PromocionForm()
 
-    hoy = timezone.now().date()
-    promociones_activas = Promocion.objects.filter(
-        activa=True,
-        fecha_inicio__lte=hoy,
-        fecha_fin__gte=hoy
-    )
+    promociones_activas = Promocion.objects.filter(estado=VIGENTE)
 
     return render(request, 'marketing/crear_promocion.html', {
         'form': form,
         'modo': 'Crear',
-        'productos': Producto.objects.all(),
         'promociones_activas': promociones_activas,
     })
 
@@ -141,10 +145,62 @@ def editar_promocion(request, pk):
         'form': form,
         'promocion': promocion,
         'modo': 'Editar',
-        'productos': Producto.objects.all()
+        'num_beneficiados': promocion.clientes_beneficiados.count(),
     })
 
 
+# ------------------------------
+# 👥 ASIGNAR BENEFICIADOS (masivo)
+# ------------------------------
+@login_required
+@user_passes_test(is_staff_user, login_url='/')
+def asignar_beneficiados(request, pk):
+    promocion = get_object_or_404(Promocion, pk=pk)
+    form = AsignarBeneficiadosForm(request.POST or None, request.FILES or None)
+
+    if request.method == 'POST' and form.is_valid():
+        datos = form.cleaned_data
+        try:
+            if datos['modo'] == AsignarBeneficiadosForm.POR_REGLA:
+                resultado = asignar_por_regla(promocion, datos['criterio'], datos['umbral'], datos['dias_periodo'])
+            else:
+                resultado = asignar_segmento(promocion, leer_segmento(datos['archivo'].file))
+        except SegmentoInvalido as e:
+            form.add_error('archivo', str(e))
+        else:
+            messages.success(request, f"👥 {resultado.resumen()}")
+            return redirect('marketing:editar_promocion', pk=promocion.pk)
+
+    return render(request, 'marketing/asignar_beneficiados.html', {
+        'form': form,
+        'promocion': promocion,
+        'num_beneficiados': promocion.clientes_beneficiados.count(),
+    })
+
+
+# ------------------------------
+# 🔎 AUTOCOMPLETAR (JSON para los selectores de los formularios)
+# ------------------------------
+@login_required
+@user_passes_test(is_staff_user, login_url='/')
+def autocompletar_productos(request):
+    resultados, siguiente = buscar_productos(
+        request.GET.get('q', '').strip(), request.GET.get('despues'), request.GET.get('limite'),
+    )
+    return JsonResponse({'resultados': resultados, 'siguiente': siguiente})
+
+
+@login_required
+@user_passes_test(is_staff_user, login_url='/')
+def autocompletar_clientes(request):
+    promocion = request.GET.get('promocion')
+    resultados, siguiente = buscar_clientes(
+        request.GET.get('q', '').strip(), request.GET.get('despues'), request.GET.get('limite'),
+        promocion_id=int(promocion) if promocion and promocion.isdigit() else None,
+    )
+    return JsonResponse({'resultados': resultados, 'siguiente': siguiente})
+
+
 # ------------------------------
 # 🗑️ ELIMINAR PROMOCIÓN
 # ------------------------------
@@ -176,12 +232,7 @@ def crear_campana(request):
     else:
         form = CampanaForm()
 
-    hoy = timezone.now().date()
-    campanas_activas = Campana.objects.filter(
-        activa=True,
-        fecha_inicio__lte=hoy,
-        fecha_fin__gte=hoy
-    )
+    campanas_activas = Campana.objects.filter(estado=VIGENTE)
 
     return render(request, 'marketing/crear_campana.html', {
         'form': form,
@@ -236,60 +287,34 @@ def eliminar_campana(request, pk):
 @login_required
 @user_passes_test(is_staff_user, login_url='/')
 def reporte_clientes(request):
-    ultima_compra_subquery = Venta.objects.filter(
-        cliente=OuterRef('pk')
-    ).order_by('-fecha_venta').values('fecha_venta')[:1]
-
-    datos_clientes = (
-        Cliente.objects
-        .annotate(
-            ultima_compra=Subquery(ultima_compra_subquery),
-            total_ordenes=Count('ventas'),
-            monto_total_gastado=Sum('ventas__total')
-        )
-        .select_related('user')
-        .order_by('-ultima_compra')
-    )
-
-    return render(request, "clientes/reporte_clientes.html", {
-        "datos_clientes": datos_clientes
-    })
+    # Mismo reporte que clientes, ordenado por la compra más reciente
+    context = contexto_reporte_clientes(request, 'reciente')
+    return render(request, "clientes/reporte_clientes.html", context)
 
 
 # ------------------------------
 # 📢 CAMPANAS DISPONIBLES (para vista pública)
 # ------------------------------
 def campanas_disponibles(request):
-    hoy = timezone.now().date()
+    # Campañas agrupadas por categoría y fragmentos HTML cacheados (marketing/campanas.py)
+    snapshot = obtener_snapshot()
+    por_categoria = campanas_por_categoria(snapshot)
+
     categoria_id = request.GET.get("categoria")
+    categorias = {cid: campanas for cid, campanas in por_categoria.items()
+                  if not categoria_id or str(cid) == categoria_id}
 
-    # Todas las categorías (para filtros o menús)
-    categorias = Categoria.objects.all()
-
-    # Campañas vigentes (activas y dentro del rango de fechas)
-    campanas = Campana.objects.filter(
-        activa=True,
-        fecha_inicio__lte=hoy,
-        fecha_fin__gte=hoy
-    ).select_related('categoria')
-
-    # Filtrar por categoría (si el cliente elige una)
-    if categoria_id:
-        campanas = campanas.filter(categoria_id=categoria_id)
-
-    # Asociar los productos disponibles a cada campaña
-    campanas_con_productos = []
-    for campana in campanas:
-        productos = Producto.objects.filter(
-            categoria=campana.categoria,
-            stock__gt=0
-        ).order_by('nombre')
-        if productos.exists():
-            campanas_con_productos.append((campana, productos))
+    paginas = {}
+    for cid in categorias:
+        try:
+            paginas[cid] = max(int(request.GET.get(f"page_{cid}", 1)), 1)
+        except ValueError:
+            paginas[cid] = 1
 
     return render(request, "marketing/campanas.html", {
-        "campanas_con_productos": campanas_con_productos,
-        "categorias": categorias,
+        "fragmentos": fragmentos_campanas(snapshot, categorias, paginas),
+        # Solo las categorías con campañas vigentes, para el filtro
+        "categorias": [(cid, campanas[0].categoria.nombre) for cid, campanas in por_categoria.items()],
         "categoria_id": categoria_id,
     })
 
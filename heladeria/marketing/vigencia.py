@@ -0,0 +1,80 @@
+"""
+Estado de vigencia de promociones y campañas.
+
+``Promocion.estado`` y ``Campana.estado`` guardan ya calculado lo que antes
+se resolvía en cada lectura con ``activa=True, fecha_inicio__lte=hoy,
+fecha_fin__gte=hoy``. Las lecturas pasan a ser ``estado=VIGENTE``, una
+igualdad sobre una columna indexada.
+
+- ``save()`` recalcula el estado de la fila que se guarda.
+- Los cambios de fecha (inicio o fin de un período) los aplica el
+  programador: ``python manage.py programar_vigencias`` (en bucle, o desde
+  cron con ``--una-vez``). Solo mira las filas cuyo período cambió de
+  frontera, así que no recorre el historial completo.
+- Las escrituras masivas que no pasan por ``save()`` (``queryset.update``,
+  cargas de fixtures) llaman a ``sincronizar``.
+
+Cada vez que cambia el conjunto vigente se envía ``vigencia_cambiada``
+(``sender`` = modelo, ``ids`` = filas que cambiaron), después del commit.
+Las cachés que dependen de lo vigente (catálogo, campañas) se invalidan
+desde ahí, justo cuando hace falta.
+"""
+from django.db import transaction
+from django.db.models import Case, CharField, F, Q, Value, When
+from django.dispatch import Signal
+from django.utils import timezone
+
+from .models import FINALIZADA, INACTIVA, PROGRAMADA, VIGENTE, Campana, Promocion
+
+
+MODELOS = (Promocion, Campana)
+
+vigencia_cambiada = Signal()
+
+
+def expresion_estado(hoy):
+    """``estado_vigencia`` como expresión SQL, para recalcular en un UPDATE."""
+    return Case(
+        When(activa=True, fecha_inicio__lte=hoy, fecha_fin__gte=hoy, then=Value(VIGENTE)),
+        When(fecha_fin__lt=hoy, then=Value(FINALIZADA)),
+        When(activa=False, then=Value(INACTIVA)),
+        default=Value(PROGRAMADA),
+        output_field=CharField(),
+    )
+
+
+def _aplicar(modelo, filas, hoy):
+    """Recalcula el estado de ``filas``; devuelve los ids que cambiaron."""
+    expresion = expresion_estado(hoy)
+    with transaction.atomic():
+        ids = list(
+            filas.select_for_update()
+            .annotate(nuevo_estado=expresion)
+            .exclude(estado=F('nuevo_estado'))
+            .values_list('id', flat=True)
+        )
+        if ids:
+            modelo.objects.filter(id__in=ids).update(estado=expresion)
+            transaction.on_commit(lambda: vigencia_cambiada.send(sender=modelo, ids=ids))
+    return ids
+
+
+def en_frontera(modelo, hoy):
+    """Filas cuyo estado pudo cambiar solo por el paso del tiempo."""
+    return modelo.objects.filter(
+        Q(estado=PROGRAMADA, fecha_inicio__lte=hoy)
+        | Q(estado__in=[PROGRAMADA, VIGENTE, INACTIVA], fecha_fin__lt=hoy)
+    )
+
+
+def actualizar_estados(hoy=None):
+    """Pasada del programador. Devuelve ``{modelo: filas cambiadas}``."""
+    hoy = hoy or timezone.localdate()
+    return {modelo: len(_aplicar(modelo, en_frontera(modelo, hoy), hoy)) for modelo in MODELOS}
+
+
+def sincronizar(modelo, ids=None, hoy=None):
+    """Recalcula el estado de ``ids`` (o de todas las filas) tras escrituras sin ``save()``."""
+    hoy = hoy or timezone.localdate()
+    filas = modelo.objects.all() if ids is None else modelo.objects.filter(id__in=ids)
+    return _aplicar(modelo, filas, hoy)
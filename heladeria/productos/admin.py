@@ -1,5 +1,16 @@
-from django.contrib import admin
+from datetime import timedelta
+
+from django.contrib import admin, messages
+from django.core.exceptions import PermissionDenied
+from django.shortcuts import redirect
+from django.template.response import TemplateResponse
+from django.urls import path
+from django.utils import timezone
 from django.utils.html import format_html
+from core.listados import FiltroPorRangos, PaginadorEstimado
+from core.roles import es_solo_marketing
+from .forms import ImportarCatalogoForm
+from .importacion import ArchivoInvalido, importar, leer_filas
 from .models import Categoria, Producto
 
 @admin.register(Categoria)
@@ -19,18 +30,86 @@ class CategoriaAdmin(admin.ModelAdmin):
         return request.user.is_superuser
 
     def has_change_permission(self, request, obj=None):
-        if request.user.groups.filter(name='Marketing').exists() and not request.user.is_superuser:
+        if es_solo_marketing(request.user):
             return False
         return True
 
 
+# Hasta este stock el listado lo marca como bajo
+STOCK_BAJO = 5
+
+
+class FiltroStock(FiltroPorRangos):
+    title = 'stock'
+    parameter_name = 'stock'
+    campo = 'stock'
+    rangos = (
+        ('agotado', 'Agotado', None, 1),
+        ('bajo', f'Bajo (1 a {STOCK_BAJO})', 1, STOCK_BAJO + 1),
+        ('medio', f'Medio ({STOCK_BAJO + 1} a 20)', STOCK_BAJO + 1, 21),
+        ('alto', 'Alto (más de 20)', 21, None),
+    )
+
+
+class FiltroVencimiento(FiltroPorRangos):
+    title = 'vencimiento'
+    parameter_name = 'vence'
+    campo = 'fecha_vencimiento'
+
+    def get_rangos(self):
+        hoy = timezone.localdate()
+        return (
+            ('vencido', 'Vencido', None, hoy),
+            ('semana', 'En 7 días o menos', hoy, hoy + timedelta(days=8)),
+            ('mes', 'En 8 a 30 días', hoy + timedelta(days=8), hoy + timedelta(days=31)),
+            ('despues', 'En más de 30 días', hoy + timedelta(days=31), None),
+        )
+
+
 @admin.register(Producto)
 class ProductoAdmin(admin.ModelAdmin):
-    list_display = ('nombre', 'categoria', 'precio', 'stock', 'stock_alert', 'fecha_vencimiento_format', 'es_por_vencer')
-    list_filter = ('categoria', 'stock')
-    search_fields = ('nombre', 'descripcion')
-    date_hierarchy = 'fecha_vencimiento'
+    list_display = ('nombre', 'codigo', 'categoria', 'precio', 'stock', 'stock_alert', 'fecha_vencimiento_format', 'es_por_vencer')
+    list_select_related = ('categoria',)
+    # Rangos fijos: ni DISTINCT sobre el stock ni fechas del date_hierarchy
+    list_filter = ('categoria', FiltroStock, FiltroVencimiento)
+    search_fields = ('nombre', 'codigo', 'descripcion')
     ordering = ('categoria__nombre', 'nombre')
+    paginator = PaginadorEstimado
+    show_full_result_count = False
+    change_list_template = 'admin/productos/producto/change_list.html'
+    # Errores de filas que se muestran tras una importación (el resto se cuenta)
+    errores_visibles = 20
+
+    def get_urls(self):
+        return [
+            path('importar/', self.admin_site.admin_view(self.importar_view), name='productos_producto_importar'),
+        ] + super().get_urls()
+
+    def importar_view(self, request):
+        """Carga masiva de productos desde CSV/XLSX (inserta o actualiza por código)."""
+        if not self.has_add_permission(request):
+            raise PermissionDenied
+        form = ImportarCatalogoForm(request.POST or None, request.FILES or None)
+        if request.method == 'POST' and form.is_valid():
+            archivo = form.cleaned_data['archivo']
+            try:
+                resultado = importar(leer_filas(archivo.file, archivo.name))
+            except ArchivoInvalido as e:
+                form.add_error('archivo', str(e))
+            else:
+                messages.success(request, resultado.resumen())
+                for numero, mensaje in resultado.errores[:self.errores_visibles]:
+                    messages.warning(request, f"Fila {numero}: {mensaje}")
+                if len(resultado.errores) > self.errores_visibles:
+                    messages.warning(request, f"... y {len(resultado.errores) - self.errores_visibles} error(es) más.")
+                return redirect('admin:productos_producto_changelist')
+
+        return TemplateResponse(request, 'admin/productos/producto/importar.html', {
+            **self.admin_site.each_context(request),
+            'opts': self.model._meta,
+            'title': "Importar catálogo",
+            'form': form,
+        })
 
     def get_readonly_fields(self, request, obj=None):
         if request.user.is_superuser:
@@ -39,7 +118,7 @@ class ProductoAdmin(admin.ModelAdmin):
         return ('nombre', 'categoria', 'precio', 'stock', 'fecha_vencimiento')
 
     def stock_alert(self, obj):
-        if obj.stock <= 5:
+        if obj.stock <= STOCK_BAJO:
             return format_html('<span style="color: red; font-weight: bold;">{} (Bajo)</span>', obj.stock)
         return obj.stock
     stock_alert.short_description = 'Stock'
@@ -61,6 +140,6 @@ class ProductoAdmin(admin.ModelAdmin):
         return request.user.is_superuser
 
     def has_change_permission(self, request, obj=None):
-        if request.user.groups.filter(name='Marketing').exists() and not request.user.is_superuser:
+        if es_solo_marketing(request.user):
             return False
         return True
@@ -3,3 +3,6 @@ from django.apps import AppConfig
 class ProductosConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'productos'
+
+    def ready(self):
+        import productos.signals  # invalida el snapshot del catálogo
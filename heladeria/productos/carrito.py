@@ -0,0 +1,73 @@
+"""
+Carrito de compras en tablas propias (``Carrito`` / ``ItemCarrito``).
+
+El carrito ya no se serializa en la sesión: cada operación toca solo la
+línea afectada (``INSERT`` ignorando duplicados + ``UPDATE`` con ``F()``),
+así que agregar o quitar un producto no reescribe nada más y la sesión solo
+se guarda cuando cambia de verdad (login, mensajes).
+
+La clave del carrito es el id del usuario, por eso ninguna operación
+necesita buscarlo antes. El número de líneas que muestra el menú se guarda
+en la caché por usuario y se borra al confirmar cada cambio.
+"""
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F
+
+from .models import Carrito, ItemCarrito
+
+
+DURACION_LINEAS = 60 * 60
+
+
+def _clave_lineas(usuario_id):
+    return f'carrito:lineas:{usuario_id}'
+
+
+def _carrito_cambio(usuario_id):
+    transaction.on_commit(lambda: cache.delete(_clave_lineas(usuario_id)))
+
+
+def agregar(usuario, producto_id, cantidad):
+    """Suma ``cantidad`` unidades de ``producto_id`` al carrito de ``usuario``."""
+    with transaction.atomic():
+        Carrito.objects.bulk_create([Carrito(usuario_id=usuario.pk)], ignore_conflicts=True)
+        ItemCarrito.objects.bulk_create(
+            [ItemCarrito(carrito_id=usuario.pk, producto_id=producto_id, cantidad=0)], ignore_conflicts=True
+        )
+        ItemCarrito.objects.filter(carrito_id=usuario.pk, producto_id=producto_id).update(
+            cantidad=F('cantidad') + cantidad
+        )
+        _carrito_cambio(usuario.pk)
+
+
+def quitar(usuario, producto_id):
+    """Quita la línea de ``producto_id``. Devuelve True si estaba en el carrito."""
+    borradas, _ = ItemCarrito.objects.filter(carrito_id=usuario.pk, producto_id=producto_id).delete()
+    if borradas:
+        _carrito_cambio(usuario.pk)
+    return bool(borradas)
+
+
+def vaciar(usuario):
+    ItemCarrito.objects.filter(carrito_id=usuario.pk).delete()
+    _carrito_cambio(usuario.pk)
+
+
+def cantidades(usuario):
+    """``{producto_id: cantidad}`` del carrito de ``usuario``."""
+    return dict(
+        ItemCarrito.objects.filter(carrito_id=usuario.pk).order_by('id').values_list('producto_id', 'cantidad')
+    )
+
+
+def numero_lineas(usuario):
+    """Líneas del carrito (para el menú); sin consultas si está en la caché."""
+    if not usuario.is_authenticated:
+        return 0
+    clave = _clave_lineas(usuario.pk)
+    lineas = cache.get(clave)
+    if lineas is None:
+        lineas = ItemCarrito.objects.filter(carrito_id=usuario.pk).count()
+        cache.set(clave, lineas, DURACION_LINEAS)
+    return lineas
@@ -0,0 +1,210 @@
+"""
+Catálogo de la tienda: snapshot versionado y paginación por categoría.
+
+``producto_listado`` no carga el catálogo completo en cada visita:
+
+- El snapshot guarda solo lo pequeño y compartido por todas las vistas
+  (categorías con stock y el motor de precios compilado). Vive en memoria
+  del proceso y, detrás, en la caché compartida (``CACHES['default']``).
+- Los productos se piden a la base de datos ya paginados: una sola consulta
+  con ``ROW_NUMBER() OVER (PARTITION BY categoria)`` devuelve únicamente la
+  página visible de cada categoría. El resultado también se cachea por
+  versión, así que una visita repetida no consulta la base de datos.
+
+Cualquier escritura sobre ``Producto``, ``Categoria`` o ``Promocion`` llama a
+``invalidar_catalogo()``, que incrementa la versión (``core/versiones.py``);
+las entradas viejas dejan de usarse y expiran solas. Las ventas solo
+invalidan cuando un producto se agota o vuelve a tener stock
+(``invalidar_si_cruza_stock``). Por eso el listado solo dice si un
+producto está disponible, sin mostrar cantidades ni limitar el formulario
+con el stock del snapshot: la reserva del carrito valida contra el stock
+libre real (``stock - reservado``).
+"""
+import hashlib
+from dataclasses import dataclass
+from datetime import date
+
+from django.core.cache import cache
+from django.core.paginator import Page, Paginator
+from django.db import transaction
+from django.db.models import Count, F, Q, Window
+from django.db.models.functions import RowNumber
+from django.utils import timezone
+
+from core.versiones import incrementar, version
+from marketing.models import Promocion
+from marketing.precios import MotorPrecios
+from .models import Categoria, Producto
+
+
+CLAVE_VERSION = 'catalogo:version'
+DURACION_SNAPSHOT = 60 * 60  # 1 hora; la versión manda, esto solo limpia
+
+# Copia local del último snapshot leído por este proceso
+_local = {}
+
+
+@dataclass
+class SnapshotCatalogo:
+    version: int
+    fecha: date
+    categorias: dict                     # nombre → id, solo categorías con stock
+    motor: MotorPrecios
+
+    def clave(self, *partes):
+        return ':'.join(['catalogo', str(self.version), str(self.fecha), *map(str, partes)])
+
+    def motor_para_cliente(self, cliente):
+        """Motor con las promociones asignadas al cliente (cacheadas por versión)."""
+        motor = self.motor.copia()
+        if cliente is None:
+            return motor
+        clave = self.clave('cliente', cliente.pk)
+        asignadas = cache.get(clave)
+        if asignadas is None:
+            motor.cargar_clientes([cliente])
+            cache.set(clave, motor.beneficiadas[cliente.pk], DURACION_SNAPSHOT)
+        else:
+            motor.beneficiadas[cliente.pk] = asignadas
+        return motor
+
+
+def version_catalogo():
+    return version(CLAVE_VERSION)
+
+
+def invalidar_catalogo(**kwargs):
+    """Incrementa la versión del catálogo. Sirve también como receptor de señales."""
+    incrementar(CLAVE_VERSION)
+
+
+def invalidar_si_cruza_stock(movimientos):
+    """
+    Tras descontar ``movimientos`` (producto_id → unidades descontadas;
+    negativas si vuelven al stock), invalida el catálogo al confirmar solo si
+    algún producto se agotó o volvió a tener stock. Una consulta.
+    """
+    cruces = Q()
+    for producto_id, cantidad in movimientos.items():
+        if cantidad > 0:
+            cruces |= Q(pk=producto_id, stock=0)
+        elif cantidad < 0:
+            cruces |= Q(pk=producto_id, stock=-cantidad)
+    if cruces and Producto.objects.filter(cruces).exists():
+        transaction.on_commit(invalidar_catalogo)
+
+
+def construir_snapshot(version, hoy):
+    categorias = dict(
+        Categoria.objects.filter(productos__stock__gt=0)
+        .distinct()
+        .order_by('nombre')
+        .values_list('nombre', 'id')
+    )
+    return SnapshotCatalogo(
+        version=version,
+        fecha=hoy,
+        categorias=categorias,
+        motor=MotorPrecios.cargar(hoy=hoy),
+    )
+
+
+def obtener_snapshot():
+    """
+    Snapshot vigente: primero la copia local, luego la caché compartida y,
+    si no existe en ninguna, se construye y se publica.
+    """
+    version = version_catalogo()
+    hoy = timezone.localdate()
+
+    snapshot = _local.get('snapshot')
+    if snapshot and snapshot.version == version and snapshot.fecha == hoy:
+        return snapshot
+
+    clave = f'catalogo:{version}:{hoy}:snapshot'
+    snapshot = cache.get(clave)
+    if snapshot is None:
+        snapshot = construir_snapshot(version, hoy)
+        cache.set(clave, snapshot, DURACION_SNAPSHOT)
+
+    _local['snapshot'] = snapshot
+    return snapshot
+
+
+# --------------------------------------------------------------------------
+# Paginación por categoría en la base de datos
+# --------------------------------------------------------------------------
+
+def _consultar_ventanas(base, paginas, per_page, orden):
+    """
+    Una consulta: numera los productos dentro de su categoría y se queda
+    solo con las filas de la página pedida en cada una.
+    """
+    consulta = base.annotate(
+        fila=Window(RowNumber(), partition_by=[F('categoria_id')], order_by=[orden, F('id').asc()]),
+        total_categoria=Window(Count('id'), partition_by=[F('categoria_id')]),
+    )
+    ventana = Q(fila__lte=per_page) & ~Q(categoria_id__in=list(paginas))
+    for categoria_id, numero in paginas.items():
+        desde = (numero - 1) * per_page
+        ventana |= Q(categoria_id=categoria_id, fila__gt=desde, fila__lte=desde + per_page)
+
+    filas = {}
+    for producto in consulta.filter(ventana).select_related('categoria').order_by('categoria__nombre', 'fila'):
+        filas.setdefault(producto.categoria_id, []).append(producto)
+    return filas
+
+
+def paginas_por_categoria(snapshot, paginas_pedidas, per_page, orden='nombre',
+                          descendente=False, categorias=None, promociones=None):
+    """
+    Devuelve ``{nombre_categoria: Page}`` con solo la página visible de cada categoría.
+
+    - ``paginas_pedidas``: nombre de categoría → número de página (por defecto 1).
+    - ``categorias``: nombres a mostrar (``None`` = todas).
+    - ``promociones``: ids de promociones cuyos productos se quieren ver
+      (``None`` = sin filtro por promoción).
+    """
+    ids_categoria = snapshot.categorias
+    if categorias is not None:
+        ids_categoria = {n: i for n, i in ids_categoria.items() if n in categorias}
+    paginas = {
+        ids_categoria[nombre]: numero
+        for nombre, numero in paginas_pedidas.items()
+        if nombre in ids_categoria and numero > 1
+    }
+
+    parametros = (sorted(ids_categoria.values()), sorted(paginas.items()), per_page,
+                  orden, descendente, sorted(promociones) if promociones is not None else None)
+    clave = snapshot.clave('paginas', hashlib.md5(repr(parametros).encode()).hexdigest())
+    resultado = cache.get(clave)
+
+    if resultado is None:
+        base = Producto.objects.filter(stock__gt=0, categoria_id__in=ids_categoria.values())
+        if promociones is not None:
+            base = base.filter(id__in=Promocion.productos.through.objects.filter(
+                promocion_id__in=promociones
+            ).values('producto_id'))
+        expresion = F(orden).desc() if descendente else F(orden).asc()
+
+        filas = _consultar_ventanas(base, paginas, per_page, expresion)
+        # Páginas fuera de rango: se vuelve a la primera página de esas categorías
+        fuera_de_rango = [cid for cid in paginas if cid not in filas]
+        if fuera_de_rango:
+            filas.update(_consultar_ventanas(
+                base.filter(categoria_id__in=fuera_de_rango), {}, per_page, expresion
+            ))
+            for cid in fuera_de_rango:
+                paginas.pop(cid)
+
+        resultado = [
+            (productos[0].categoria.nombre, paginas.get(cid, 1), productos[0].total_categoria, productos)
+            for cid, productos in filas.items()
+        ]
+        resultado.sort(key=lambda r: r[0])
+        cache.set(clave, resultado, DURACION_SNAPSHOT)
+
+    return {
+        nombre: Page(productos, numero, Paginator(range(total), per_page))
+        for nombre, numero, total, productos in resultado
+    }
@@ -25,3 +25,11 @@ class AgregarAlCarritoForm(forms.Form):
         required=False,
         widget=forms.HiddenInput()
     )
+
+
+class ImportarCatalogoForm(forms.Form):
+    """Archivo CSV o XLSX para la importación masiva (ver productos/importacion.py)."""
+    archivo = forms.FileField(
+        help_text="Columnas: codigo, nombre, categoria, precio y opcionalmente stock, "
+                  "fecha_vencimiento, descripcion."
+    )
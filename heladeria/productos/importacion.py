@@ -0,0 +1,288 @@
+"""
+Importación masiva del catálogo (productos, precios y stock) desde CSV o XLSX.
+
+El archivo se lee en streaming (``csv`` o ``openpyxl`` en modo solo lectura)
+y se procesa por lotes de ``TAMANO_LOTE`` filas:
+
+1. cada fila se valida por separado; las inválidas se reportan con su
+   número de fila y el resto del lote sigue;
+2. las categorías se resuelven con un mapa nombre → id en memoria; las que
+   no existen se crean en un solo ``bulk_create`` por lote;
+3. los productos se insertan o actualizan por ``codigo`` con
+   ``bulk_create(update_conflicts=True)``: una sentencia por lote. Si la
+   base rechaza la sentencia (``IntegrityError``/``DataError``: un valor
+   fuera de rango, una restricción), ese lote se reintenta fila por fila,
+   cada una en su savepoint, y solo las filas rechazadas se reportan.
+
+Solo se actualizan las columnas presentes en el archivo: un archivo con
+``codigo`` y ``precio`` cambia precios sin tocar el stock. Cada lote va en
+su propia transacción; si falla por otro motivo (conexión, bloqueos), el
+lote completo se reporta y se continúa con el siguiente.
+
+Lo usan el comando ``python manage.py importar_catalogo`` y la carga de
+archivos del admin de productos.
+"""
+import csv
+import io
+from dataclasses import dataclass, field
+from datetime import date, datetime
+from decimal import Decimal, InvalidOperation
+from pathlib import Path
+
+from django.db import DataError, DatabaseError, IntegrityError, connection, transaction
+
+from .catalogo import invalidar_catalogo
+from .models import Categoria, Producto
+
+
+TAMANO_LOTE = 2000
+
+OBLIGATORIAS = ('codigo', 'nombre', 'categoria', 'precio')
+OPCIONALES = ('stock', 'fecha_vencimiento', 'descripcion')
+FORMATOS_FECHA = ('%Y-%m-%d', '%d/%m/%Y', '%d-%m-%Y')
+
+_LARGO_CODIGO = Producto._meta.get_field('codigo').max_length
+_LARGO_NOMBRE = Producto._meta.get_field('nombre').max_length
+_LARGO_CATEGORIA = Categoria._meta.get_field('nombre').max_length
+
+
+class ArchivoInvalido(Exception):
+    """El archivo no se puede leer o le faltan columnas obligatorias."""
+
+
+@dataclass
+class ResultadoImportacion:
+    filas: int = 0
+    guardadas: int = 0
+    categorias_creadas: int = 0
+    errores: list = field(default_factory=list)  # [(numero_fila, mensaje)]
+
+    def resumen(self):
+        return (f"{self.filas} fila(s) leídas, {self.guardadas} producto(s) guardados, "
+                f"{self.categorias_creadas} categoría(s) nuevas, {len(self.errores)} error(es).")
+
+
+# --------------------------------------------------------------------------
+# Lectura
+# --------------------------------------------------------------------------
+
+def _normalizar_encabezados(encabezados):
+    columnas = [str(c or '').strip().lower() for c in encabezados]
+    faltantes = [c for c in OBLIGATORIAS if c not in columnas]
+    if faltantes:
+        raise ArchivoInvalido(f"Faltan columnas obligatorias: {', '.join(faltantes)}.")
+    return columnas
+
+
+def _filas_csv(archivo):
+    texto = io.TextIOWrapper(archivo, encoding='utf-8-sig', newline='')
+    muestra = texto.read(4096)
+    texto.seek(0)
+    try:
+        dialecto = csv.Sniffer().sniff(muestra, delimiters=',;\t')
+    except csv.Error:
+        dialecto = csv.excel
+    lector = csv.reader(texto, dialecto)
+    columnas = _normalizar_encabezados(next(lector, []))
+    for numero, valores in enumerate(lector, start=2):
+        if any(valores):
+            yield numero, dict(zip(columnas, valores))
+
+
+def _filas_xlsx(archivo):
+    from openpyxl import load_workbook
+
+    libro = load_workbook(archivo, read_only=True, data_only=True)
+    try:
+        filas = libro.worksheets[0].iter_rows(values_only=True)
+        columnas = _normalizar_encabezados(next(filas, ()))
+        for numero, valores in enumerate(filas, start=2):
+            if any(v not in (None, '') for v in valores):
+                yield numero, dict(zip(columnas, valores))
+    finally:
+        libro.close()
+
+
+def leer_filas(archivo, nombre):
+    """
+    ``(numero_fila, {columna: valor})`` de un archivo binario abierto.
+    El formato se decide por la extensión de ``nombre``.
+    """
+    extension = Path(nombre).suffix.lower()
+    if extension == '.csv':
+        return _filas_csv(archivo)
+    if extension in ('.xlsx', '.xlsm'):
+        return _filas_xlsx(archivo)
+    raise ArchivoInvalido("Formato no soportado: use un archivo .csv o .xlsx.")
+
+
+# --------------------------------------------------------------------------
+# Validación
+# --------------------------------------------------------------------------
+
+def _texto(valor):
+    return '' if valor is None else str(valor).strip()
+
+
+def _fecha(valor):
+    if isinstance(valor, datetime):
+        return valor.date()
+    if isinstance(valor, date):
+        return valor
+    valor = str(valor).strip()
+    for formato in FORMATOS_FECHA:
+        try:
+            return datetime.strptime(valor, formato).date()
+        except ValueError:
+            continue
+    raise ValueError(f"fecha de vencimiento inválida: {valor!r}")
+
+
+def validar_fila(fila):
+    """Valores limpios de la fila, o ``ValueError`` con el motivo."""
+    datos = {'codigo': _texto(fila.get('codigo')), 'nombre': _texto(fila.get('nombre')),
+             'categoria': _texto(fila.get('categoria'))}
+    for columna, largo in (('codigo', _LARGO_CODIGO), ('nombre', _LARGO_NOMBRE),
+                           ('categoria', _LARGO_CATEGORIA)):
+        if not datos[columna]:
+            raise ValueError(f"{columna} vacío")
+        if len(datos[columna]) > largo:
+            raise ValueError(f"{columna} supera los {largo} caracteres")
+
+    try:
+        datos['precio'] = Decimal(_texto(fila.get('precio')).replace(',', '.')).quantize(Decimal('0.01'))
+    except InvalidOperation:
+        raise ValueError(f"precio inválido: {fila.get('precio')!r}")
+    if datos['precio'] <= 0:
+        raise ValueError("el precio debe ser mayor a cero")
+
+    if 'stock' in fila:
+        try:
+            stock = Decimal(_texto(fila['stock']) or '0')
+            if stock != stock.to_integral_value():
+                raise InvalidOperation
+        except InvalidOperation:
+            raise ValueError(f"stock inválido: {fila['stock']!r}")
+        datos['stock'] = int(stock)
+        if datos['stock'] < 0:
+            raise ValueError("el stock no puede ser negativo")
+
+    if 'fecha_vencimiento' in fila:
+        valor = fila['fecha_vencimiento']
+        datos['fecha_vencimiento'] = _fecha(valor) if _texto(valor) else None
+
+    if 'descripcion' in fila:
+        datos['descripcion'] = _texto(fila['descripcion']) or None
+    return datos
+
+
+# --------------------------------------------------------------------------
+# Importación
+# --------------------------------------------------------------------------
+
+def _lotes(filas, tamano):
+    lote = []
+    for fila in filas:
+        lote.append(fila)
+        if len(lote) >= tamano:
+            yield lote
+            lote = []
+    if lote:
+        yield lote
+
+
+def _preparar_lote(validas, categorias, crear_categorias, resultado):
+    """Productos del lote listos para el upsert y cuántas categorías se crearon."""
+    nuevas = {datos['categoria'] for _, datos in validas} - categorias.keys()
+    creadas = {}
+    if nuevas and crear_categorias:
+        Categoria.objects.bulk_create([Categoria(nombre=nombre) for nombre in nuevas], ignore_conflicts=True)
+        creadas = dict(Categoria.objects.filter(nombre__in=nuevas).values_list('nombre', 'id'))
+        categorias.update(creadas)
+
+    # Si un código se repite en el lote, gana la última fila
+    productos = {}
+    for numero, datos in validas:
+        categoria_id = categorias.get(datos['categoria'])
+        if categoria_id is None:
+            resultado.errores.append((numero, f"la categoría {datos['categoria']!r} no existe"))
+            continue
+        campos = {k: v for k, v in datos.items() if k != 'categoria'}
+        productos[datos['codigo']] = (numero, Producto(categoria_id=categoria_id, **campos))
+    return list(productos.values()), len(creadas)
+
+
+def _upsert(productos, update_fields):
+    Producto.objects.bulk_create(
+        productos,
+        update_conflicts=True,
+        # MySQL no acepta el destino del conflicto (ON DUPLICATE KEY
+        # UPDATE): lo resuelve el índice único de ``codigo``
+        unique_fields=['codigo'] if connection.features.supports_update_conflicts_with_target else None,
+        update_fields=update_fields,
+    )
+
+
+def _guardar_lote(productos, update_fields, resultado):
+    """
+    Upsert de ``productos`` (``[(numero_fila, Producto)]``) en una sentencia;
+    si la base la rechaza, fila por fila. Devuelve cuántos se guardaron.
+    """
+    try:
+        with transaction.atomic():
+            _upsert([producto for _, producto in productos], update_fields)
+        return len(productos)
+    except (IntegrityError, DataError):
+        pass
+
+    guardados = 0
+    for numero, producto in productos:
+        try:
+            with transaction.atomic():
+                _upsert([producto], update_fields)
+        except (IntegrityError, DataError) as e:
+            resultado.errores.append((numero, f"rechazada por la base de datos: {e}"))
+        else:
+            guardados += 1
+    return guardados
+
+
+def importar(filas, tamano_lote=TAMANO_LOTE, crear_categorias=True):
+    """
+    Inserta o actualiza productos desde ``filas`` (de ``leer_filas``).
+    Devuelve un ``ResultadoImportacion``; nunca se detiene por una fila mala.
+    """
+    resultado = ResultadoImportacion()
+    categorias = dict(Categoria.objects.values_list('nombre', 'id'))
+    columnas_actualizables = None
+
+    for lote in _lotes(filas, tamano_lote):
+        validas = []
+        for numero, fila in lote:
+            resultado.filas += 1
+            if columnas_actualizables is None:
+                columnas_actualizables = (['nombre', 'categoria', 'precio']
+                                          + [c for c in OPCIONALES if c in fila])
+            try:
+                validas.append((numero, validar_fila(fila)))
+            except ValueError as e:
+                resultado.errores.append((numero, str(e)))
+
+        if not validas:
+            continue
+        try:
+            with transaction.atomic():
+                productos, creadas = _preparar_lote(validas, categorias, crear_categorias, resultado)
+                guardados = _guardar_lote(productos, columnas_actualizables, resultado)
+        except DatabaseError as e:
+            resultado.errores.append((validas[0][0], f"lote de {len(validas)} fila(s) rechazado: {e}"))
+            # Las categorías creadas en el lote revertido ya no existen
+            categorias = dict(Categoria.objects.values_list('nombre', 'id'))
+            continue
+        resultado.guardadas += guardados
+        resultado.categorias_creadas += creadas
+
+    if resultado.guardadas:
+        # bulk_create no dispara señales
+        invalidar_catalogo()
+    return resultado
@@ -0,0 +1,35 @@
+# Generated by Django 5.2.7 on 2026-10-18 15:21
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('productos', '0002_reservas_stock'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Carrito',
+            fields=[
+                ('usuario', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='carrito', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('creado', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ItemCarrito',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('cantidad', models.PositiveIntegerField(default=0)),
+                ('carrito', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='items', to='productos.carrito')),
+                ('producto', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='productos.producto')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('carrito', 'producto'), name='item_carrito_producto')],
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.7 on 2026-10-18 15:26
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('productos', '0003_carrito'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='producto',
+            name='codigo',
+            field=models.CharField(blank=True, max_length=40, null=True, unique=True),
+        ),
+    ]
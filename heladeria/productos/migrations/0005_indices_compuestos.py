@@ -0,0 +1,21 @@
+# Generated by Django 5.2.7 on 2026-10-18 15:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('productos', '0004_producto_codigo'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='producto',
+            index=models.Index(fields=['categoria', 'nombre', 'stock'], name='producto_cat_nombre_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='producto',
+            index=models.Index(fields=['fecha_vencimiento', 'stock'], name='producto_vencimiento_idx'),
+        ),
+    ]
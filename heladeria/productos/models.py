@@ -1,3 +1,4 @@
+from django.conf import settings
 from django.db import models
 from django.utils import timezone
 from datetime import timedelta
@@ -10,13 +11,28 @@ class Categoria(models.Model):
         return self.nombre
 
 class Producto(models.Model):
+    # Código del proveedor: clave de la importación masiva (productos/importacion.py)
+    codigo = models.CharField(max_length=40, unique=True, null=True, blank=True)
     nombre = models.CharField(max_length=100)
     descripcion = models.TextField(blank=True, null=True)
     precio = models.DecimalField(max_digits=10, decimal_places=2)
     stock = models.PositiveIntegerField(default=0)
+    # Unidades apartadas por carritos activos (ver productos/reservas.py)
+    reservado = models.PositiveIntegerField(default=0)
     fecha_vencimiento = models.DateField(blank=True, null=True)
     categoria = models.ForeignKey(Categoria, on_delete=models.CASCADE, related_name="productos")
 
+    class Meta:
+        indexes = [
+            # Catálogo: categoría + orden por nombre; el stock va en el índice
+            # para descartar los agotados sin leer la fila
+            models.Index(fields=['categoria', 'nombre', 'stock'], name='producto_cat_nombre_idx'),
+            # Productos por vencer (dashboard de marketing)
+            models.Index(fields=['fecha_vencimiento', 'stock'], name='producto_vencimiento_idx'),
+            # Búsqueda por prefijo de los selectores de marketing
+            models.Index(fields=['nombre', 'id'], name='producto_nombre_idx'),
+        ]
+
     def __str__(self):
         return self.nombre
 
@@ -28,8 +44,51 @@ class Producto(models.Model):
             raise ValidationError({'precio': "El precio debe ser mayor a cero."})
         super().clean()
 
+    @property
+    def disponible(self):
+        return max(self.stock - self.reservado, 0)
+
     @property
     def esta_por_vencer(self):
         if self.fecha_vencimiento:
             return (self.fecha_vencimiento - timezone.now().date()) <= timedelta(days=7)
-        return False
\ No newline at end of file
+        return False
+
+class Reserva(models.Model):
+    """Unidades de un producto apartadas por el carrito de un usuario hasta ``expira``."""
+    usuario = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="reservas")
+    producto = models.ForeignKey(Producto, on_delete=models.CASCADE, related_name="reservas")
+    cantidad = models.PositiveIntegerField(default=0)
+    expira = models.DateTimeField(db_index=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['usuario', 'producto'], name='reserva_usuario_producto'),
+        ]
+
+    def __str__(self):
+        return f"{self.cantidad} x {self.producto_id} para {self.usuario_id}"
+
+
+class Carrito(models.Model):
+    """Carrito de un usuario; sus líneas viven en ``ItemCarrito`` (ver productos/carrito.py)."""
+    usuario = models.OneToOneField(settings.AUTH_USER_MODEL, on_delete=models.CASCADE,
+                                   primary_key=True, related_name="carrito")
+    creado = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"Carrito de {self.usuario}"
+
+
+class ItemCarrito(models.Model):
+    carrito = models.ForeignKey(Carrito, on_delete=models.CASCADE, related_name="items")
+    producto = models.ForeignKey(Producto, on_delete=models.CASCADE, related_name="+")
+    cantidad = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['carrito', 'producto'], name='item_carrito_producto'),
+        ]
+
+    def __str__(self):
+        return f"{self.cantidad} x {self.producto_id}"
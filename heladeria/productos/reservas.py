@@ -0,0 +1,124 @@
+"""
+Reservas de stock del carrito.
+
+Agregar un producto al carrito aparta las unidades con un único ``UPDATE``
+condicional sobre la fila del producto::
+
+    UPDATE producto SET reservado = reservado + n
+    WHERE id = ... AND stock >= reservado + n
+
+Si no quedan unidades libres el ``UPDATE`` no toca ninguna fila y la
+reserva se rechaza; no hay lectura previa del stock ni ``SELECT ... FOR
+UPDATE``, así que el bloqueo de la fila dura lo que dura la sentencia y su
+transacción corta.
+
+- ``reservar()`` / ``liberar()``: los usan las vistas del carrito.
+- ``ventas.checkout.registrar_venta`` convierte las reservas del usuario en
+  venta (descuenta ``stock`` y ``reservado`` en la misma sentencia).
+- ``liberar_vencidas()``: devuelve al stock libre las reservas expiradas
+  (comando ``python manage.py liberar_reservas``).
+
+Orden de bloqueo en todos los caminos: primero las filas de ``Reserva`` y
+después las de ``Producto``, para no generar interbloqueos.
+"""
+from collections import Counter
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, F, PositiveIntegerField, When
+from django.utils import timezone
+
+from .models import Producto, Reserva
+
+
+TAMANO_LOTE = 1000
+
+
+class SinStockDisponible(Exception):
+    """No quedan unidades libres (stock menos reservado) del producto."""
+
+
+def duracion_reserva():
+    return timedelta(minutes=getattr(settings, 'RESERVA_MINUTOS', 15))
+
+
+def _restar_reservado(cantidades):
+    """Descuenta ``{producto_id: cantidad}`` de ``reservado`` en un solo UPDATE."""
+    if not cantidades:
+        return
+    Producto.objects.filter(id__in=cantidades).update(
+        reservado=Case(
+            *[When(id=pid, reservado__gte=cantidad, then=F('reservado') - cantidad)
+              for pid, cantidad in cantidades.items()],
+            default=0,
+            output_field=PositiveIntegerField(),
+        )
+    )
+
+
+def reservar(usuario, producto_id, cantidad):
+    """
+    Aparta ``cantidad`` unidades más de ``producto_id`` para ``usuario`` y
+    renueva el vencimiento de todas sus reservas (el carrito sigue activo).
+
+    Lanza ``SinStockDisponible`` si no quedan unidades libres.
+    """
+    expira = timezone.now() + duracion_reserva()
+    with transaction.atomic():
+        Reserva.objects.bulk_create(
+            [Reserva(usuario=usuario, producto_id=producto_id, cantidad=0, expira=expira)],
+            ignore_conflicts=True,
+        )
+        sumadas = Reserva.objects.filter(usuario=usuario, producto_id=producto_id).update(
+            cantidad=F('cantidad') + cantidad
+        )
+        if not sumadas:
+            # El barrido la borró entre ambas sentencias
+            Reserva.objects.create(usuario=usuario, producto_id=producto_id, cantidad=cantidad, expira=expira)
+        Reserva.objects.filter(usuario=usuario).update(expira=expira)
+
+        apartados = Producto.objects.filter(
+            id=producto_id, stock__gte=F('reservado') + cantidad,
+        ).update(reservado=F('reservado') + cantidad)
+        if not apartados:
+            # Revierte también el cambio en la reserva
+            raise SinStockDisponible("No quedan unidades disponibles de este producto.")
+
+
+def liberar(usuario, producto_ids=None):
+    """Suelta las reservas de ``usuario`` (todas, o las de ``producto_ids``)."""
+    with transaction.atomic():
+        reservas = Reserva.objects.select_for_update().filter(usuario=usuario)
+        if producto_ids is not None:
+            reservas = reservas.filter(producto_id__in=producto_ids)
+        filas = list(reservas.order_by('producto_id').values_list('id', 'producto_id', 'cantidad'))
+        if not filas:
+            return
+        Reserva.objects.filter(id__in=[fila[0] for fila in filas]).delete()
+        _restar_reservado({producto_id: cantidad for _, producto_id, cantidad in filas})
+
+
+def liberar_vencidas(tamano=TAMANO_LOTE, ahora=None):
+    """
+    Libera hasta ``tamano`` reservas expiradas. Devuelve cuántas liberó.
+    Seguro con varios procesos en paralelo y con checkouts en curso: las
+    reservas que otro está usando quedan para la siguiente pasada.
+    """
+    ahora = ahora or timezone.now()
+    with transaction.atomic():
+        filas = list(
+            Reserva.objects
+            .select_for_update(skip_locked=True)
+            .filter(expira__lt=ahora)
+            .order_by('id')
+            .values_list('id', 'producto_id', 'cantidad')[:tamano]
+        )
+        if not filas:
+            return 0
+        cantidades = Counter()
+        for _, producto_id, cantidad in filas:
+            cantidades[producto_id] += cantidad
+        Reserva.objects.filter(id__in=[fila[0] for fila in filas]).delete()
+        _restar_reservado(cantidades)
+    return len(filas)
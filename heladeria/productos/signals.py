@@ -0,0 +1,26 @@
+# productos/signals.py
+from django.db.models.signals import post_save, post_delete, m2m_changed
+from django.dispatch import receiver
+
+from marketing.models import Campana, Promocion
+from marketing.vigencia import vigencia_cambiada
+from .catalogo import invalidar_catalogo
+from .models import Categoria, Producto
+
+
+# Cualquier cambio en productos, categorías, promociones o campañas deja
+# obsoleto el catálogo (y la vitrina de campañas, marketing/campanas.py)
+for modelo in (Producto, Categoria, Promocion, Campana):
+    post_save.connect(invalidar_catalogo, sender=modelo, dispatch_uid=f'catalogo_save_{modelo.__name__}')
+    post_delete.connect(invalidar_catalogo, sender=modelo, dispatch_uid=f'catalogo_delete_{modelo.__name__}')
+
+# Una promoción o campaña que empieza o termina por fecha (ver marketing/vigencia.py)
+for modelo in (Promocion, Campana):
+    vigencia_cambiada.connect(invalidar_catalogo, sender=modelo, dispatch_uid=f'catalogo_vigencia_{modelo.__name__}')
+
+
+@receiver(m2m_changed, sender=Promocion.productos.through)
+@receiver(m2m_changed, sender=Promocion.clientes_beneficiados.through)
+def invalidar_por_relaciones(sender, action, **kwargs):
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        invalidar_catalogo()
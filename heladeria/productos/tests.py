@@ -1,3 +1,269 @@
+import io
+from datetime import date, timedelta
+from decimal import Decimal
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import DataError, connection, transaction
+from django.db.models import F
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from clientes.models import Cliente
+from ventas.checkout import StockInsuficiente, registrar_venta
+from . import carrito
+from .models import Categoria, Producto, Reserva
+from .importacion import importar, leer_filas
+from .reservas import SinStockDisponible, liberar, liberar_vencidas, reservar
+
+
+class ProductoListadoTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.categoria = Categoria.objects.create(nombre="Helado")
+        for i in range(12):
+            Producto.objects.create(nombre=f"Helado {i:02d}", precio=Decimal('1000') + i, stock=5, categoria=cls.categoria)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_snapshot_en_cache_no_consulta(self):
+        url = reverse('productos:producto_listado')
+        self.client.get(url)
+        # Otro orden: el snapshot sigue en caché, solo falta la consulta paginada
+        with self.assertNumQueries(1):
+            self.client.get(url, {'orden': 'precio', 'dir': 'desc'})
+        with self.assertNumQueries(0):
+            respuesta = self.client.get(url, {'orden': 'precio', 'dir': 'desc'})
+        pagina = dict(respuesta.context['categorias'])["Helado"]
+        self.assertEqual(pagina[0].nombre, "Helado 11")
+
+    def test_escritura_invalida_el_snapshot(self):
+        url = reverse('productos:producto_listado')
+        self.client.get(url)
+        Producto.objects.create(nombre="Helado Nuevo", precio=Decimal('1'), stock=1, categoria=self.categoria)
+        respuesta = self.client.get(url, {'orden': 'precio'})
+        pagina = dict(respuesta.context['categorias'])["Helado"]
+        self.assertEqual(pagina[0].nombre, "Helado Nuevo")
+
+    def test_ventas_solo_invalidan_al_agotar(self):
+        from .catalogo import version_catalogo
+        cliente = Cliente.objects.create(user=User.objects.create_user('comprador', password='x'))
+        producto = Producto.objects.get(nombre="Helado 00")
+        version = version_catalogo()
+        with self.captureOnCommitCallbacks(execute=True), transaction.atomic():
+            registrar_venta(cliente, {producto.id: 2})
+        self.assertEqual(version_catalogo(), version)
+        with self.captureOnCommitCallbacks(execute=True), transaction.atomic():
+            registrar_venta(cliente, {producto.id: 3})
+        self.assertNotEqual(version_catalogo(), version)
+
+    def test_listado_no_muestra_stock_del_snapshot(self):
+        # El snapshot no se invalida con cada venta: no debe mostrar cantidades
+        usuario = User.objects.create_user('visitante', password='x')
+        Cliente.objects.create(user=usuario)
+        self.client.force_login(usuario)
+        html = self.client.get(reverse('productos:producto_listado')).content.decode()
+        self.assertIn('name="cantidad"', html)
+        self.assertIn('(Disponible)', html)
+        self.assertNotIn('Stock:', html)
+        self.assertNotIn('max="', html)
+
+    def test_pagina_por_categoria_en_base_de_datos(self):
+        url = reverse('productos:producto_listado')
+        respuesta = self.client.get(url, {'per_page': 5, 'page_Helado': 3})
+        pagina = dict(respuesta.context['categorias'])["Helado"]
+        self.assertEqual(pagina.number, 3)
+        self.assertEqual(pagina.paginator.num_pages, 3)
+        self.assertEqual([p.nombre for p in pagina], ["Helado 10", "Helado 11"])
+
+
+class ReservasTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        categoria = Categoria.objects.create(nombre="Helado")
+        cls.producto = Producto.objects.create(nombre="Chocolate", precio=Decimal('1000'), stock=5, categoria=categoria)
+        cls.cliente = Cliente.objects.create(user=User.objects.create_user('ana', password='x'))
+        cls.otro = Cliente.objects.create(user=User.objects.create_user('beto', password='x'))
+
+    def _producto(self):
+        self.producto.refresh_from_db()
+        return self.producto
+
+    def test_no_reserva_mas_que_el_stock_libre(self):
+        reservar(self.cliente.user, self.producto.id, 3)
+        with self.assertRaises(SinStockDisponible):
+            reservar(self.otro.user, self.producto.id, 3)
+        reservar(self.otro.user, self.producto.id, 2)
+        self.assertEqual(self._producto().reservado, 5)
+        self.assertFalse(Reserva.objects.filter(usuario=self.otro.user, cantidad=3).exists())
+
+    def test_checkout_convierte_la_reserva(self):
+        reservar(self.cliente.user, self.producto.id, 2)
+        reservar(self.otro.user, self.producto.id, 3)
+        with transaction.atomic():
+            registrar_venta(self.cliente, {self.producto.id: 2})
+        producto = self._producto()
+        self.assertEqual((producto.stock, producto.reservado), (3, 3))
+        self.assertFalse(Reserva.objects.filter(usuario=self.cliente.user).exists())
+        # Las unidades que quedan están reservadas por el otro carrito
+        with self.assertRaises(StockInsuficiente):
+            with transaction.atomic():
+                registrar_venta(self.cliente, {self.producto.id: 1})
+
+    def test_reserva_liberada_durante_el_checkout(self):
+        reservar(self.cliente.user, self.producto.id, 2)
+
+        def liberada_por_otro(venta):
+            # El barrido descuenta lo apartado entre la lectura y el UPDATE
+            Producto.objects.filter(pk=self.producto.pk).update(reservado=F('reservado') - 2)
+
+        with mock.patch('ventas.checkout.registrar_compra', side_effect=liberada_por_otro):
+            with self.assertRaises(StockInsuficiente), transaction.atomic():
+                registrar_venta(self.cliente, {self.producto.id: 2})
+        producto = self._producto()
+        self.assertEqual((producto.stock, producto.reservado), (5, 2))
+
+    def test_barrido_y_liberar_devuelven_el_stock(self):
+        reservar(self.cliente.user, self.producto.id, 2)
+        reservar(self.otro.user, self.producto.id, 1)
+        self.assertEqual(liberar_vencidas(), 0)
+        self.assertEqual(liberar_vencidas(ahora=timezone.now() + timedelta(days=1)), 2)
+        self.assertEqual(self._producto().reservado, 0)
+
+        reservar(self.cliente.user, self.producto.id, 4)
+        liberar(self.cliente.user, [self.producto.id])
+        self.assertEqual(self._producto().reservado, 0)
+
+    def test_vistas_del_carrito_reservan_y_liberan(self):
+        self.client.force_login(self.cliente.user)
+        self.client.post(reverse('productos:agregar_a_carrito', args=[self.producto.id]), {'cantidad': 4})
+        self.client.post(reverse('productos:agregar_a_carrito', args=[self.producto.id]), {'cantidad': 2})
+        self.assertEqual(self._producto().reservado, 4)
+        self.assertEqual(carrito.cantidades(self.cliente.user), {self.producto.id: 4})
+
+        self.client.get(reverse('productos:quitar_de_carrito', args=[self.producto.id]))
+        self.assertEqual(self._producto().reservado, 0)
+
+
+class CarritoTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        categoria = Categoria.objects.create(nombre="Helado")
+        cls.productos = [
+            Producto.objects.create(nombre=f"Helado {i}", precio=Decimal('1000'), stock=10, categoria=categoria)
+            for i in range(3)
+        ]
+        cls.cliente = Cliente.objects.create(user=User.objects.create_user('ana', password='x'))
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.cliente.user)
+
+    def test_agregar_no_reescribe_la_sesion(self):
+        url = reverse('productos:agregar_a_carrito', args=[self.productos[0].id])
+        self.client.post(url, {'cantidad': 1})
+        clave_sesion = self.client.session.session_key
+        with CaptureQueriesContext(connection) as consultas:
+            self.client.post(url, {'cantidad': 2})
+            self.client.get(reverse('productos:ver_carrito'))
+        self.assertFalse([q for q in consultas if 'django_session' in q['sql'] and 'UPDATE' in q['sql']])
+        self.assertEqual(self.client.session.session_key, clave_sesion)
+        self.assertEqual(carrito.cantidades(self.cliente.user), {self.productos[0].id: 3})
+
+    def test_checkout_vacia_el_carrito(self):
+        for producto in self.productos[:2]:
+            self.client.post(reverse('productos:agregar_a_carrito', args=[producto.id]), {'cantidad': 2})
+        self.assertEqual(carrito.numero_lineas(self.cliente.user), 2)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.get(reverse('productos:finalizar_orden'))
+        self.assertEqual(carrito.cantidades(self.cliente.user), {})
+        self.assertEqual(carrito.numero_lineas(self.cliente.user), 0)
+        self.productos[0].refresh_from_db()
+        self.assertEqual((self.productos[0].stock, self.productos[0].reservado), (8, 0))
+
+
+class ImportacionCatalogoTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.categoria = Categoria.objects.create(nombre="Helado")
+        Producto.objects.create(codigo="H-1", nombre="Vainilla", precio=Decimal('900'), stock=7, categoria=cls.categoria)
+
+    def _importar(self, contenido, **kwargs):
+        return importar(leer_filas(io.BytesIO(contenido.encode()), 'catalogo.csv'), **kwargs)
+
+    def test_inserta_actualiza_y_reporta_errores(self):
+        resultado = self._importar(
+            "codigo;nombre;categoria;precio;stock;fecha_vencimiento\n"
+            "H-1;Vainilla;Helado;1000,50;10;31/12/2030\n"
+            "T-1;Torta;Tortas;5000;3;\n"
+            "T-2;Sin precio;Tortas;;3;\n"
+            "T-3;Negativo;Tortas;100;-1;\n",
+            tamano_lote=2,
+        )
+        self.assertEqual(resultado.guardadas, 2)
+        self.assertEqual(resultado.categorias_creadas, 1)
+        self.assertEqual([numero for numero, _ in resultado.errores], [4, 5])
+
+        vainilla = Producto.objects.get(codigo="H-1")
+        self.assertEqual((vainilla.precio, vainilla.stock), (Decimal('1000.50'), 10))
+        self.assertEqual(vainilla.fecha_vencimiento, date(2030, 12, 31))
+        self.assertEqual(Producto.objects.get(codigo="T-1").categoria.nombre, "Tortas")
+
+    def test_solo_actualiza_las_columnas_del_archivo(self):
+        self._importar("codigo,nombre,categoria,precio\nH-1,Vainilla,Helado,1200\n")
+        vainilla = Producto.objects.get(codigo="H-1")
+        self.assertEqual((vainilla.precio, vainilla.stock), (Decimal('1200.00'), 7))
+
+    def test_consultas_por_lote_no_por_fila(self):
+        filas = "".join(f"N-{i},Nuevo {i},Helado,100,1\n" for i in range(300))
+        with CaptureQueriesContext(connection) as consultas:
+            resultado = self._importar("codigo,nombre,categoria,precio,stock\n" + filas, tamano_lote=1000)
+        self.assertEqual(resultado.guardadas, 300)
+        self.assertLess(len(consultas), 10)
+
+    def test_motor_sin_destino_de_conflicto(self):
+        # Como MySQL: ON DUPLICATE KEY UPDATE no acepta unique_fields. SQLite sin
+        # destino no sabe actualizar, así que aquí solo se prueban códigos nuevos
+        with mock.patch.object(connection.features, 'supports_update_conflicts_with_target', False):
+            resultado = self._importar("codigo,nombre,categoria,precio\nH-2,Frutilla,Helado,800\n")
+        self.assertEqual((resultado.guardadas, resultado.errores), (1, []))
+        self.assertEqual(Producto.objects.get(codigo="H-2").nombre, "Frutilla")
+
+    def test_lote_rechazado_por_la_base_se_reintenta_por_fila(self):
+        bulk_create = Producto.objects.bulk_create
+
+        def rechazar_t2(productos, **kwargs):
+            # Como MySQL estricto con un valor fuera de rango
+            if any(p.codigo == "T-2" for p in productos):
+                raise DataError("Out of range value for column 'precio'")
+            return bulk_create(productos, **kwargs)
+
+        with mock.patch.object(Producto.objects, 'bulk_create', side_effect=rechazar_t2):
+            resultado = self._importar(
+                "codigo,nombre,categoria,precio\n"
+                "H-1,Vainilla,Helado,1100\n"
+                "T-2,Torta,Helado,99999999999\n"
+                "T-3,Tiramisú,Helado,4000\n"
+            )
+        self.assertEqual(resultado.guardadas, 2)
+        self.assertEqual([numero for numero, _ in resultado.errores], [3])
+        self.assertEqual(Producto.objects.get(codigo="H-1").precio, Decimal('1100.00'))
+        self.assertTrue(Producto.objects.filter(codigo="T-3").exists())
+        self.assertFalse(Producto.objects.filter(codigo="T-2").exists())
 
-# Create your tests here.
+    def test_carga_desde_el_admin(self):
+        admin = User.objects.create_superuser('admin', password='x')
+        self.client.force_login(admin)
+        archivo = SimpleUploadedFile('catalogo.csv', b"codigo,nombre,categoria,precio\nH-2,Frutilla,Helado,800\n")
+        respuesta = self.client.post(reverse('admin:productos_producto_importar'), {'archivo': archivo})
+        self.assertRedirects(respuesta, reverse('admin:productos_producto_changelist'))
+        self.assertTrue(Producto.objects.filter(codigo="H-2", nombre="Frutilla").exists())
@@ -2,24 +2,32 @@ from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required, user_passes_test
 from django.contrib import messages
 from django.db import transaction
-from django.core.paginator import Paginator
-from datetime import date
 from decimal import Decimal
-from django.db.models import Q
 
-from marketing.models import Promocion
+from marketing.precios import motor_para
+from . import carrito
+from .catalogo import obtener_snapshot, paginas_por_categoria
 from .models import Producto
+from .reservas import SinStockDisponible, liberar, reservar
 from clientes.models import Cliente
-from ventas.models import Venta, DetalleVenta
+from ventas.checkout import registrar_venta
 
 
 # --------------------------------------------------------------------------
 # -------------------------- LISTADO DE PRODUCTOS --------------------------
 # --------------------------------------------------------------------------
 
-def producto_listado(request):
-    hoy = date.today()
+CAMPOS_ORDEN = ('nombre', 'precio', 'stock')
+
+
+def _cliente_de(user):
+    """Cliente asociado al usuario, o None (anónimos, staff sin perfil)."""
+    if not user.is_authenticated:
+        return None
+    return getattr(user, 'cliente', None)
 
+
+def producto_listado(request):
     # --- PARÁMETROS DE FILTRO Y ORDEN ---
     orden = request.GET.get('orden', '')
     dir = request.GET.get('dir', 'asc')
@@ -28,84 +36,58 @@ def producto_listado(request):
 
     # --- GUARDAR SELECCIÓN DEL PAGINADOR EN SESIÓN ---
     per_page = request.GET.get('per_page')
-    if per_page:
+    # Solo si cambia: asignar marca la sesión como modificada y la reescribe
+    if per_page and request.session.get('per_page') != per_page:
         request.session['per_page'] = per_page
     per_page = int(request.session.get('per_page', 6))
 
-    # --- BASE QUERY ---
-    productos = Producto.objects.filter(stock__gt=0).select_related('categoria')
+    # --- SNAPSHOT DEL CATÁLOGO (0 consultas si está en caché) ---
+    snapshot = obtener_snapshot()
+    cliente = _cliente_de(request.user)
+    motor = snapshot.motor_para_cliente(cliente)
+    request._motor_precios = motor
 
     # --- FILTRO POR CATEGORÍA ---
+    nombres_categorias = None
     if categorias_param:
-        nombres_categorias = [c.strip() for c in categorias_param.split(',') if c.strip()]
-        if nombres_categorias:
-            productos = productos.filter(categoria__nombre__in=nombres_categorias)
-
-    # --- PROMOCIONES ACTIVAS ---
-    promociones_activas = Promocion.objects.filter(
-        activa=True, fecha_inicio__lte=hoy, fecha_fin__gte=hoy
-    ).prefetch_related('productos')
-
-    promociones_por_producto = {}
-    precios_con_descuento = {}
-
-    for promo in promociones_activas:
-        productos_aplicables = promo.productos.all() if promo.productos.exists() else productos
-        for p in productos_aplicables:
-            promociones_por_producto.setdefault(p.id, []).append({
-                "nombre": promo.nombre,
-                "descuento": promo.valor_descuento,
-                "tipo": promo.tipo
-            })
+        nombres_categorias = {c.strip() for c in categorias_param.split(',') if c.strip()} or None
 
     # --- FILTRO: SOLO PRODUCTOS CON PROMOCIONES ---
-    if solo_promos:
-        productos = productos.filter(id__in=promociones_por_producto.keys())
+    promociones = None
+    if solo_promos and not motor.elegibles(motor.globales, cliente):
+        promociones = [r.id for r in motor.elegibles(motor.con_productos.values(), cliente)]
 
     # --- ORDENAMIENTO ASC/DESC ---
-    if orden:
-        if dir == 'desc':
-            productos = productos.order_by(f'-{orden}')
-        else:
-            productos = productos.order_by(orden)
-    else:
-        productos = productos.order_by('nombre')
-
-    # --- CALCULAR PRECIO FINAL ---
-    for p in productos:
-        precio_final = Decimal(p.precio)
-        if p.id in promociones_por_producto:
-            for promo in promociones_por_producto[p.id]:
-                valor_desc = Decimal(promo["descuento"] or 0)
-                if promo["tipo"] == "PORCENTAJE":
-                    precio_final *= (Decimal("1.0") - valor_desc / Decimal("100"))
-                elif promo["tipo"] == "VALOR_FIJO":
-                    precio_final -= valor_desc
-            precio_final = max(precio_final, Decimal("0"))
-        precios_con_descuento[p.id] = {
-            "precio_unitario": precio_final,
-            "precio_original": Decimal(p.precio),
-        }
-
-    # --- AGRUPAR Y PAGINAR POR CATEGORÍA ---
-    categorias_dict = {}
-    for producto in productos:
-        cat = producto.categoria.nombre if producto.categoria else "Sin categoría"
-        categorias_dict.setdefault(cat, []).append(producto)
-
-    categorias_paginadas = {}
-    for nombre, lista in categorias_dict.items():
-        paginator = Paginator(lista, per_page)
-        page_number = request.GET.get(f"page_{nombre}", 1)
-        categorias_paginadas[nombre] = paginator.get_page(page_number)
+    campo = orden.lstrip('-')
+    if campo not in CAMPOS_ORDEN:
+        campo = 'nombre'
+    descendente = orden.startswith('-') != (dir == 'desc')
+
+    # --- PAGINAR POR CATEGORÍA EN LA BASE DE DATOS (solo la página visible) ---
+    paginas_pedidas = {}
+    for nombre in snapshot.categorias:
+        try:
+            paginas_pedidas[nombre] = max(int(request.GET.get(f"page_{nombre}", 1)), 1)
+        except ValueError:
+            paginas_pedidas[nombre] = 1
+
+    categorias_paginadas = paginas_por_categoria(
+        snapshot, paginas_pedidas, per_page,
+        orden=campo, descendente=descendente,
+        categorias=nombres_categorias, promociones=promociones,
+    )
+
+    # --- PRECIO FINAL Y PROMOCIONES (solo productos visibles) ---
+    visibles = [p for pagina in categorias_paginadas.values() for p in pagina]
+    precios_con_descuento = {}
+    promociones_por_producto = {}
+    for linea in motor.precios((p, 1, cliente) for p in visibles):
+        precios_con_descuento[linea.producto.id] = linea
+        if linea.promociones:
+            promociones_por_producto[linea.producto.id] = linea.promociones
 
     # --- CATEGORÍAS DISPONIBLES PARA EL SELECT ---
-    categorias_disponibles = (
-        Producto.objects.filter(stock__gt=0, categoria__isnull=False)
-        .values_list("categoria__nombre", flat=True)
-        .distinct()
-        .order_by("categoria__nombre")
-    )
+    categorias_disponibles = list(snapshot.categorias)
 
     return render(request, "productos/listado.html", {
         "categorias": categorias_paginadas.items(),
@@ -135,21 +117,14 @@ def agregar_a_carrito(request, producto_id):
             messages.error(request, "Cantidad inválida")
             return redirect('productos:producto_listado')
 
-        carrito = request.session.get('carrito', {})
-        pid = str(producto_id)
-
-        if pid in carrito:
-            carrito[pid]['cantidad'] += cantidad
-        else:
-            carrito[pid] = {
-                'id': producto.id,
-                'nombre': producto.nombre,
-                'precio': str(producto.precio),
-                'cantidad': cantidad
-            }
-
-        request.session['carrito'] = carrito
-        request.session.modified = True
+        try:
+            with transaction.atomic():
+                reservar(request.user, producto.id, cantidad)
+                carrito.agregar(request.user, producto.id, cantidad)
+        except SinStockDisponible:
+            messages.error(request, f"No quedan unidades disponibles de {producto.nombre}.")
+            return redirect(request.META.get('HTTP_REFERER', 'productos:producto_listado'))
+
         messages.success(request, f"{producto.nombre} añadido al pedido.")
     return redirect(request.META.get('HTTP_REFERER', 'productos:producto_listado'))
 
@@ -157,56 +132,28 @@ def agregar_a_carrito(request, producto_id):
 @login_required
 @user_passes_test(lambda u: u.is_authenticated and not u.is_staff, login_url='/admin/')
 def ver_carrito(request):
-    carrito = request.session.get('carrito', {})
     productos_en_carrito = []
     total_general = Decimal('0')
-    hoy = date.today()
+    cliente = _cliente_de(request.user)
 
-    for id_str, item in list(carrito.items()):
-        try:
-            producto = Producto.objects.get(id=int(id_str))
-            precio_unitario = Decimal(producto.precio)
-            precio_original = Decimal(producto.precio)
-            cantidad = item['cantidad']
-
-            promociones = Promocion.objects.filter(
-                activa=True, productos=producto,
-                fecha_inicio__lte=hoy, fecha_fin__gte=hoy
-            )
-
-            subtotal = Decimal('0')
-            if promociones.exists():
-                aplicado_2x1 = False
-                for promo in promociones:
-                    if promo.tipo == '2X1':
-                        pares = cantidad // 2
-                        subtotal = precio_unitario * (cantidad - pares)
-                        aplicado_2x1 = True
-                        break
-                    if promo.valor_descuento is not None:
-                        valor_desc = Decimal(promo.valor_descuento)
-                        if promo.tipo == 'PORCENTAJE':
-                            precio_unitario *= (Decimal('1.0') - valor_desc / Decimal('100'))
-                        elif promo.tipo == 'VALOR_FIJO':
-                            precio_unitario -= valor_desc
-                if not aplicado_2x1:
-                    precio_unitario = max(precio_unitario, Decimal('0'))
-                    subtotal = precio_unitario * cantidad
-            else:
-                subtotal = precio_unitario * cantidad
-
-            total_general += subtotal
-            productos_en_carrito.append({
-                'id': producto.id,
-                'nombre': producto.nombre,
-                'cantidad': cantidad,
-                'precio_original': precio_original,
-                'precio_unitario': precio_unitario,
-                'subtotal': subtotal
-            })
-        except Producto.DoesNotExist:
-            del carrito[id_str]
-            request.session.modified = True
+    # Las líneas de productos borrados se van en cascada con el producto
+    cantidades = carrito.cantidades(request.user)
+    productos = Producto.objects.in_bulk(list(cantidades))
+
+    lineas = motor_para(request).precios(
+        (productos[producto_id], cantidad, cliente)
+        for producto_id, cantidad in cantidades.items()
+    )
+    for linea in lineas:
+        total_general += linea.subtotal
+        productos_en_carrito.append({
+            'id': linea.producto.id,
+            'nombre': linea.producto.nombre,
+            'cantidad': linea.cantidad,
+            'precio_original': linea.precio_original,
+            'precio_unitario': linea.precio_unitario,
+            'subtotal': linea.subtotal
+        })
 
     return render(request, 'productos/carrito.html', {
         'productos': productos_en_carrito,
@@ -217,87 +164,32 @@ def ver_carrito(request):
 @login_required
 @user_passes_test(lambda u: u.is_authenticated and not u.is_staff, login_url='/admin/')
 def quitar_de_carrito(request, producto_id):
-    carrito = request.session.get('carrito', {})
-    pid = str(producto_id)
-    if pid in carrito:
-        del carrito[pid]
-        request.session['carrito'] = carrito
-        request.session.modified = True
-        messages.info(request, "Producto eliminado del pedido.")
+    with transaction.atomic():
+        if carrito.quitar(request.user, producto_id):
+            liberar(request.user, [producto_id])
+            messages.info(request, "Producto eliminado del pedido.")
     return redirect('productos:ver_carrito')
 
 
 @login_required
 @user_passes_test(lambda u: u.is_authenticated and not u.is_staff, login_url='/admin/')
 def finalizar_orden(request):
-    carrito = request.session.get('carrito', {})
-    if not carrito:
+    cantidades = carrito.cantidades(request.user)
+    if not cantidades:
         messages.error(request, "El carrito está vacío.")
         return redirect('productos:producto_listado')
 
+    cliente = get_object_or_404(Cliente, user=request.user)
+    motor = motor_para(request)
+    motor.cargar_clientes([cliente])
+
     try:
         with transaction.atomic():
-            cliente = get_object_or_404(Cliente, user=request.user)
-            venta = Venta.objects.create(cliente=cliente)
-            total_venta = Decimal('0')
-            hoy = date.today()
-
-            for id_str, item in carrito.items():
-                producto = get_object_or_404(Producto, id=int(id_str))
-                cantidad = item['cantidad']
-
-                if producto.stock < cantidad:
-                    raise Exception(f"Stock insuficiente para {producto.nombre}.")
-
-                promociones = Promocion.objects.filter(
-                    activa=True, productos=producto,
-                    fecha_inicio__lte=hoy, fecha_fin__gte=hoy
-                )
-
-                precio_unitario = Decimal(producto.precio)
-                subtotal = Decimal('0')
-
-                if promociones.exists():
-                    aplicado_2x1 = False
-                    for promo in promociones:
-                        if promo.tipo == '2X1':
-                            pares = cantidad // 2
-                            subtotal = precio_unitario * (cantidad - pares)
-                            aplicado_2x1 = True
-                            break
-                        if promo.valor_descuento is not None:
-                            valor_desc = Decimal(promo.valor_descuento)
-                            if promo.tipo == 'PORCENTAJE':
-                                precio_unitario *= (Decimal('1.0') - valor_desc / Decimal('100'))
-                            elif promo.tipo == 'VALOR_FIJO':
-                                precio_unitario -= valor_desc
-                    if not aplicado_2x1:
-                        precio_unitario = max(precio_unitario, Decimal('0'))
-                        subtotal = precio_unitario * cantidad
-                else:
-                    subtotal = precio_unitario * cantidad
-
-                total_venta += subtotal
-
-                DetalleVenta.objects.create(
-                    venta=venta, producto=producto,
-                    cantidad=cantidad,
-                    precio_unitario=precio_unitario,
-                    subtotal=subtotal
-                )
-
-                producto.stock -= cantidad
-                producto.save()
-
-            venta.total = total_venta
-            venta.save()
-
-            del request.session['carrito']
-            request.session.modified = True
-
-            messages.success(request, f"Pedido #{venta.id} completado con éxito.")
-            return redirect('ventas:historial_pedidos')
-
+            venta = registrar_venta(cliente, cantidades, motor)
+            carrito.vaciar(request.user)
     except Exception as e:
         messages.error(request, f"Error: {str(e)}")
         return redirect('productos:ver_carrito')
+
+    messages.success(request, f"Pedido #{venta.id} completado con éxito.")
+    return redirect('ventas:historial_pedidos')
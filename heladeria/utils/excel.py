@@ -1,33 +1,158 @@
-import openpyxl
-from django.http import HttpResponse
-from datetime import datetime
-
-
-def exportar_a_excel(queryset, campos, encabezados, nombre_archivo="reporte.xlsx"):
-    wb = openpyxl.Workbook()
-    ws = wb.active
-    ws.title = "Datos"
-
-    ws.append(encabezados)
-
-    for obj in queryset:
-        fila = []
-        for campo in campos:
-            valor = obj
-            for attr in campo.split('.'):
-                valor = getattr(valor, attr, None)
-                if callable(valor):
-                    valor = valor()
-                if valor is None:
-                    break
-            if isinstance(valor, datetime):
-                valor = valor.strftime("%d/%m/%Y %H:%M")
-            fila.append(valor if valor is not None else "N/A")
-        ws.append(fila)
-
-    response = HttpResponse(
-        content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+"""
+Escritura de XLSX en streaming.
+
+``generar_xlsx`` produce el archivo fila por fila, en bloques de bytes:
+nunca se arma el libro completo en memoria, así que el consumo es constante
+aunque se exporten cientos de miles de filas. Los bloques van:
+
+- a un archivo, en la cola de exportaciones (core/exportaciones.py);
+- directo al navegador con ``respuesta_xlsx`` (``StreamingHttpResponse``),
+  para descargas que no necesitan pasar por la cola.
+
+Las filas deben venir de ``.iterator(chunk_size=TAMANO_LOTE)`` para que
+tampoco el queryset quede cacheado entero.
+"""
+import re
+import zipfile
+from decimal import Decimal
+from xml.sax.saxutils import escape
+
+from django.http import StreamingHttpResponse
+
+
+CONTENT_TYPE_XLSX = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+TAMANO_LOTE = 2000
+
+# Caracteres de control que no son válidos en XML
+_INVALIDOS_XML = re.compile('[\x00-\x08\x0b\x0c\x0e-\x1f]')
+
+_CONTENT_TYPES = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+    '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+    '<Default Extension="xml" ContentType="application/xml"/>'
+    '<Override PartName="/xl/workbook.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+    '<Override PartName="/xl/worksheets/sheet1.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+    '<Override PartName="/xl/styles.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.styles+xml"/>'
+    '</Types>'
+)
+_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" '
+    'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" '
+    'Target="xl/workbook.xml"/>'
+    '</Relationships>'
+)
+_WORKBOOK = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+    'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+    '<sheets><sheet name="{titulo}" sheetId="1" r:id="rId1"/></sheets>'
+    '</workbook>'
+)
+_WORKBOOK_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" '
+    'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" '
+    'Target="worksheets/sheet1.xml"/>'
+    '<Relationship Id="rId2" '
+    'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/styles" '
+    'Target="styles.xml"/>'
+    '</Relationships>'
+)
+# Estilo 0: normal. Estilo 1: negrita (encabezados).
+_STYLES = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<styleSheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+    '<fonts count="2"><font><sz val="11"/><name val="Calibri"/></font>'
+    '<font><b/><sz val="11"/><name val="Calibri"/></font></fonts>'
+    '<fills count="2"><fill><patternFill patternType="none"/></fill>'
+    '<fill><patternFill patternType="gray125"/></fill></fills>'
+    '<borders count="1"><border><left/><right/><top/><bottom/><diagonal/></border></borders>'
+    '<cellStyleXfs count="1"><xf numFmtId="0" fontId="0" fillId="0" borderId="0"/></cellStyleXfs>'
+    '<cellXfs count="2"><xf numFmtId="0" fontId="0" fillId="0" borderId="0" xfId="0"/>'
+    '<xf numFmtId="0" fontId="1" fillId="0" borderId="0" xfId="0" applyFont="1"/></cellXfs>'
+    '<cellStyles count="1"><cellStyle name="Normal" xfId="0" builtinId="0"/></cellStyles>'
+    '</styleSheet>'
+)
+
+
+class _Salida:
+    """Destino de ``zipfile`` sin ``seek``: acumula bytes hasta que se vacían."""
+
+    def __init__(self):
+        self.partes = []
+        self.posicion = 0
+
+    def write(self, datos):
+        self.partes.append(bytes(datos))
+        self.posicion += len(datos)
+        return len(datos)
+
+    def tell(self):
+        return self.posicion
+
+    def flush(self):
+        pass
+
+    def vaciar(self):
+        datos = b''.join(self.partes)
+        self.partes = []
+        return datos
+
+
+def _celda(valor, estilo=0):
+    atributo_estilo = f' s="{estilo}"' if estilo else ''
+    if isinstance(valor, bool):
+        return f'<c t="b"{atributo_estilo}><v>{int(valor)}</v></c>'
+    if isinstance(valor, (int, float, Decimal)):
+        return f'<c{atributo_estilo}><v>{valor}</v></c>'
+    texto = escape(_INVALIDOS_XML.sub('', str(valor)))
+    return f'<c t="inlineStr"{atributo_estilo}><is><t xml:space="preserve">{texto}</t></is></c>'
+
+
+def _fila(valores, estilo=0):
+    return ('<row>' + ''.join(_celda(v, estilo) for v in valores) + '</row>').encode('utf-8')
+
+
+def generar_xlsx(encabezados, filas, titulo="Datos", filas_por_bloque=500):
+    """
+    Generador de bytes de un XLSX con una hoja: encabezados en negrita y
+    luego ``filas`` (iterable de secuencias ya formateadas).
+    """
+    salida = _Salida()
+    with zipfile.ZipFile(salida, 'w', compression=zipfile.ZIP_DEFLATED) as zf:
+        zf.writestr('[Content_Types].xml', _CONTENT_TYPES)
+        zf.writestr('_rels/.rels', _RELS)
+        zf.writestr('xl/workbook.xml', _WORKBOOK.format(titulo=escape(titulo[:31])))
+        zf.writestr('xl/_rels/workbook.xml.rels', _WORKBOOK_RELS)
+        zf.writestr('xl/styles.xml', _STYLES)
+
+        with zf.open('xl/worksheets/sheet1.xml', 'w', force_zip64=True) as hoja:
+            hoja.write(
+                b'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+                b'<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+                b'<sheetData>'
+            )
+            hoja.write(_fila(encabezados, estilo=1))
+            for numero, fila in enumerate(filas, 1):
+                hoja.write(_fila(fila))
+                if numero % filas_por_bloque == 0:
+                    yield salida.vaciar()
+            hoja.write(b'</sheetData></worksheet>')
+    yield salida.vaciar()
+
+
+def respuesta_xlsx(encabezados, filas, nombre_archivo="reporte.xlsx", titulo="Datos"):
+    """``StreamingHttpResponse`` que descarga el XLSX a medida que se genera."""
+    response = StreamingHttpResponse(
+        generar_xlsx(encabezados, filas, titulo=titulo),
+        content_type=CONTENT_TYPE_XLSX,
     )
-    response['Content-Disposition'] = f'attachment; filename={nombre_archivo}'
-    wb.save(response)
+    response['Content-Disposition'] = f'attachment; filename="{nombre_archivo}"'
     return response
@@ -1,4 +1,6 @@
 from django.contrib import admin
+from core.listados import PaginadorEstimado
+from core.roles import es_solo_marketing
 from .models import Venta, DetalleVenta
 
 
@@ -19,7 +21,10 @@ class DetalleVentaInline(admin.TabularInline):
 @admin.register(Venta)
 class VentaAdmin(admin.ModelAdmin):
     list_display = ('id', 'cliente_nombre', 'fecha_venta', 'total_formateado')
+    list_select_related = ('cliente__user',)
     search_fields = ('cliente__user__username', 'id')
+    paginator = PaginadorEstimado
+    show_full_result_count = False
     inlines = [DetalleVentaInline]
 
     fieldsets = (
@@ -38,12 +43,12 @@ class VentaAdmin(admin.ModelAdmin):
 
 
     def get_readonly_fields(self, request, obj=None):
-        if request.user.groups.filter(name='Marketing').exists() and not request.user.is_superuser:
+        if es_solo_marketing(request.user):
             return ('cliente', 'fecha_venta', 'total')
         return ('total', 'fecha_venta')
 
     def has_change_permission(self, request, obj=None):
-        if request.user.groups.filter(name='Marketing').exists() and not request.user.is_superuser:
+        if es_solo_marketing(request.user):
             return True 
         return super().has_change_permission(request, obj)
         
@@ -55,7 +60,7 @@ class VentaAdmin(admin.ModelAdmin):
 
 
     def changeform_view(self, request, object_id=None, form_url='', extra_context=None):
-        if request.user.groups.filter(name='Marketing').exists() and not request.user.is_superuser:
+        if es_solo_marketing(request.user):
             extra_context = extra_context or {}
             extra_context['show_save'] = False
             extra_context['show_save_and_continue'] = False
@@ -0,0 +1,139 @@
+"""
+Checkout por lotes.
+
+Registra una venta completa con un número fijo de consultas, sin importar
+cuántas líneas tenga el carrito:
+
+1. bloquea las reservas del usuario (``productos/reservas.py``); son filas
+   propias, sin contención con otros compradores;
+2. lee los productos sin bloquearlos y tarifica las líneas en memoria;
+3. inserta la venta con su total y su resumen (historial) ya calculados;
+4. inserta los detalles con ``bulk_create``;
+5. suma la venta a las métricas del cliente (``ClienteMetricas``);
+6. deja un ``EventoVenta`` en la bandeja de salida para el worker de
+   fidelización (``marketing/fidelizacion.py``);
+7. borra las reservas convertidas;
+8. descuenta ``stock`` y ``reservado`` con un único ``UPDATE`` condicional.
+
+El ``UPDATE`` de stock va al final a propósito: es lo único que toca filas
+compartidas (los productos más vendidos), y así su bloqueo dura solo hasta
+el commit. La condición ``stock - (reservado - apartado) >= cantidad`` hace
+que nunca se venda stock que otro carrito tiene reservado, ni se pierdan
+actualizaciones con checkouts concurrentes; además exige ``reservado >=
+apartado``, así que ``reservado`` nunca queda negativo aunque otro proceso
+lo haya descontado. Si alguna línea no cumple, la venta completa se revierte.
+
+Los resúmenes de ventas se actualizan después del commit (ver
+``ventas/resumenes.py``), fuera de los bloqueos del checkout.
+
+Debe llamarse dentro de ``transaction.atomic()``.
+"""
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Case, F, PositiveIntegerField, Q, When
+from django.db.models.lookups import GreaterThanOrEqual
+
+from clientes.metricas import registrar_compra
+from marketing.precios import MotorPrecios
+from productos.catalogo import invalidar_si_cruza_stock
+from productos.models import Producto, Reserva
+from .models import Venta, DetalleVenta, EventoVenta, StockInsuficiente, resumir_lineas
+from .resumenes import acumular_venta
+
+
+def registrar_venta(cliente, cantidades, motor=None):
+    """
+    Crea la ``Venta`` y sus ``DetalleVenta`` a partir de ``{producto_id: cantidad}``.
+
+    Lanza ``StockInsuficiente`` si algún producto no existe o no alcanza el
+    stock; en ese caso la transacción que envuelve la llamada debe revertirse.
+    """
+    cantidades = {int(pid): int(cantidad) for pid, cantidad in cantidades.items()}
+    if motor is None:
+        motor = MotorPrecios.cargar(clientes=[cliente])
+    else:
+        motor.cargar_clientes([cliente])
+
+    # Reservas tomadas al agregar al carrito. Si alguna expiró y ya se
+    # liberó, esas unidades se piden al stock libre; si sobran, se liberan
+    reservas = list(
+        Reserva.objects.select_for_update()
+        .filter(usuario_id=cliente.user_id, producto_id__in=cantidades)
+        .order_by('producto_id')
+        .values_list('id', 'producto_id', 'cantidad')
+    )
+    apartados = {producto_id: cantidad for _, producto_id, cantidad in reservas}
+
+    productos = list(Producto.objects.filter(id__in=cantidades).order_by('id'))
+    if len(productos) != len(cantidades):
+        raise StockInsuficiente("Uno de los productos del carrito ya no está disponible.")
+
+    for producto in productos:
+        if producto.stock - producto.reservado + apartados.get(producto.id, 0) < cantidades[producto.id]:
+            raise StockInsuficiente(f"Stock insuficiente para {producto.nombre}.")
+
+    lineas = motor.precios((p, cantidades[p.id], cliente) for p in productos)
+    total = sum((linea.subtotal for linea in lineas), Decimal('0.00'))
+
+    num_lineas, unidades, resumen = resumir_lineas((linea.producto.nombre, linea.cantidad) for linea in lineas)
+    venta = Venta(cliente=cliente, total=total, num_lineas=num_lineas, unidades=unidades, resumen=resumen)
+    # Los resúmenes se suman abajo; las señales no deben recalcular el día
+    venta._resumenes_al_dia = True
+    venta.save()
+    DetalleVenta.objects.bulk_create([
+        DetalleVenta(
+            venta=venta,
+            producto=linea.producto,
+            cantidad=linea.cantidad,
+            precio_unitario=linea.precio_unitario,
+            subtotal=linea.subtotal,
+        )
+        for linea in lineas
+    ])
+
+    registrar_compra(venta)
+    EventoVenta.objects.create(venta=venta, cliente=cliente, total=total, fecha_venta=venta.fecha_venta)
+    if reservas:
+        Reserva.objects.filter(id__in=[reserva[0] for reserva in reservas]).delete()
+
+    condicion = Q()
+    for producto_id, cantidad in cantidades.items():
+        apartado = apartados.get(producto_id, 0)
+        # Sin restas en el SQL: ``reservado`` es UNSIGNED en MySQL y
+        # ``reservado - apartado`` negativo es un error, no un False. Si otro
+        # proceso ya descontó lo apartado, la línea no cumple y el checkout
+        # se reintenta con las reservas al día
+        condicion |= Q(
+            GreaterThanOrEqual(F('stock') + apartado, F('reservado') + cantidad),
+            id=producto_id, reservado__gte=apartado,
+        )
+    actualizados = Producto.objects.filter(condicion).update(
+        stock=Case(
+            *[When(id=pid, then=F('stock') - cantidad) for pid, cantidad in cantidades.items()],
+            default=F('stock'),
+            output_field=PositiveIntegerField(),
+        ),
+        reservado=Case(
+            *[When(id=pid, then=F('reservado') - apartado) for pid, apartado in apartados.items() if apartado],
+            default=F('reservado'),
+            output_field=PositiveIntegerField(),
+        ),
+    )
+    if actualizados != len(cantidades):
+        raise StockInsuficiente("El stock cambió durante el checkout, intenta nuevamente.")
+
+    # El UPDATE masivo no dispara señales: la tienda cambia si algo se agotó
+    invalidar_si_cruza_stock(cantidades)
+
+    detalles = [
+        {
+            'producto_id': linea.producto.id,
+            'categoria_id': linea.producto.categoria_id,
+            'cantidad': linea.cantidad,
+            'subtotal': linea.subtotal,
+        }
+        for linea in lineas
+    ]
+    transaction.on_commit(lambda: acumular_venta(venta, detalles))
+    return venta
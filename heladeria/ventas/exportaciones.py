@@ -0,0 +1,35 @@
+from django.utils import timezone
+
+from core.exportaciones import Exportacion
+from utils.excel import TAMANO_LOTE
+from .models import Venta
+
+
+COLUMNAS_VENTAS = ["ID", "Cliente", "Correo", "Fecha de Venta", "Total"]
+
+
+def exportar_ventas(parametros):
+    """Todas las ventas con su cliente, leídas por lotes."""
+    ventas = (
+        Venta.objects
+        .order_by('id')
+        .values_list('id', 'cliente__user__username', 'cliente__user__email', 'fecha_venta', 'total')
+    )
+
+    def filas():
+        for id_, username, email, fecha_venta, total in ventas.iterator(chunk_size=TAMANO_LOTE):
+            yield [
+                id_,
+                username or "Cliente Eliminado",
+                email or "N/A",
+                timezone.localtime(fecha_venta).strftime('%Y-%m-%d %H:%M'),
+                float(total or 0),
+            ]
+
+    return Exportacion(
+        encabezados=COLUMNAS_VENTAS,
+        filas=filas(),
+        total=Venta.objects.count(),
+        nombre_archivo="reporte_ventas.xlsx",
+        titulo="Ventas",
+    )
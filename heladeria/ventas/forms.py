@@ -25,3 +25,27 @@ class AgregarAlCarritoForm(forms.Form):
         required=False,
         widget=forms.HiddenInput()
     )
+
+
+class FiltroLibroVentasForm(forms.Form):
+    """Filtros del libro de ventas (ver ventas/libro.py). Todos opcionales."""
+    desde = forms.DateField(required=False, widget=forms.DateInput(attrs={'type': 'date', 'class': 'form-control form-control-sm'}))
+    hasta = forms.DateField(required=False, widget=forms.DateInput(attrs={'type': 'date', 'class': 'form-control form-control-sm'}))
+    cliente = forms.CharField(
+        required=False, max_length=150,
+        help_text="Usuario o N° de cliente.",
+        widget=forms.TextInput(attrs={'class': 'form-control form-control-sm', 'placeholder': 'Usuario o N°'}),
+    )
+    monto_min = forms.DecimalField(required=False, min_value=0, decimal_places=2,
+                                   widget=forms.NumberInput(attrs={'class': 'form-control form-control-sm', 'step': '0.01'}))
+    monto_max = forms.DecimalField(required=False, min_value=0, decimal_places=2,
+                                   widget=forms.NumberInput(attrs={'class': 'form-control form-control-sm', 'step': '0.01'}))
+
+    def clean(self):
+        datos = super().clean()
+        if datos.get('desde') and datos.get('hasta') and datos['hasta'] < datos['desde']:
+            self.add_error('hasta', "La fecha final no puede ser anterior a la inicial.")
+        if (datos.get('monto_min') is not None and datos.get('monto_max') is not None
+                and datos['monto_max'] < datos['monto_min']):
+            self.add_error('monto_max', "El monto máximo no puede ser menor al mínimo.")
+        return datos
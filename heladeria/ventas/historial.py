@@ -0,0 +1,78 @@
+"""
+Historial de pedidos de un cliente, paginado por cursor (keyset).
+
+Cada página cuesta lo mismo sin importar cuántos pedidos tenga el cliente:
+
+1. los ``HISTORIAL_POR_PAGINA`` pedidos siguientes al cursor, recorriendo
+   ``venta_cliente_fecha_idx`` desde la posición del cursor (sin ``OFFSET``,
+   que obligaría a leer y descartar todas las páginas anteriores);
+2. los detalles de esos pedidos con su producto, en un solo ``Prefetch``.
+
+El cursor es el de ``ventas/paginacion.py``. La cabecera de cada pedido usa
+el resumen que el checkout guarda en la venta (``num_lineas``, ``unidades``,
+``resumen``), así que no hace falta agregar los detalles.
+"""
+from django.conf import settings
+from django.db.models import Prefetch
+
+from .models import DetalleVenta, Venta, resumir_lineas
+from .paginacion import pagina_por_cursor
+
+
+LOTE = 2000
+
+
+def tamano_pagina():
+    return getattr(settings, 'HISTORIAL_POR_PAGINA', 10)
+
+
+def pagina_historial(cliente, cursor=None, tamano=None):
+    """
+    ``(pedidos, cursor_siguiente)``: una página de pedidos de ``cliente``
+    desde ``cursor`` (del más reciente al más antiguo). ``cursor_siguiente``
+    es None en la última página.
+    """
+    pedidos = (
+        Venta.objects
+        .filter(cliente=cliente)
+        .only('id', 'fecha_venta', 'total', 'num_lineas', 'unidades', 'resumen')
+        .prefetch_related(Prefetch(
+            'detalles',
+            queryset=DetalleVenta.objects.select_related('producto')
+            .only('id', 'venta_id', 'cantidad', 'precio_unitario', 'subtotal',
+                  'producto__id', 'producto__nombre', 'producto__precio')
+            .order_by('id'),
+        ))
+    )
+    return pagina_por_cursor(pedidos, cursor, tamano or tamano_pagina())
+
+
+def contexto_historial(request):
+    pedidos, siguiente = pagina_historial(request.user.cliente, request.GET.get('antes'))
+    return {
+        'ventas': pedidos,
+        'cursor_siguiente': siguiente,
+        'es_primera_pagina': not request.GET.get('antes'),
+    }
+
+
+def reconstruir_resumenes_pedidos(lote=LOTE):
+    """
+    Recalcula ``num_lineas``/``unidades``/``resumen`` de todas las ventas, por
+    lotes de ventas (tras cargas masivas que no pasan por el checkout).
+    """
+    ultimo = 0
+    while True:
+        ids = list(Venta.objects.filter(id__gt=ultimo).order_by('id').values_list('id', flat=True)[:lote])
+        if not ids:
+            return
+        lineas = {pk: [] for pk in ids}
+        for venta_id, nombre, cantidad in (DetalleVenta.objects.filter(venta_id__in=ids).order_by('id')
+                                           .values_list('venta_id', 'producto__nombre', 'cantidad')):
+            lineas[venta_id].append((nombre, cantidad))
+        ventas = []
+        for pk, de_venta in lineas.items():
+            num_lineas, unidades, resumen = resumir_lineas(de_venta)
+            ventas.append(Venta(pk=pk, num_lineas=num_lineas, unidades=unidades, resumen=resumen))
+        Venta.objects.bulk_update(ventas, ['num_lineas', 'unidades', 'resumen'])
+        ultimo = ids[-1]
@@ -0,0 +1,142 @@
+# Generated by Django 5.2.7 on 2026-10-18 15:04
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+
+def poblar_resumenes(apps, schema_editor):
+    """Mismo cálculo que ventas.resumenes.reconstruir_resumenes, con los modelos históricos."""
+    Venta = apps.get_model('ventas', 'Venta')
+    DetalleVenta = apps.get_model('ventas', 'DetalleVenta')
+    zona = timezone.get_current_timezone()
+    dia_venta = TruncDate('fecha_venta', tzinfo=zona)
+    dia_detalle = TruncDate('venta__fecha_venta', tzinfo=zona)
+
+    def insertar(nombre, filas):
+        modelo = apps.get_model('ventas', nombre)
+        lote = []
+        for fila in filas:
+            lote.append(modelo(**fila))
+            if len(lote) >= 1000:
+                modelo.objects.bulk_create(lote)
+                lote = []
+        if lote:
+            modelo.objects.bulk_create(lote)
+
+    unidades_por_dia = dict(
+        DetalleVenta.objects.annotate(fecha=dia_detalle).values('fecha')
+        .annotate(unidades=Sum('cantidad')).order_by().values_list('fecha', 'unidades')
+    )
+    insertar('ResumenVentaDiaria', (
+        {**r, 'unidades': unidades_por_dia.get(r['fecha'], 0)}
+        for r in Venta.objects.annotate(fecha=dia_venta).values('fecha')
+        .annotate(num_ventas=Count('id'), monto=Sum('total')).order_by().iterator()
+    ))
+    insertar('ResumenProductoDiario', (
+        r for r in DetalleVenta.objects.annotate(fecha=dia_detalle).values('fecha', 'producto_id')
+        .annotate(unidades=Sum('cantidad'), monto=Sum('subtotal')).order_by().iterator()
+    ))
+    insertar('ResumenCategoriaDiario', (
+        {'fecha': r['fecha'], 'categoria_id': r['producto__categoria_id'],
+         'unidades': r['unidades'], 'monto': r['monto']}
+        for r in DetalleVenta.objects.annotate(fecha=dia_detalle).values('fecha', 'producto__categoria_id')
+        .annotate(unidades=Sum('cantidad'), monto=Sum('subtotal')).order_by().iterator()
+    ))
+    insertar('ResumenClienteDiario', (
+        r for r in Venta.objects.filter(cliente__isnull=False).annotate(fecha=dia_venta)
+        .values('fecha', 'cliente_id').annotate(num_ventas=Count('id'), monto=Sum('total'))
+        .order_by().iterator()
+    ))
+    insertar('ResumenProductoAcumulado', (
+        r for r in DetalleVenta.objects.values('producto_id')
+        .annotate(unidades=Sum('cantidad'), monto=Sum('subtotal')).order_by().iterator()
+    ))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('clientes', '0002_initial'),
+        ('productos', '0001_initial'),
+        ('ventas', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ResumenVentaDiaria',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha', models.DateField(unique=True)),
+                ('num_ventas', models.PositiveIntegerField(default=0)),
+                ('unidades', models.PositiveIntegerField(default=0)),
+                ('monto', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+            ],
+            options={
+                'verbose_name': 'Resumen diario de ventas',
+                'verbose_name_plural': 'Resúmenes diarios de ventas',
+            },
+        ),
+        migrations.CreateModel(
+            name='ResumenCategoriaDiario',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha', models.DateField()),
+                ('unidades', models.PositiveIntegerField(default=0)),
+                ('monto', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('categoria', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='resumenes_diarios', to='productos.categoria')),
+            ],
+            options={
+                'verbose_name': 'Resumen diario por categoría',
+                'verbose_name_plural': 'Resúmenes diarios por categoría',
+                'constraints': [models.UniqueConstraint(fields=('fecha', 'categoria'), name='resumen_categoria_dia_unico')],
+            },
+        ),
+        migrations.CreateModel(
+            name='ResumenClienteDiario',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha', models.DateField()),
+                ('num_ventas', models.PositiveIntegerField(default=0)),
+                ('monto', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('cliente', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='resumenes_diarios', to='clientes.cliente')),
+            ],
+            options={
+                'verbose_name': 'Resumen diario por cliente',
+                'verbose_name_plural': 'Resúmenes diarios por cliente',
+                'constraints': [models.UniqueConstraint(fields=('fecha', 'cliente'), name='resumen_cliente_dia_unico')],
+            },
+        ),
+        migrations.CreateModel(
+            name='ResumenProductoAcumulado',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('unidades', models.PositiveIntegerField(default=0)),
+                ('monto', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('producto', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='resumen_acumulado', to='productos.producto')),
+            ],
+            options={
+                'verbose_name': 'Resumen acumulado por producto',
+                'verbose_name_plural': 'Resúmenes acumulados por producto',
+                'indexes': [models.Index(fields=['-unidades'], name='resumen_acum_unidades_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='ResumenProductoDiario',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha', models.DateField()),
+                ('unidades', models.PositiveIntegerField(default=0)),
+                ('monto', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('producto', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='resumenes_diarios', to='productos.producto')),
+            ],
+            options={
+                'verbose_name': 'Resumen diario por producto',
+                'verbose_name_plural': 'Resúmenes diarios por producto',
+                'constraints': [models.UniqueConstraint(fields=('fecha', 'producto'), name='resumen_producto_dia_unico')],
+            },
+        ),
+        migrations.RunPython(poblar_resumenes, migrations.RunPython.noop),
+    ]
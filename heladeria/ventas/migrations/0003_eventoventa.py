@@ -0,0 +1,29 @@
+# Generated by Django 5.2.7 on 2026-10-18 15:08
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('clientes', '0003_cliente_metricas'),
+        ('ventas', '0002_resumenes_ventas'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EventoVenta',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('total', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('creado', models.DateTimeField(auto_now_add=True)),
+                ('cliente', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='eventos_venta', to='clientes.cliente')),
+                ('venta', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='evento', to='ventas.venta')),
+            ],
+            options={
+                'verbose_name': 'Evento de venta',
+                'verbose_name_plural': 'Eventos de venta',
+            },
+        ),
+    ]
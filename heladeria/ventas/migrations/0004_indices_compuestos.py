@@ -0,0 +1,22 @@
+# Generated by Django 5.2.7 on 2026-10-18 15:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('clientes', '0003_cliente_metricas'),
+        ('ventas', '0003_eventoventa'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='venta',
+            index=models.Index(fields=['cliente', '-fecha_venta'], name='venta_cliente_fecha_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='venta',
+            index=models.Index(fields=['-fecha_venta'], name='venta_fecha_idx'),
+        ),
+    ]
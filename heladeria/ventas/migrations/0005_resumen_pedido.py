@@ -0,0 +1,54 @@
+# Generated by Django 5.2.7 on 2026-10-18 15:43
+
+from django.db import migrations, models
+
+
+def poblar_resumenes(apps, schema_editor):
+    """Mismo cálculo que ventas.models.resumir_lineas, por lotes de ventas."""
+    Venta = apps.get_model('ventas', 'Venta')
+    DetalleVenta = apps.get_model('ventas', 'DetalleVenta')
+    ultimo = 0
+    while True:
+        ids = list(Venta.objects.filter(id__gt=ultimo).order_by('id').values_list('id', flat=True)[:2000])
+        if not ids:
+            return
+        lineas = {pk: [] for pk in ids}
+        for venta_id, nombre, cantidad in (DetalleVenta.objects.filter(venta_id__in=ids).order_by('id')
+                                           .values_list('venta_id', 'producto__nombre', 'cantidad')):
+            lineas[venta_id].append((nombre, cantidad))
+        ventas = []
+        for pk, de_venta in lineas.items():
+            principales = sorted(de_venta, key=lambda linea: -linea[1])[:3]
+            resumen = ', '.join(f"{nombre} x{cantidad}" for nombre, cantidad in principales)
+            if len(de_venta) > 3:
+                resumen += f" y {len(de_venta) - 3} más"
+            ventas.append(Venta(pk=pk, num_lineas=len(de_venta), unidades=sum(c for _, c in de_venta),
+                                resumen=resumen[:255]))
+        Venta.objects.bulk_update(ventas, ['num_lineas', 'unidades', 'resumen'])
+        ultimo = ids[-1]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ventas', '0004_indices_compuestos'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='venta',
+            name='num_lineas',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='venta',
+            name='resumen',
+            field=models.CharField(blank=True, default='', max_length=255),
+        ),
+        migrations.AddField(
+            model_name='venta',
+            name='unidades',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(poblar_resumenes, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.2.7 on 2026-10-18 16:30
+
+import django.utils.timezone
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+
+def copiar_fecha_venta(apps, schema_editor):
+    """Los eventos pendientes toman la fecha de su venta."""
+    EventoVenta = apps.get_model('ventas', 'EventoVenta')
+    Venta = apps.get_model('ventas', 'Venta')
+    EventoVenta.objects.update(fecha_venta=Subquery(
+        Venta.objects.filter(pk=OuterRef('venta_id')).values('fecha_venta')[:1]
+    ))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ventas', '0005_resumen_pedido'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='eventoventa',
+            name='fecha_venta',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+            preserve_default=False,
+        ),
+        migrations.RunPython(copiar_fecha_venta, migrations.RunPython.noop),
+    ]
@@ -1,23 +1,62 @@
 from decimal import Decimal, ROUND_HALF_UP
-from django.db import models
-from django.db.models import F, Sum
-from django.utils import timezone
+from django.db import models, transaction
+from django.db.models import F
 from clientes.models import Cliente
+from productos.catalogo import invalidar_si_cruza_stock
 from productos.models import Producto
-from marketing.models import Promocion
+from marketing.precios import MotorPrecios
+
+
+class StockInsuficiente(Exception):
+    """No hay stock suficiente (o el producto ya no existe) para una línea."""
+
+
+RESUMEN_PRINCIPALES = 3
+
+
+def resumir_lineas(lineas):
+    """
+    ``(num_lineas, unidades, resumen)`` de una venta a partir de sus líneas
+    ``(nombre_producto, cantidad)``. El resumen nombra los productos con más
+    unidades, para el historial de pedidos.
+    """
+    lineas = list(lineas)
+    principales = sorted(lineas, key=lambda linea: -linea[1])[:RESUMEN_PRINCIPALES]
+    resumen = ', '.join(f"{nombre} x{cantidad}" for nombre, cantidad in principales)
+    if len(lineas) > RESUMEN_PRINCIPALES:
+        resumen += f" y {len(lineas) - RESUMEN_PRINCIPALES} más"
+    largo = Venta._meta.get_field('resumen').max_length
+    return len(lineas), sum(cantidad for _, cantidad in lineas), resumen[:largo]
 
 
 class Venta(models.Model):
     cliente = models.ForeignKey(Cliente, on_delete=models.SET_NULL, null=True, related_name="ventas")
     fecha_venta = models.DateTimeField(auto_now_add=True)
     total = models.DecimalField(max_digits=10, decimal_places=2, default=0.00)
+    # Resumen compacto del pedido, escrito en el checkout (ver resumir_lineas)
+    num_lineas = models.PositiveIntegerField(default=0)
+    unidades = models.PositiveIntegerField(default=0)
+    resumen = models.CharField(max_length=255, blank=True, default='')
+
+    class Meta:
+        indexes = [
+            # Historial y métricas de un cliente por rango de fechas
+            models.Index(fields=['cliente', '-fecha_venta'], name='venta_cliente_fecha_idx'),
+            # Rangos de días de los resúmenes (ventas/resumenes.py)
+            models.Index(fields=['-fecha_venta'], name='venta_fecha_idx'),
+        ]
 
     def __str__(self):
         return f"Venta #{self.id} - {self.cliente.nombre if self.cliente else 'Cliente Eliminado'}"
 
     def calcular_total(self):
-        suma = self.detalles.aggregate(total_suma=Sum('subtotal'))['total_suma'] or Decimal('0.00')
+        """Recalcula el total y el resumen desde los detalles (ediciones en el admin)."""
+        lineas = list(self.detalles.order_by('id').values_list('producto__nombre', 'cantidad', 'subtotal'))
+        suma = sum((subtotal for *_, subtotal in lineas), Decimal('0.00'))
         self.total = suma.quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
+        self.num_lineas, self.unidades, self.resumen = resumir_lineas(
+            (nombre, cantidad) for nombre, cantidad, _ in lineas
+        )
         self.save()
 
 
@@ -35,63 +74,154 @@ class DetalleVenta(models.Model):
     def __str__(self):
         return f"{self.producto.nombre} x {self.cantidad} en Venta #{self.venta.id}"
 
-    def save(self, *args, **kwargs):
-        nuevo = self._state.adding
-        hoy = timezone.now().date()
+    def clean(self):
+        from django.core.exceptions import ValidationError
+        if self._state.adding and self.producto_id and self.cantidad and self.cantidad > self.producto.disponible:
+            raise ValidationError({'cantidad': f"Solo hay {self.producto.disponible} unidades disponibles."})
+        super().clean()
+
+    def save(self, *args, motor=None, **kwargs):
+        """
+        Tarifica la línea con el motor de precios antes de guardar.
+
+        ``motor`` permite reutilizar un ``MotorPrecios`` ya cargado (por
+        ejemplo, el del request en el checkout) y evitar consultas por línea.
+        """
         cliente = self.venta.cliente
 
-        
-        precio_base = Decimal(self.producto.precio)
+        if motor is None:
+            motor = MotorPrecios.para_linea(self.producto_id, cliente)
+        linea = motor.precio(self.producto, self.cantidad, cliente)
+
+        self.precio_unitario = linea.precio_unitario
+        self.subtotal = linea.subtotal
+
+        # Movimiento de stock respecto de lo ya guardado (se lee antes de
+        # guardar: después la fila ya tiene la cantidad nueva)
+        movimientos = {self.producto_id: self.cantidad}
+        if not self._state.adding:
+            antiguo = DetalleVenta.objects.filter(pk=self.pk).values('producto_id', 'cantidad').first()
+            if antiguo:
+                movimientos[antiguo['producto_id']] = (
+                    movimientos.get(antiguo['producto_id'], 0) - antiguo['cantidad']
+                )
+
+        with transaction.atomic():
+            for producto_id, cantidad in movimientos.items():
+                if cantidad > 0:
+                    # No vende unidades reservadas por carritos
+                    descontados = Producto.objects.filter(
+                        pk=producto_id, stock__gte=F('reservado') + cantidad,
+                    ).update(stock=F('stock') - cantidad)
+                    if not descontados:
+                        raise StockInsuficiente(f"Stock insuficiente para {self.producto.nombre}.")
+                elif cantidad < 0:
+                    Producto.objects.filter(pk=producto_id).update(stock=F('stock') - cantidad)
+            super().save(*args, **kwargs)
+            invalidar_si_cruza_stock(movimientos)
+
+        venta = self.venta
+        venta.calcular_total()
+        if venta.cliente_id:
+            # Ventas cargadas o editadas en el admin: el checkout deja su
+            # evento con bulk_create de detalles y no pasa por aquí
+            EventoVenta.objects.update_or_create(venta=venta, defaults={
+                'cliente_id': venta.cliente_id, 'total': venta.total, 'fecha_venta': venta.fecha_venta,
+            })
+
+
+# --------------------------------------------------------------------------
+# Resúmenes (rollups) de ventas
+# Se mantienen al registrar cada venta, ``conciliar_resumenes`` corrige los
+# últimos días y se reconstruyen con ``python manage.py reconstruir_resumenes``.
+# Ver ventas/resumenes.py.
+# --------------------------------------------------------------------------
+
+class ResumenVentaDiaria(models.Model):
+    fecha = models.DateField(unique=True)
+    num_ventas = models.PositiveIntegerField(default=0)
+    unidades = models.PositiveIntegerField(default=0)
+    monto = models.DecimalField(max_digits=14, decimal_places=2, default=0)
 
-        
-        promociones = Promocion.objects.filter(
-            activa=True,
-            fecha_inicio__lte=hoy,
-            fecha_fin__gte=hoy
-        ).filter(
-            models.Q(productos=self.producto) | models.Q(productos__isnull=True)
-        )
+    class Meta:
+        verbose_name = "Resumen diario de ventas"
+        verbose_name_plural = "Resúmenes diarios de ventas"
+
+
+class ResumenProductoDiario(models.Model):
+    fecha = models.DateField()
+    producto = models.ForeignKey(Producto, on_delete=models.CASCADE, related_name="resumenes_diarios")
+    unidades = models.PositiveIntegerField(default=0)
+    monto = models.DecimalField(max_digits=14, decimal_places=2, default=0)
 
-        
-        if cliente:
-            promociones = promociones.filter(
-                models.Q(es_general=True) | models.Q(clientes_beneficiados=cliente)
-            )
+    class Meta:
+        verbose_name = "Resumen diario por producto"
+        verbose_name_plural = "Resúmenes diarios por producto"
+        constraints = [
+            models.UniqueConstraint(fields=['fecha', 'producto'], name='resumen_producto_dia_unico'),
+        ]
 
-        mejor_precio = precio_base
 
-        
-        for promo in promociones.distinct():
-            precio_desc = precio_base
+class ResumenCategoriaDiario(models.Model):
+    fecha = models.DateField()
+    categoria = models.ForeignKey('productos.Categoria', on_delete=models.CASCADE, related_name="resumenes_diarios")
+    unidades = models.PositiveIntegerField(default=0)
+    monto = models.DecimalField(max_digits=14, decimal_places=2, default=0)
 
-            if promo.tipo == 'PORCENTAJE' and promo.valor_descuento:
-                descuento = (precio_base * (promo.valor_descuento / Decimal('100'))).quantize(Decimal('0.01'))
-                precio_desc = precio_base - descuento
+    class Meta:
+        verbose_name = "Resumen diario por categoría"
+        verbose_name_plural = "Resúmenes diarios por categoría"
+        constraints = [
+            models.UniqueConstraint(fields=['fecha', 'categoria'], name='resumen_categoria_dia_unico'),
+        ]
 
-            elif promo.tipo == 'VALOR_FIJO' and promo.valor_descuento:
-                precio_desc = max(precio_base - promo.valor_descuento, Decimal('0.00'))
 
-            elif promo.tipo == '2X1' and self.cantidad >= 2:
-                unidades_pagas = (self.cantidad + 1) // 2
-                precio_desc = (precio_base * unidades_pagas / self.cantidad).quantize(Decimal('0.01'))
+class ResumenClienteDiario(models.Model):
+    fecha = models.DateField()
+    cliente = models.ForeignKey(Cliente, on_delete=models.CASCADE, related_name="resumenes_diarios")
+    num_ventas = models.PositiveIntegerField(default=0)
+    monto = models.DecimalField(max_digits=14, decimal_places=2, default=0)
 
-            if precio_desc < mejor_precio:
-                mejor_precio = precio_desc
+    class Meta:
+        verbose_name = "Resumen diario por cliente"
+        verbose_name_plural = "Resúmenes diarios por cliente"
+        constraints = [
+            models.UniqueConstraint(fields=['fecha', 'cliente'], name='resumen_cliente_dia_unico'),
+        ]
 
-        
-        self.precio_unitario = mejor_precio.quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
-        self.subtotal = (self.precio_unitario * self.cantidad).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
 
-        super().save(*args, **kwargs)
+class ResumenProductoAcumulado(models.Model):
+    """Totales históricos por producto (ranking de más vendidos sin recorrer días)."""
+    producto = models.OneToOneField(Producto, on_delete=models.CASCADE, related_name="resumen_acumulado")
+    unidades = models.PositiveIntegerField(default=0)
+    monto = models.DecimalField(max_digits=14, decimal_places=2, default=0)
 
-        
-        if nuevo:
-            Producto.objects.filter(pk=self.producto_id).update(stock=F('stock') - self.cantidad)
-        else:
-            antiguo = DetalleVenta.objects.get(pk=self.pk)
-            diferencia = self.cantidad - antiguo.cantidad
-            if diferencia:
-                Producto.objects.filter(pk=self.producto_id).update(stock=F('stock') - diferencia)
+    class Meta:
+        verbose_name = "Resumen acumulado por producto"
+        verbose_name_plural = "Resúmenes acumulados por producto"
+        indexes = [
+            models.Index(fields=['-unidades'], name='resumen_acum_unidades_idx'),
+        ]
+
+
+# --------------------------------------------------------------------------
+# Bandeja de salida (outbox) de ventas
+# --------------------------------------------------------------------------
+
+class EventoVenta(models.Model):
+    """
+    Venta registrada pendiente de procesar por el worker de fidelización
+    (``marketing/fidelizacion.py``). Se inserta en la misma transacción que la
+    venta (el checkout, o cada línea guardada desde el admin) y se borra
+    cuando el worker la procesa.
+    """
+    venta = models.OneToOneField(Venta, on_delete=models.CASCADE, related_name="evento")
+    cliente = models.ForeignKey(Cliente, on_delete=models.CASCADE, related_name="eventos_venta")
+    total = models.DecimalField(max_digits=10, decimal_places=2)
+    # Las reglas se evalúan a la fecha de la venta, no a la del worker
+    fecha_venta = models.DateTimeField()
+    creado = models.DateTimeField(auto_now_add=True)
 
-        
-        self.venta.calcular_total()
+    class Meta:
+        verbose_name = "Evento de venta"
+        verbose_name_plural = "Eventos de venta"
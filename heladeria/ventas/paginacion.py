@@ -0,0 +1,41 @@
+"""
+Paginación por cursor (keyset) de ventas, de la más reciente a la más antigua.
+
+El cursor es ``fecha_venta`` + ``id`` de la última venta de la página; el
+``id`` desempata ventas con la misma fecha. Cada página continúa el índice
+desde esa posición, sin ``OFFSET``: la página 1000 cuesta lo mismo que la
+primera. Lo usan el historial de pedidos y el libro de ventas.
+"""
+from datetime import datetime
+
+from django.db.models import Q
+
+
+def codificar_cursor(venta):
+    return f"{venta.fecha_venta.isoformat()}_{venta.pk}"
+
+
+def decodificar_cursor(cursor):
+    """``(fecha_venta, id)`` del cursor, o None si no es válido."""
+    try:
+        fecha, pk = cursor.rsplit('_', 1)
+        return datetime.fromisoformat(fecha), int(pk)
+    except (AttributeError, ValueError):
+        return None
+
+
+def pagina_por_cursor(ventas, cursor, tamano):
+    """
+    ``(ventas_de_la_pagina, cursor_siguiente)`` de la consulta ``ventas``
+    desde ``cursor``. ``cursor_siguiente`` es None en la última página.
+    """
+    ventas = ventas.order_by('-fecha_venta', '-id')
+    posicion = decodificar_cursor(cursor) if cursor else None
+    if posicion:
+        fecha, pk = posicion
+        ventas = ventas.filter(Q(fecha_venta__lt=fecha) | Q(fecha_venta=fecha, id__lt=pk))
+
+    # Una de más para saber si hay otra página
+    ventas = list(ventas[:tamano + 1])
+    siguiente = codificar_cursor(ventas[tamano - 1]) if len(ventas) > tamano else None
+    return ventas[:tamano], siguiente
@@ -0,0 +1,213 @@
+"""
+Mantenimiento de los resúmenes (rollups) de ventas.
+
+- ``acumular_venta()``: camino rápido del checkout. Suma la venta a los
+  resúmenes con un número fijo de consultas (INSERT ... IGNORE de las filas
+  que falten + un UPDATE con ``F() + CASE`` por tabla). Se ejecuta después
+  del commit para no alargar los bloqueos del checkout.
+- ``recalcular_dia()``: para cambios hechos fuera del checkout (admin,
+  borrados). Recalcula solo el día afectado.
+- ``conciliar_resumenes()``: recalcula los últimos días con
+  ``recalcular_dia``. Los hooks ``on_commit`` no son transaccionales con la
+  venta: si el proceso muere entre el commit y el hook, o un hook falla, el
+  resumen queda desfasado sin que nadie lo note. El comando
+  ``conciliar_resumenes`` lo corre periódicamente (``RESUMENES_DIAS_CONCILIACION``
+  días hacia atrás) y corrige esas diferencias.
+- ``reconstruir_resumenes()``: recalcula todo desde cero (comando
+  ``reconstruir_resumenes``).
+"""
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, Count, F, Sum, Value, When
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .models import (
+    DetalleVenta, Venta,
+    ResumenVentaDiaria, ResumenProductoDiario, ResumenCategoriaDiario,
+    ResumenClienteDiario, ResumenProductoAcumulado,
+)
+
+
+TAMANO_LOTE = 1000
+
+
+def _sumar(modelo, clave, deltas, **fijos):
+    """
+    Suma ``deltas`` ({valor_clave: {campo: delta}}) sobre las filas de
+    ``modelo``, creándolas en cero si no existen. Dos consultas por tabla.
+    """
+    deltas = {k: d for k, d in deltas.items() if any(d.values())}
+    if not deltas:
+        return
+    modelo.objects.bulk_create(
+        [modelo(**fijos, **{clave: valor}) for valor in deltas],
+        ignore_conflicts=True,
+    )
+    campos = {campo for d in deltas.values() for campo in d}
+    cambios = {}
+    for campo in campos:
+        cambios[campo] = F(campo) + Case(
+            *[When(**{clave: valor}, then=Value(d.get(campo, 0))) for valor, d in deltas.items()],
+            default=Value(0),
+            output_field=modelo._meta.get_field(campo),
+        )
+    modelo.objects.filter(**fijos, **{f'{clave}__in': list(deltas)}).update(**cambios)
+
+
+def _deltas_por(detalles, atributo):
+    deltas = {}
+    for detalle in detalles:
+        d = deltas.setdefault(detalle[atributo], {'unidades': 0, 'monto': Decimal('0')})
+        d['unidades'] += detalle['cantidad']
+        d['monto'] += detalle['subtotal']
+    return deltas
+
+
+def acumular_venta(venta, detalles):
+    """
+    Suma una venta recién creada a todos los resúmenes.
+
+    ``detalles``: lista de dicts con ``producto_id``, ``categoria_id``,
+    ``cantidad`` y ``subtotal``.
+    """
+    fecha = timezone.localdate(venta.fecha_venta)
+    unidades = sum(d['cantidad'] for d in detalles)
+    with transaction.atomic():
+        _sumar(ResumenVentaDiaria, 'fecha', {fecha: {'num_ventas': 1, 'unidades': unidades, 'monto': venta.total}})
+        _sumar(ResumenProductoDiario, 'producto_id', _deltas_por(detalles, 'producto_id'), fecha=fecha)
+        _sumar(ResumenCategoriaDiario, 'categoria_id', _deltas_por(detalles, 'categoria_id'), fecha=fecha)
+        _sumar(ResumenProductoAcumulado, 'producto_id', _deltas_por(detalles, 'producto_id'))
+        if venta.cliente_id:
+            _sumar(ResumenClienteDiario, 'cliente_id',
+                   {venta.cliente_id: {'num_ventas': 1, 'monto': venta.total}}, fecha=fecha)
+
+
+def _rango_del_dia(fecha):
+    inicio = timezone.make_aware(datetime.combine(fecha, time.min))
+    return inicio, inicio + timedelta(days=1)
+
+
+def recalcular_dia(fecha):
+    """Recalcula los resúmenes de un día a partir de sus ventas."""
+    inicio, fin = _rango_del_dia(fecha)
+    ventas = Venta.objects.filter(fecha_venta__gte=inicio, fecha_venta__lt=fin)
+    detalles = DetalleVenta.objects.filter(venta__fecha_venta__gte=inicio, venta__fecha_venta__lt=fin)
+
+    with transaction.atomic():
+        anteriores = {
+            r['producto_id']: r
+            for r in ResumenProductoDiario.objects.filter(fecha=fecha).values('producto_id', 'unidades', 'monto')
+        }
+        por_producto = {
+            r['producto_id']: r
+            for r in detalles.values('producto_id').annotate(unidades=Sum('cantidad'), monto=Sum('subtotal'))
+        }
+
+        ResumenVentaDiaria.objects.filter(fecha=fecha).delete()
+        ResumenProductoDiario.objects.filter(fecha=fecha).delete()
+        ResumenCategoriaDiario.objects.filter(fecha=fecha).delete()
+        ResumenClienteDiario.objects.filter(fecha=fecha).delete()
+
+        totales = ventas.aggregate(num_ventas=Count('id'), monto=Sum('total'))
+        if totales['num_ventas']:
+            ResumenVentaDiaria.objects.create(
+                fecha=fecha,
+                num_ventas=totales['num_ventas'],
+                unidades=sum(r['unidades'] for r in por_producto.values()),
+                monto=totales['monto'] or 0,
+            )
+        ResumenProductoDiario.objects.bulk_create([
+            ResumenProductoDiario(fecha=fecha, producto_id=pid, unidades=r['unidades'], monto=r['monto'])
+            for pid, r in por_producto.items()
+        ])
+        ResumenCategoriaDiario.objects.bulk_create([
+            ResumenCategoriaDiario(fecha=fecha, categoria_id=r['producto__categoria_id'],
+                                   unidades=r['unidades'], monto=r['monto'])
+            for r in detalles.values('producto__categoria_id').annotate(unidades=Sum('cantidad'), monto=Sum('subtotal'))
+        ])
+        ResumenClienteDiario.objects.bulk_create([
+            ResumenClienteDiario(fecha=fecha, cliente_id=r['cliente_id'], num_ventas=r['num_ventas'], monto=r['monto'])
+            for r in ventas.filter(cliente__isnull=False).values('cliente_id').annotate(
+                num_ventas=Count('id'), monto=Sum('total'))
+        ])
+
+        # El acumulado por producto se corrige con la diferencia del día
+        diferencias = {}
+        for pid in set(anteriores) | set(por_producto):
+            antes = anteriores.get(pid, {'unidades': 0, 'monto': Decimal('0')})
+            ahora = por_producto.get(pid, {'unidades': 0, 'monto': Decimal('0')})
+            diferencias[pid] = {
+                'unidades': ahora['unidades'] - antes['unidades'],
+                'monto': ahora['monto'] - antes['monto'],
+            }
+        _sumar(ResumenProductoAcumulado, 'producto_id', diferencias)
+
+
+def dias_conciliacion():
+    return getattr(settings, 'RESUMENES_DIAS_CONCILIACION', 3)
+
+
+def conciliar_resumenes(dias=None, hoy=None):
+    """Recalcula los resúmenes de hoy y de los ``dias - 1`` anteriores. Devuelve los días."""
+    dias = dias or dias_conciliacion()
+    hoy = hoy or timezone.localdate()
+    fechas = [hoy - timedelta(days=n) for n in range(dias)]
+    for fecha in fechas:
+        recalcular_dia(fecha)
+    return fechas
+
+
+def _insertar_por_lotes(modelo, filas):
+    lote = []
+    for fila in filas:
+        lote.append(modelo(**fila))
+        if len(lote) >= TAMANO_LOTE:
+            modelo.objects.bulk_create(lote)
+            lote = []
+    if lote:
+        modelo.objects.bulk_create(lote)
+
+
+def reconstruir_resumenes():
+    """Borra y recalcula todos los resúmenes con consultas agregadas."""
+    zona = timezone.get_current_timezone()
+    dia_venta = TruncDate('fecha_venta', tzinfo=zona)
+    dia_detalle = TruncDate('venta__fecha_venta', tzinfo=zona)
+
+    with transaction.atomic():
+        for modelo in (ResumenVentaDiaria, ResumenProductoDiario, ResumenCategoriaDiario,
+                       ResumenClienteDiario, ResumenProductoAcumulado):
+            modelo.objects.all().delete()
+
+        unidades_por_dia = dict(
+            DetalleVenta.objects.annotate(fecha=dia_detalle).values('fecha')
+            .annotate(unidades=Sum('cantidad')).values_list('fecha', 'unidades')
+        )
+        _insertar_por_lotes(ResumenVentaDiaria, (
+            {**r, 'unidades': unidades_por_dia.get(r['fecha'], 0)}
+            for r in Venta.objects.annotate(fecha=dia_venta).values('fecha')
+            .annotate(num_ventas=Count('id'), monto=Sum('total')).order_by().iterator()
+        ))
+        _insertar_por_lotes(ResumenProductoDiario, (
+            r for r in DetalleVenta.objects.annotate(fecha=dia_detalle).values('fecha', 'producto_id')
+            .annotate(unidades=Sum('cantidad'), monto=Sum('subtotal')).order_by().iterator()
+        ))
+        _insertar_por_lotes(ResumenCategoriaDiario, (
+            {'fecha': r['fecha'], 'categoria_id': r['producto__categoria_id'],
+             'unidades': r['unidades'], 'monto': r['monto']}
+            for r in DetalleVenta.objects.annotate(fecha=dia_detalle).values('fecha', 'producto__categoria_id')
+            .annotate(unidades=Sum('cantidad'), monto=Sum('subtotal')).order_by().iterator()
+        ))
+        _insertar_por_lotes(ResumenClienteDiario, (
+            r for r in Venta.objects.filter(cliente__isnull=False).annotate(fecha=dia_venta)
+            .values('fecha', 'cliente_id').annotate(num_ventas=Count('id'), monto=Sum('total'))
+            .order_by().iterator()
+        ))
+        _insertar_por_lotes(ResumenProductoAcumulado, (
+            r for r in DetalleVenta.objects.values('producto_id')
+            .annotate(unidades=Sum('cantidad'), monto=Sum('subtotal')).order_by().iterator()
+        ))
@@ -1,56 +1,45 @@
-print("🚀 Señales de ventas cargadas correctamente")
-
-
-
-
 # ventas/signals.py
-from django.db.models.signals import post_save
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
 from django.dispatch import receiver
-from ventas.models import Venta
-from marketing.models import Promocion
 from django.utils import timezone
 
-@receiver(post_save, sender=Venta)
-def asignar_promocion_automatica(sender, instance, created, **kwargs):
-    """
-    Asigna promociones automáticas según comportamiento del cliente:
-    - 3 compras seguidas recientes
-    - Monto de compra alto
-    """
-    if not created or not instance.cliente:
+from ventas.models import DetalleVenta, Venta
+from ventas.resumenes import recalcular_dia
+from clientes.metricas import recalcular_metricas
+
+# La asignación automática de promociones de fidelización ya no corre aquí:
+# el checkout (o DetalleVenta.save, en el admin) deja un EventoVenta y lo
+# procesa ``procesar_fidelizacion``.
+
+
+# ================================
+# 🔹 Resúmenes de ventas
+# ================================
+# El checkout suma cada venta a los resúmenes y a las métricas del cliente
+# por su cuenta. Cualquier otra escritura (admin, borrados) recalcula el día
+# y el cliente afectados al confirmar la transacción.
+def _programar_recalculo(venta):
+    if venta is None or venta.fecha_venta is None or getattr(venta, '_resumenes_al_dia', False):
         return
+    fecha = timezone.localdate(venta.fecha_venta)
+    transaction.on_commit(lambda: recalcular_dia(fecha))
 
-    cliente = instance.cliente
-    hoy = timezone.now().date()
-
-    # ================================
-    # 🔹 Criterio 1: 3 compras seguidas (últimas 30 días)
-    # ================================
-    ultimas_ventas = cliente.ventas.filter(
-        fecha_venta__gte=hoy - timezone.timedelta(days=30)
-    ).count()
-
-    if ultimas_ventas >= 3:
-        promo_fidelidad = Promocion.objects.filter(
-            nombre__icontains="Fidelidad",
-            activa=True
-        ).first()
-
-        if promo_fidelidad and promo_fidelidad.es_vigente:
-            promo_fidelidad.clientes_asignados.add(cliente)
-            print(f"✅ Promoción '{promo_fidelidad.nombre}' asignada a {cliente.nombre} (3 compras seguidas)")
-
-    # ================================
-    # 🔹 Criterio 2: Monto de compra alto
-    # ================================
-    MONTO_ALTO = 20000  # 💲 puedes ajustar el umbral
-
-    if instance.total >= MONTO_ALTO:
-        promo_vip = Promocion.objects.filter(
-            nombre__icontains="Compra Alta",
-            activa=True
-        ).first()
-
-        if promo_vip and promo_vip.es_vigente:
-            promo_vip.clientes_asignados.add(cliente)
-            print(f"🎉 Promoción '{promo_vip.nombre}' asignada a {cliente.nombre} (monto alto)")
+
+@receiver(post_save, sender=Venta)
+@receiver(post_delete, sender=Venta)
+def actualizar_resumenes_venta(sender, instance, **kwargs):
+    _programar_recalculo(instance)
+    if instance.cliente_id and not getattr(instance, '_resumenes_al_dia', False):
+        cliente_id = instance.cliente_id
+        transaction.on_commit(lambda: recalcular_metricas([cliente_id]))
+
+
+@receiver(post_save, sender=DetalleVenta)
+@receiver(post_delete, sender=DetalleVenta)
+def actualizar_resumenes_detalle(sender, instance, **kwargs):
+    if DetalleVenta.venta.is_cached(instance):
+        venta = instance.venta
+    else:
+        venta = Venta.objects.filter(pk=instance.venta_id).only('fecha_venta').first()
+    _programar_recalculo(venta)
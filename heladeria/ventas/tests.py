@@ -1,3 +1,238 @@
-from django.test import TestCase
+from datetime import timedelta
+from decimal import Decimal
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.db import connection, transaction
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from clientes.models import Cliente
+from marketing.precios import MotorPrecios
+from productos.models import Categoria, Producto
+from .checkout import StockInsuficiente, registrar_venta
+from .models import DetalleVenta, ResumenProductoAcumulado, ResumenVentaDiaria, Venta
+from .resumenes import conciliar_resumenes, reconstruir_resumenes
+
+
+class RegistrarVentaTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        categoria = Categoria.objects.create(nombre="Helado")
+        cls.productos = [
+            Producto.objects.create(nombre=f"Helado {i}", precio=Decimal('1000'), stock=5, categoria=categoria)
+            for i in range(10)
+        ]
+        cls.cliente = Cliente.objects.create(user=User.objects.create_user('cliente', password='x'))
+
+    def _consultas_checkout(self, n_lineas):
+        motor = MotorPrecios.cargar(clientes=[self.cliente])
+        cantidades = {p.id: 1 for p in self.productos[:n_lineas]}
+        with CaptureQueriesContext(connection) as consultas:
+            with transaction.atomic():
+                registrar_venta(self.cliente, cantidades, motor)
+        return len(consultas)
+
+    def test_numero_de_consultas_no_depende_de_las_lineas(self):
+        self.assertEqual(self._consultas_checkout(2), self._consultas_checkout(10))
+
+    def test_total_y_stock(self):
+        venta = registrar_venta(self.cliente, {self.productos[0].id: 2, self.productos[1].id: 3})
+        self.assertEqual(venta.total, Decimal('5000.00'))
+        self.assertEqual(venta.detalles.count(), 2)
+        self.productos[0].refresh_from_db()
+        self.assertEqual(self.productos[0].stock, 3)
+
+    def test_stock_insuficiente_revierte_la_venta(self):
+        with self.assertRaises(StockInsuficiente):
+            with transaction.atomic():
+                registrar_venta(self.cliente, {self.productos[0].id: 1, self.productos[1].id: 6})
+        self.assertFalse(Venta.objects.exists())
+        self.productos[0].refresh_from_db()
+        self.assertEqual(self.productos[0].stock, 5)
+
+    def test_editar_detalle_mueve_solo_la_diferencia(self):
+        venta = Venta.objects.create(cliente=self.cliente)
+        detalle = DetalleVenta(venta=venta, producto=self.productos[0], cantidad=2)
+        detalle.save()
+        self.productos[0].refresh_from_db()
+        self.assertEqual(self.productos[0].stock, 3)
+
+        detalle.cantidad = 3
+        detalle.save()
+        self.productos[0].refresh_from_db()
+        self.assertEqual(self.productos[0].stock, 2)
+
+
+class ResumenesVentasTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        categoria = Categoria.objects.create(nombre="Helado")
+        cls.productos = [
+            Producto.objects.create(nombre=f"Helado {i}", precio=Decimal('1000'), stock=50, categoria=categoria)
+            for i in range(3)
+        ]
+        cls.cliente = Cliente.objects.create(user=User.objects.create_user('cliente', password='x'))
+
+    def _vender(self, cantidades):
+        with self.captureOnCommitCallbacks(execute=True):
+            with transaction.atomic():
+                return registrar_venta(self.cliente, cantidades)
+
+    def _estado(self):
+        return (
+            list(ResumenVentaDiaria.objects.values_list('fecha', 'num_ventas', 'unidades', 'monto')),
+            sorted(ResumenProductoAcumulado.objects.values_list('producto_id', 'unidades', 'monto')),
+        )
+
+    def test_checkout_acumula_y_coincide_con_reconstruccion(self):
+        self._vender({self.productos[0].id: 2, self.productos[1].id: 1})
+        self._vender({self.productos[0].id: 1})
+
+        dia = ResumenVentaDiaria.objects.get()
+        self.assertEqual(dia.fecha, timezone.localdate())
+        self.assertEqual((dia.num_ventas, dia.unidades, dia.monto), (2, 4, Decimal('4000.00')))
+        self.assertEqual(ResumenProductoAcumulado.objects.get(producto=self.productos[0]).unidades, 3)
+
+        incremental = self._estado()
+        reconstruir_resumenes()
+        self.assertEqual(self._estado(), incremental)
+
+    def test_borrar_detalle_recalcula_el_dia(self):
+        venta = self._vender({self.productos[0].id: 2, self.productos[1].id: 1})
+        with self.captureOnCommitCallbacks(execute=True):
+            DetalleVenta.objects.get(venta=venta, producto=self.productos[0]).delete()
+
+        self.assertEqual(ResumenVentaDiaria.objects.get().unidades, 1)
+        self.assertEqual(ResumenProductoAcumulado.objects.get(producto=self.productos[0]).unidades, 0)
+
+    def test_conciliar_corrige_un_hook_perdido(self):
+        self._vender({self.productos[0].id: 2})
+        with transaction.atomic():
+            # Sin ejecutar los on_commit: como si el proceso muriera tras el commit
+            registrar_venta(self.cliente, {self.productos[0].id: 1, self.productos[1].id: 4})
+        self.assertEqual(ResumenVentaDiaria.objects.get().num_ventas, 1)
+
+        self.assertEqual(conciliar_resumenes(dias=2), [timezone.localdate(), timezone.localdate() - timedelta(days=1)])
+        conciliado = self._estado()
+        reconstruir_resumenes()
+        self.assertEqual(self._estado(), conciliado)
+        self.assertEqual(ResumenVentaDiaria.objects.get().num_ventas, 2)
+        self.assertEqual(ResumenProductoAcumulado.objects.get(producto=self.productos[1]).unidades, 4)
+
+    def test_dashboard_lee_solo_resumenes(self):
+        self._vender({self.productos[2].id: 5})
+        User.objects.create_superuser('admin', password='x')
+        self.client.login(username='admin', password='x')
+        respuesta = self.client.get(reverse('marketing:marketing_dashboard'))
+        self.assertEqual(respuesta.context['resumen']['total_ventas'], 1)
+        self.assertEqual(respuesta.context['productos_mas_vendidos'][0]['total_vendido'], 5)
+
+
+@override_settings(HISTORIAL_POR_PAGINA=4)
+class HistorialTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        categoria = Categoria.objects.create(nombre="Helado")
+        cls.productos = [
+            Producto.objects.create(nombre=f"Helado {i}", precio=Decimal('1000'), stock=500, categoria=categoria)
+            for i in range(5)
+        ]
+        cls.user = User.objects.create_user('cliente', password='x')
+        cls.cliente = Cliente.objects.create(user=cls.user)
+
+    def comprar(self, pedidos):
+        with transaction.atomic():
+            for i in range(pedidos):
+                registrar_venta(self.cliente, {p.id: i % 3 + 1 for p in self.productos[:i % 5 + 1]})
+
+    def consultas_historial(self, **parametros):
+        with CaptureQueriesContext(connection) as consultas:
+            respuesta = self.client.get(reverse('ventas:historial_pedidos'), parametros)
+        return respuesta, len(consultas)
+
+    def test_checkout_guarda_el_resumen(self):
+        cantidades = dict(zip([p.id for p in self.productos], [1, 3, 2, 1, 3]))
+        with transaction.atomic():
+            venta = registrar_venta(self.cliente, cantidades)
+        self.assertEqual((venta.num_lineas, venta.unidades), (5, 10))
+        self.assertEqual(venta.resumen, "Helado 1 x3, Helado 4 x3, Helado 2 x2 y 2 más")
+
+    def test_consultas_fijas_y_cursor_sin_saltos(self):
+        self.client.force_login(self.user)
+        self.comprar(3)
+        self.consultas_historial()  # la primera visita crea la sesión y llena cachés
+        _, pocas = self.consultas_historial()
+        self.comprar(10)
+        respuesta, muchas = self.consultas_historial()
+        self.assertEqual(pocas, muchas)
+
+        vistas = []
+        while True:
+            vistas += [v.id for v in respuesta.context['ventas']]
+            cursor = respuesta.context['cursor_siguiente']
+            if not cursor:
+                break
+            respuesta, _ = self.consultas_historial(antes=cursor)
+        self.assertEqual(vistas, list(Venta.objects.order_by('-fecha_venta', '-id').values_list('id', flat=True)))
+
+
+@override_settings(LIBRO_VENTAS_POR_PAGINA=5)
+class LibroVentasTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = User.objects.create_user('staff', password='x', is_staff=True)
+        cls.ana = Cliente.objects.create(user=User.objects.create_user('ana', password='x'))
+        cls.beto = Cliente.objects.create(user=User.objects.create_user('beto', password='x'))
+        for i in range(12):
+            Venta.objects.create(cliente=cls.ana if i % 2 else cls.beto, total=Decimal(1000 * (i + 1)), unidades=i)
+
+    def setUp(self):
+        self.client.force_login(self.staff)
+
+    def get(self, **parametros):
+        return self.client.get(reverse('ventas:ventas'), parametros)
+
+    def test_solo_staff(self):
+        self.client.force_login(self.ana.user)
+        self.assertEqual(self.get().status_code, 302)
+
+    def test_filtros_y_totales_del_rango(self):
+        respuesta = self.get(cliente='ana', monto_min='4000')
+        totales = respuesta.context['totales']
+        # ana: 2000, 4000, ..., 12000 → desde 4000 quedan 5 ventas
+        self.assertEqual(totales['ventas'], 5)
+        self.assertEqual(totales['monto'], Decimal('40000'))
+        self.assertEqual(totales['unidades'], 3 + 5 + 7 + 9 + 11)
+        self.assertEqual(self.get(cliente=str(self.beto.pk)).context['totales']['ventas'], 6)
+        manana = timezone.localdate() + timezone.timedelta(days=1)
+        self.assertEqual(self.get(desde=manana.isoformat()).context['totales']['ventas'], 0)
+
+    def test_paginas_por_cursor_con_consultas_fijas(self):
+        self.get()
+        with CaptureQueriesContext(connection) as primera:
+            respuesta = self.get(monto_max='11000')
+        vistas = [v.id for v in respuesta.context['ventas']]
+        while respuesta.context['cursor_siguiente']:
+            with CaptureQueriesContext(connection) as consultas:
+                respuesta = self.get(monto_max='11000', antes=respuesta.context['cursor_siguiente'])
+            self.assertEqual(len(consultas), len(primera))
+            vistas += [v.id for v in respuesta.context['ventas']]
+        esperadas = Venta.objects.filter(total__lte=11000).order_by('-fecha_venta', '-id')
+        self.assertEqual(vistas, list(esperadas.values_list('id', flat=True)))
+
+    def test_csv_en_streaming_del_rango_filtrado(self):
+        from .libro import filas_csv, filtrar_ventas
+
+        respuesta = self.get(cliente='beto', formato='csv')
+        self.assertTrue(respuesta.streaming)
+        lineas = b''.join(respuesta.streaming_content).decode().splitlines()
+        self.assertEqual(lineas[0].split(',')[:3], ['ID', 'Fecha', 'Cliente'])
+        self.assertEqual(len(lineas), 1 + 6)
+        # Lotes chicos: mismas filas
+        self.assertEqual(len(list(filas_csv(filtrar_ventas({'cliente': 'beto'}), lote=4))), 1 + 6)
@@ -9,6 +9,7 @@ urlpatterns = [
     path('carrito/quitar/<int:producto_id>/', views.quitar_de_carrito, name='quitar_de_carrito'),
     path('ordenar/', views.finalizar_orden, name='finalizar_orden'),
     path('historial/', views.historial_pedidos, name='historial_pedidos'),
-    path('', views.ventas_simple, name='ventas'),
+    path('', views.libro_ventas, name='ventas'),
+    path('exportar/', views.exportar_ventas_excel, name='exportar_ventas_excel'),
     
 ]
@@ -2,52 +2,58 @@ from django.shortcuts import render, redirect
 from django.contrib.auth.decorators import login_required
 from .models import Venta
 from .models import Producto
-from .forms import AgregarAlCarritoForm
 from django.shortcuts import render, redirect, get_object_or_404
+from django.contrib.admin.views.decorators import staff_member_required
+from core.views import solicitar_exportacion
+from django.http import StreamingHttpResponse
+from .forms import FiltroLibroVentasForm
+from .historial import contexto_historial
+from .libro import filas_csv, filtrar_ventas, pagina_libro, totales
+from productos import views as productos_views
 
 
 
-@login_required
-def ver_carrito(request):
-    
-    carrito = request.session.get('carrito', {})
-    return render(request, 'ventas/carrito.html', {'carrito': carrito})
-
-@login_required
-def agregar_a_carrito(request, producto_id):
-    producto = get_object_or_404(Producto, id=producto_id)
-    if request.method == 'POST':
-        form = AgregarAlCarritoForm(request.POST)
-        if form.is_valid():
-            carrito = request.session.get('carrito', {})
-            carrito[producto_id] = form.cleaned_data['cantidad']
-            request.session['carrito'] = carrito
-            return redirect('ver_carrito')
-    else:
-        form = AgregarAlCarritoForm(initial={'producto_id': producto_id})
-    return render(request, 'ventas/agregar_carrito.html', {'form': form, 'producto': producto})
-
-@login_required
-def quitar_de_carrito(request, producto_id):
-    carrito = request.session.get('carrito', {})
-    carrito.pop(str(producto_id), None)
-    request.session['carrito'] = carrito
-    return redirect('ver_carrito')
-
-@login_required
-def finalizar_orden(request):
-    
-    carrito = request.session.get('carrito', {})
-    if carrito:
-        
-        request.session['carrito'] = {}
-    return render(request, 'ventas/finalizar.html')
+# El carrito vive en tablas propias (productos/carrito.py); estas rutas
+# antiguas usan las mismas vistas que la tienda.
+ver_carrito = productos_views.ver_carrito
+agregar_a_carrito = productos_views.agregar_a_carrito
+quitar_de_carrito = productos_views.quitar_de_carrito
+finalizar_orden = productos_views.finalizar_orden
 
 @login_required
 def historial_pedidos(request):
-    ventas = Venta.objects.filter(cliente=request.user.cliente)
-    return render(request, 'ventas/historial.html', {'ventas': ventas})
-
-def ventas_simple(request):
-    ventas = Venta.objects.all()  
-    return render(request, "ventas/ventas.html", {"ventas": ventas})
\ No newline at end of file
+    # Paginado por cursor y con los detalles precargados (ver ventas/historial.py)
+    return render(request, 'ventas/historial.html', contexto_historial(request))
+
+@staff_member_required
+def libro_ventas(request):
+    """
+    Libro de ventas: filtros, totales del rango y páginas por cursor. Con
+    ``?formato=csv`` descarga en streaming todo el rango filtrado.
+    """
+    form = FiltroLibroVentasForm(request.GET or None)
+    filtros = form.cleaned_data if form.is_valid() else {}
+    ventas = filtrar_ventas(filtros)
+
+    if request.GET.get('formato') == 'csv':
+        respuesta = StreamingHttpResponse(filas_csv(ventas), content_type='text/csv; charset=utf-8')
+        respuesta['Content-Disposition'] = 'attachment; filename="libro_ventas.csv"'
+        return respuesta
+
+    pagina, siguiente = pagina_libro(ventas, request.GET.get('antes'))
+    parametros = request.GET.copy()
+    for clave in ('antes', 'formato'):
+        parametros.pop(clave, None)
+    return render(request, "ventas/ventas.html", {
+        "form": form,
+        "ventas": pagina,
+        "totales": totales(ventas),
+        "cursor_siguiente": siguiente,
+        "es_primera_pagina": not request.GET.get('antes'),
+        "filtros_query": parametros.urlencode(),
+    })
+
+@staff_member_required
+def exportar_ventas_excel(request):
+    """Encola la exportación de ventas; el archivo lo genera el worker de exportaciones."""
+    return solicitar_exportacion(request, 'ventas', 'ventas:ventas')